@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+"""
+Times path recovery and stack usage attachment from .su lines.
+
+    python benchmarks/parse_su.py --functions 100000
+
+Every function starts without a path, a few names are shared by two functions
+and every function has one .su line. The quadratic implementation this replaced
+is timed as well, up to --legacy-limit functions.
+"""
+import argparse
+import contextlib
+import io
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from puncover_riscv import collector  # noqa: E402
+from puncover_riscv.collector import Collector  # noqa: E402
+
+
+def create_collector(functions):
+    c = Collector(None)
+    for i in range(functions):
+        # every 100th name is used twice and cannot be resolved
+        name = "fn_%d" % (i - 1 if i % 100 == 1 else i)
+        c.symbol_create(name, "%08x" % (0x10000 + i * 16), collector.TYPE_FUNCTION, 16, 1, "GLOBAL")
+    return c
+
+
+def su_lines(functions):
+    return ["src/f%d.c:%d:5:fn_%d\t%d\tstatic" % (i // 500, i % 500 * 6 + 1, i, 8 + i % 64)
+            for i in range(functions)]
+
+
+def legacy_parse_stack_usage_lines(c, lines):
+    missing_path_symbols = [
+        s for s in c.all_functions() if s.get(collector.PATH, None) == None]
+
+    for sym1 in missing_path_symbols:
+        for sym2 in missing_path_symbols:
+            if (sym1[collector.ADDRESS] != sym2[collector.ADDRESS]):
+                if (sym1[collector.NAME] == sym2[collector.NAME]):
+                    sym1[collector.CANTFIX] = True
+                    sym2[collector.CANTFIX] = True
+
+    canfix_symbols = [
+        s for s in missing_path_symbols if s.get(collector.CANTFIX, False) == False]
+
+    for line in lines:
+        match = c.parse_stack_usage_line_pattern.match(line)
+        if not match:
+            continue
+        s_name = match.group(5)
+        for sym in canfix_symbols:
+            if sym[collector.NAME] == s_name:
+                c.symbol_add_file_line(
+                    int(sym[collector.ADDRESS], 16), sym[collector.NAME], match.group(1), int(match.group(3)))
+                canfix_symbols.remove(sym)
+                break
+
+
+def measure(functions, parse):
+    c = create_collector(functions)
+    lines = su_lines(functions)
+    start = time.time()
+    with contextlib.redirect_stdout(io.StringIO()):
+        parse(c, lines)
+    elapsed = time.time() - start
+    resolved = sum(1 for s in c.symbols.values() if collector.PATH in s)
+    return elapsed, resolved
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--functions", type=int, default=100000)
+    parser.add_argument("--legacy-limit", type=int, default=4000)
+    args = parser.parse_args()
+
+    sizes = []
+    n = 1000
+    while n < args.functions:
+        sizes.append(n)
+        n *= 2
+    sizes.append(args.functions)
+
+    print("%10s %12s %12s %10s" % ("functions", "current [s]", "legacy [s]", "resolved"))
+    for n in sizes:
+        elapsed, resolved = measure(n, Collector.parse_stack_usage_lines)
+        legacy = "-"
+        if n <= args.legacy_limit:
+            legacy_elapsed, legacy_resolved = measure(n, legacy_parse_stack_usage_lines)
+            if legacy_resolved != resolved:
+                raise Exception("legacy resolved %d paths instead of %d" % (legacy_resolved, resolved))
+            legacy = "%.3f" % legacy_elapsed
+        print("%10d %12.3f %12s %10d" % (n, elapsed, legacy, resolved))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,217 @@
+import gc
+import glob
+import hashlib
+import os
+import pickle
+import tempfile
+
+from puncover_riscv import collector
+from puncover_riscv.assembly import AssemblyLines, AssemblyStore
+from puncover_riscv.call_graph import CallList
+from puncover_riscv.elf import ElfFile
+from puncover_riscv.version import __version__
+
+# bump whenever older cache files can no longer describe the collector model
+CACHE_FORMAT = 2
+
+# derived on demand for each build generation
+TRANSIENT_KEYS = {collector.DEEPEST_CALLEE_TREE, collector.DEEPEST_CALLER_TREE, collector.RECURSIVE_CYCLE}
+
+
+def default_cache_dir():
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "puncover_riscv")
+
+
+def file_digest(path, chunk_size=1 << 20):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def elf_fingerprint(path):
+    # the build-id avoids hashing large images, the size tells stripped copies apart
+    with ElfFile(path) as elf:
+        build_id = elf.build_id()
+    if build_id:
+        return "build-id:%s:%d" % (build_id, os.path.getsize(path))
+    return "sha256:" + file_digest(path)
+
+
+def cache_key(elf_file, map_file, su_files, toolchain_version, src_root):
+    parts = [
+        CACHE_FORMAT,
+        __version__,
+        toolchain_version,
+        os.path.abspath(src_root) if src_root else None,
+        elf_fingerprint(elf_file),
+        file_digest(map_file) if map_file else None,
+    ]
+    for path in su_files:
+        st = os.stat(path)
+        parts.append((path, st.st_mtime_ns, st.st_size))
+
+    h = hashlib.sha256()
+    for p in parts:
+        h.update(repr(p).encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+# kinds of references between elements, stored next to their plain values
+ELEMENT, ELEMENT_LIST, CALLS, ASSEMBLY = range(4)
+
+
+def encode_element(e, element_ids):
+    # splits an element into plain values and references, pickle would otherwise
+    # follow the references and recurse along every chain of symbols
+    plain = {}
+    refs = []
+    for k, v in e.items():
+        if k in TRANSIENT_KEYS:
+            continue
+        t = type(v)
+        if t is dict and id(v) in element_ids:
+            refs.append((k, ELEMENT, element_ids[id(v)]))
+        elif t is list and v and type(v[0]) is dict and id(v[0]) in element_ids:
+            refs.append((k, ELEMENT_LIST, [element_ids[id(x)] for x in v]))
+        elif t is CallList:
+            refs.append((k, CALLS, (v.function_id, v.reverse)))
+        elif t is AssemblyLines:
+            refs.append((k, ASSEMBLY, (v.offset, v.length, v.count)))
+        else:
+            plain[k] = v
+    return plain, refs
+
+
+class AnalysisCache:
+    """
+    Keeps the fully enhanced collector model of recent builds in a directory, one
+    file per cache key, so that reopening an unchanged build skips all tools.
+    """
+
+    def __init__(self, directory=None, keep=8):
+        self.directory = directory or default_cache_dir()
+        self.keep = keep
+
+    def path(self, key):
+        return os.path.join(self.directory, key + ".cache")
+
+    def header(self, key):
+        return {"format": CACHE_FORMAT, "version": __version__, "key": key}
+
+    def load(self, key, c):
+        path = self.path(key)
+        if not os.path.isfile(path):
+            return False
+
+        # hundreds of thousands of new containers would trigger many useless collections
+        gc_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            with open(path, "rb") as f:
+                if pickle.load(f) != self.header(key):
+                    return False
+                self.read_model(f, c)
+        except Exception as e:
+            print("ignoring analysis cache %s: %s" % (path, e))
+            c.reset()
+            return False
+        finally:
+            if gc_enabled:
+                gc.enable()
+
+        # recently used files survive prune()
+        os.utime(path)
+        print("loaded analysis from %s" % path)
+        return True
+
+    def store(self, key, c):
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    pickle.dump(self.header(key), f, pickle.HIGHEST_PROTOCOL)
+                    self.write_model(f, c)
+                os.replace(tmp, self.path(key))
+            except BaseException:
+                os.remove(tmp)
+                raise
+        except OSError as e:
+            print("could not write analysis cache: %s" % e)
+            return False
+
+        self.prune()
+        return True
+
+    def prune(self):
+        paths = sorted(glob.glob(os.path.join(self.directory, "*.cache")), key=os.path.getmtime, reverse=True)
+        for path in paths[self.keep:]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def write_model(self, f, c):
+        elements = list(c.symbols.values()) + list(c.file_elements.values()) + list(c.section.values())
+        element_ids = {id(e): i for i, e in enumerate(elements)}
+
+        def ids(d):
+            return [(k, element_ids[id(v)]) for k, v in d.items()]
+
+        graph = c.call_graph
+        graph.freeze()
+        model = {
+            "elements": [encode_element(e, element_ids) for e in elements],
+            "symbols": ids(c.symbols),
+            "file_elements": ids(c.file_elements),
+            "section": ids(c.section),
+            "machine_code": c.machine_code,
+            "elf_mtime": getattr(c, "elf_mtime", None),
+            "functions": [element_ids[id(f)] for f in graph.functions],
+            "call_graph": (graph.callee_offsets, graph.callee_ids, graph.caller_offsets, graph.caller_ids,
+                           sorted(graph.self_calls)),
+            "assembly_size": c.assembly.size if c.assembly else 0,
+        }
+
+        pickle.dump(model, f, pickle.HIGHEST_PROTOCOL)
+        if c.assembly:
+            c.assembly.dump(f)
+
+    def read_model(self, f, c):
+        model = pickle.load(f)
+        if c.assembly is None:
+            c.assembly = AssemblyStore()
+        assembly = c.assembly
+        assembly_offset = assembly.size
+        graph = c.call_graph
+
+        elements = [plain for plain, _ in model["elements"]]
+        for e, (_, refs) in zip(elements, model["elements"]):
+            for k, kind, v in refs:
+                if kind == ELEMENT:
+                    e[k] = elements[v]
+                elif kind == ELEMENT_LIST:
+                    e[k] = [elements[i] for i in v]
+                elif kind == CALLS:
+                    e[k] = CallList(graph, v[0], v[1])
+                else:
+                    e[k] = AssemblyLines(assembly, assembly_offset + v[0], v[1], v[2])
+
+        c.symbols = {k: elements[i] for k, i in model["symbols"]}
+        c.sorted_symbols = None
+        c.file_elements = {k: elements[i] for k, i in model["file_elements"]}
+        c.section = {k: elements[i] for k, i in model["section"]}
+        c.machine_code = model["machine_code"]
+        c.elf_mtime = model["elf_mtime"]
+
+        graph.functions = [elements[i] for i in model["functions"]]
+        (graph.callee_offsets, graph.callee_ids, graph.caller_offsets, graph.caller_ids,
+         self_calls) = model["call_graph"]
+        graph.self_calls = set(self_calls)
+        graph.dirty = False
+
+        assembly.load(f, model["assembly_size"])
@@ -0,0 +1,353 @@
+import base64
+import binascii
+import json
+
+from flask import jsonify, request
+from flask.views import View
+
+from puncover_riscv import collector
+from puncover_riscv.backtrace_helper import BacktraceHelper
+from puncover_riscv.middleware import ENVIRON_COLLECTOR
+
+API_VERSION = 1
+API_PREFIX = "/api/v%d" % API_VERSION
+
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 1000
+DEFAULT_SEARCH_LIMIT = 20
+
+# query parameters that are not filters
+RESERVED_ARGS = ["fields", "sort", "limit", "cursor"]
+
+
+def element_path(e):
+    return e[collector.PATH] if e else None
+
+
+def call_count(key):
+    return lambda c, s: len(s[key]) if key in s else 0
+
+
+# every record is built from the fields a request asks for, getters take the
+# collector and the symbol, file or folder
+SYMBOL_FIELDS = {
+    "id": lambda c, s: c.qualified_symbol_name(s),
+    "name": lambda c, s: s[collector.NAME],
+    "display_name": lambda c, s: s.get(collector.DISPLAY_NAME, s[collector.NAME]),
+    "type": lambda c, s: s.get(collector.TYPE),
+    "address": lambda c, s: s.get(collector.ADDRESS),
+    "size": lambda c, s: s.get(collector.SIZE),
+    "stack_size": lambda c, s: s.get(collector.STACK_SIZE),
+    "stack_qualifiers": lambda c, s: s.get(collector.STACK_QUALIFIERS),
+    "bind": lambda c, s: s.get(collector.BIND),
+    "section": lambda c, s: s.get(collector.SECTION),
+    "file": lambda c, s: element_path(s.get(collector.FILE)),
+    "line": lambda c, s: s.get(collector.LINE),
+    "callers": call_count(collector.CALLERS),
+    "callees": call_count(collector.CALLEES),
+}
+
+FILE_FIELDS = {
+    "id": lambda c, f: f[collector.PATH],
+    "name": lambda c, f: f[collector.NAME],
+    "folder": lambda c, f: element_path(f.get(collector.FOLDER)),
+    "code_size": lambda c, f: f.get(collector.TOTAL_CODE_SIZE),
+    "var_size": lambda c, f: f.get(collector.TOTAL_VAR_SIZE),
+    "stack_size": lambda c, f: f.get(collector.TOTAL_STACK_SIZE),
+    "functions": lambda c, f: len(f.get(collector.FUNCTIONS, [])),
+    "variables": lambda c, f: len(f.get(collector.VARIABLES, [])),
+}
+
+FOLDER_FIELDS = {
+    "id": lambda c, f: f[collector.PATH],
+    "name": lambda c, f: f[collector.NAME],
+    "folder": lambda c, f: element_path(f.get(collector.FOLDER)),
+    "code_size": lambda c, f: f.get(collector.TOTAL_CODE_SIZE),
+    "var_size": lambda c, f: f.get(collector.TOTAL_VAR_SIZE),
+    "stack_size": lambda c, f: f.get(collector.TOTAL_STACK_SIZE),
+    "files": lambda c, f: len(f.get(collector.FILES, [])),
+    "sub_folders": lambda c, f: len(f.get(collector.SUB_FOLDERS, [])),
+}
+
+
+class ApiError(Exception):
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+def encode_cursor(generation, offset):
+    data = json.dumps({"generation": generation, "offset": offset}).encode("utf-8")
+    return base64.urlsafe_b64encode(data).decode("ascii")
+
+
+def decode_cursor(cursor):
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8"))
+        return int(data["generation"]), int(data["offset"])
+    except (ValueError, TypeError, KeyError, binascii.Error):
+        raise ApiError(400, "invalid cursor")
+
+
+class ApiView(View):
+    """
+    Answers with JSON records of the build the request arrived at. Lists are
+    filtered, sorted and paged on the server, see query().
+    """
+
+    fields = SYMBOL_FIELDS
+
+    def __init__(self, collector=None):
+        if collector is None:
+            # the build current when the request arrived, see BuilderMiddleware
+            collector = request.environ[ENVIRON_COLLECTOR]
+        self.collector = collector
+
+    def dispatch_request(self, **kwargs):
+        try:
+            return jsonify(self.get(**kwargs))
+        except ApiError as e:
+            response = jsonify({"error": e.message})
+            response.status_code = e.status
+            return response
+
+    def get(self, **kwargs):
+        raise NotImplementedError()
+
+    def selected_fields(self):
+        names = request.args.get("fields")
+        if not names:
+            return list(self.fields)
+        names = names.split(",")
+        self.check_fields(names)
+        return names
+
+    def check_fields(self, names):
+        unknown = [n for n in names if n not in self.fields]
+        if unknown:
+            raise ApiError(400, "unknown field: %s" % ", ".join(unknown))
+
+    def record(self, item, names):
+        return {n: self.fields[n](self.collector, item) for n in names}
+
+    def records(self, items):
+        names = self.selected_fields()
+        return [self.record(i, names) for i in items]
+
+    def filters(self):
+        # name=value matches exactly, name_min and name_max bound numbers and
+        # name_prefix matches the start of text
+        result = []
+        for arg, value in request.args.items(multi=True):
+            if arg in RESERVED_ARGS:
+                continue
+            name, _, op = arg.rpartition("_")
+            if op in ["min", "max", "prefix"] and name in self.fields:
+                get = self.fields[name]
+            elif arg in self.fields:
+                get, op = self.fields[arg], "eq"
+            else:
+                raise ApiError(400, "unknown filter: %s" % arg)
+            result.append(self.predicate(get, op, value))
+        return result
+
+    def predicate(self, get, op, value):
+        c = self.collector
+        if op == "eq":
+            return lambda i: str(get(c, i)) == value
+        if op == "prefix":
+            return lambda i: str(get(c, i)).startswith(value)
+
+        try:
+            bound = int(value, 0)
+        except ValueError:
+            raise ApiError(400, "not a number: %s" % value)
+        if op == "min":
+            return lambda i: get(c, i) is not None and get(c, i) >= bound
+        return lambda i: get(c, i) is not None and get(c, i) <= bound
+
+    def sort(self, items):
+        # sort=-size,name sorts by size descending, then by name. Missing values
+        # are listed last in both directions
+        names = request.args.get("sort")
+        if not names:
+            return items
+        keys = [(n[1:], True) if n.startswith("-") else (n, False) for n in names.split(",")]
+        self.check_fields([n for n, _ in keys])
+
+        c = self.collector
+        items = list(items)
+        for name, descending in reversed(keys):
+            get = self.fields[name]
+            items.sort(key=lambda i: (get(c, i) is not None, get(c, i)) if descending else
+                       (get(c, i) is None, get(c, i)), reverse=descending)
+        return items
+
+    def limit(self, default=DEFAULT_LIMIT):
+        try:
+            limit = int(request.args.get("limit", default))
+        except ValueError:
+            raise ApiError(400, "not a number: %s" % request.args["limit"])
+        return max(1, min(limit, MAX_LIMIT))
+
+    def query(self, items):
+        """
+        Returns one page of the items that pass the filters, a cursor for the next
+        page is only valid for the same build.
+        """
+        offset = 0
+        cursor = request.args.get("cursor")
+        if cursor:
+            generation, offset = decode_cursor(cursor)
+            if generation != self.collector.generation:
+                raise ApiError(410, "cursor of an earlier build, start again")
+
+        filters = self.filters()
+        items = [i for i in items if all(f(i) for f in filters)]
+        items = self.sort(items)
+        limit = self.limit()
+        end = offset + limit
+        return {
+            "generation": self.collector.generation,
+            "total": len(items),
+            "items": self.records(items[offset:end]),
+            "next": encode_cursor(self.collector.generation, end) if end < len(items) else None,
+        }
+
+    def symbol(self, name):
+        # qualified names are unique, plain names are accepted as well
+        s = self.collector.symbol(name) or self.collector.symbol(name, False)
+        if not s:
+            raise ApiError(404, "no symbol %s" % name)
+        return s
+
+    def file_element(self, path, type):
+        e = self.collector.file_elements.get(path)
+        if not e or e[collector.TYPE] != type:
+            raise ApiError(404, "no %s %s" % (type, path))
+        return e
+
+
+class IndexApi(ApiView):
+
+    def get(self):
+        c = self.collector
+        return {
+            "version": API_VERSION,
+            "generation": c.generation,
+            "build_time": c.build_time,
+            "symbols": len(c.all_symbols()),
+            "files": len(c.all_files()),
+            "folders": len(c.all_folders()),
+        }
+
+
+class SymbolsApi(ApiView):
+
+    def get(self):
+        return self.query(self.collector.all_symbols())
+
+
+class SymbolApi(ApiView):
+
+    def get(self, name):
+        return self.record(self.symbol(name), self.selected_fields())
+
+
+class CalleesApi(ApiView):
+
+    key = collector.CALLEES
+
+    def get(self, name):
+        return self.query(self.symbol(name).get(self.key, []))
+
+
+class CallersApi(CalleesApi):
+
+    key = collector.CALLERS
+
+
+class StackApi(ApiView):
+
+    def get(self, name):
+        s = self.symbol(name)
+        if s.get(collector.TYPE) != collector.TYPE_FUNCTION:
+            raise ApiError(404, "no function %s" % name)
+
+        helper = BacktraceHelper(self.collector)
+        # marks the members of recursive cycles
+        helper.recursive_cycles()
+        cycle = s.get(collector.RECURSIVE_CYCLE)
+
+        def chain(tree):
+            stack_size, functions = tree
+            return {"stack_size": stack_size, "functions": self.records(functions)}
+
+        return {
+            "generation": self.collector.generation,
+            "callees": chain(helper.deepest_callee_tree(s)),
+            "callers": chain(helper.deepest_caller_tree(s)),
+            "recursive_cycle": [self.collector.qualified_symbol_name(f) for f in cycle] if cycle else None,
+        }
+
+
+class SearchApi(ApiView):
+
+    def get(self):
+        # best matches first, see NameIndex
+        query = request.args.get("q", "")
+        return {
+            "generation": self.collector.generation,
+            "items": self.records(self.collector.search_symbols(query, self.limit(DEFAULT_SEARCH_LIMIT))),
+        }
+
+
+class FilesApi(ApiView):
+
+    fields = FILE_FIELDS
+
+    def get(self):
+        return self.query(sorted(self.collector.all_files(), key=lambda f: f[collector.PATH]))
+
+
+class FileApi(ApiView):
+
+    fields = FILE_FIELDS
+
+    def get(self, path):
+        return self.record(self.file_element(path, collector.TYPE_FILE), self.selected_fields())
+
+
+class FoldersApi(ApiView):
+
+    fields = FOLDER_FIELDS
+
+    def get(self):
+        return self.query(sorted(self.collector.all_folders(), key=lambda f: f[collector.PATH]))
+
+
+class FolderApi(ApiView):
+
+    fields = FOLDER_FIELDS
+
+    def get(self, path):
+        return self.record(self.file_element(path, collector.TYPE_FOLDER), self.selected_fields())
+
+
+def register_urls(app, collector=None):
+    def add(rule, name, view):
+        app.add_url_rule(API_PREFIX + rule, view_func=view.as_view("api_" + name, collector=collector))
+
+    add("/", "index", IndexApi)
+    add("/symbols", "symbols", SymbolsApi)
+    add("/symbols/<path:name>/callers", "callers", CallersApi)
+    add("/symbols/<path:name>/callees", "callees", CalleesApi)
+    add("/symbols/<path:name>/stack", "stack", StackApi)
+    add("/symbols/<path:name>", "symbol", SymbolApi)
+    add("/search", "search", SearchApi)
+    add("/files", "files", FilesApi)
+    add("/files/<path:path>", "file", FileApi)
+    add("/folders", "folders", FoldersApi)
+    add("/folders/<path:path>", "folder", FolderApi)
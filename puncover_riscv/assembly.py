@@ -0,0 +1,146 @@
+import array
+import collections.abc
+import mmap
+import tempfile
+import threading
+
+
+class AssemblyStore:
+    """
+    Append-only file holding the disassembly of all symbols. Symbols only keep an
+    AssemblyLines handle, the text is sliced from a memory mapping of the file
+    whenever a page shows it.
+    """
+
+    def __init__(self, path=None):
+        self.file = open(path, "w+b") if path else tempfile.TemporaryFile()
+        self.size = 0
+        self.map = None
+        self.lock = threading.Lock()
+
+    def add(self, lines):
+        lines = list(lines)
+        data = "\n".join(lines).encode("utf-8")
+        with self.lock:
+            offset = self.size
+            self.file.seek(offset)
+            self.file.write(data)
+            self.size += len(data)
+        return AssemblyLines(self, offset, len(data), len(lines))
+
+    def read(self, offset, length):
+        return self.read_bytes(offset, length).decode("utf-8")
+
+    def read_bytes(self, offset, length):
+        if length == 0:
+            return b""
+        with self.lock:
+            # text added since the file was mapped needs a larger mapping
+            if self.map is None or offset + length > len(self.map):
+                if self.map is not None:
+                    self.map.close()
+                self.file.flush()
+                self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+            return self.map[offset:offset + length]
+
+    def dump(self, file, chunk_size=1 << 20):
+        # copies the whole store into an open binary file
+        with self.lock:
+            self.file.flush()
+            self.file.seek(0)
+            remaining = self.size
+            while remaining > 0:
+                data = self.file.read(min(chunk_size, remaining))
+                if not data:
+                    raise Exception("assembly store is shorter than %d bytes" % self.size)
+                file.write(data)
+                remaining -= len(data)
+
+    def load(self, file, length, chunk_size=1 << 20):
+        # appends length bytes of an earlier dump(), returns their offset in this store
+        with self.lock:
+            offset = self.size
+            self.file.seek(offset)
+            remaining = length
+            while remaining > 0:
+                data = file.read(min(chunk_size, remaining))
+                if not data:
+                    raise Exception("assembly dump is shorter than %d bytes" % length)
+                self.file.write(data)
+                remaining -= len(data)
+            self.size += length
+        return offset
+
+    def close(self):
+        with self.lock:
+            if self.map is not None:
+                self.map.close()
+                self.map = None
+            self.file.close()
+
+
+class AssemblyLines(collections.abc.Sequence):
+    """
+    The lines of one symbol's disassembly, read from its AssemblyStore on access.
+    Indexing reads single lines at offsets that are collected on first use.
+    """
+
+    __slots__ = ["store", "offset", "length", "count", "starts"]
+
+    def __init__(self, store, offset, length, count):
+        self.store = store
+        self.offset = offset
+        self.length = length
+        self.count = count
+        self.starts = None
+
+    def line_starts(self):
+        # byte offsets of the lines, followed by the one a next line would have
+        if self.starts is None:
+            data = self.store.read_bytes(self.offset, self.length)
+            starts = array.array("I", [0])
+            position = data.find(b"\n")
+            while position >= 0:
+                starts.append(position + 1)
+                position = data.find(b"\n", position + 1)
+            starts.append(self.length + 1)
+            self.starts = starts
+        return self.starts
+
+    def lines(self):
+        if self.count == 0:
+            return []
+        return self.store.read(self.offset, self.length).split("\n")
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(self.count)
+            if step != 1:
+                return [self[i] for i in range(start, stop, step)]
+            if start >= stop:
+                return []
+            starts = self.line_starts()
+            return self.store.read(self.offset + starts[start], starts[stop] - starts[start] - 1).split("\n")
+
+        if index < 0:
+            index += self.count
+        if not 0 <= index < self.count:
+            raise IndexError("assembly line index out of range")
+        starts = self.line_starts()
+        return self.store.read(self.offset + starts[index], starts[index + 1] - starts[index] - 1)
+
+    def __iter__(self):
+        return iter(self.lines())
+
+    def __eq__(self, other):
+        if isinstance(other, (AssemblyLines, list, tuple)):
+            return self.lines() == list(other)
+        return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self):
+        return "AssemblyLines(%r)" % self.lines()
@@ -1,5 +1,7 @@
 import re
+import threading
 from puncover_riscv import collector
+from puncover_riscv.call_graph import CallPath
 
 class BacktraceHelper():
 
@@ -25,28 +27,75 @@ class BacktraceHelper():
         return self.derive_functions_symbols_pattern.sub(f, text)
 
 
-    def deepest_call_tree(self, f, list_attribute, cache_attribute, visited = None):
-        # TODO: find strongly connected components and count cycles correctly
-        if cache_attribute in f:
-            return f[cache_attribute]
+    def memoized(self, key, compute):
+        # results only hold for the build generation they were computed for
+        c = self.collector
+        with c.call_trees_lock:
+            key = (c.generation, key)
+            if key not in c.call_trees:
+                c.call_trees[key] = compute()
+            return c.call_trees[key]
 
-        visited = [f] + (visited if visited else [])
-        result = (0, [])
+    def condensation(self):
+        return self.memoized("components", self.find_components)
 
-        for c in f[list_attribute]:
-            if c not in visited:
-                candidate = self.deepest_call_tree(c, list_attribute, cache_attribute, visited)
-                if candidate[0] > result[0]:
-                    result = candidate
+    def find_components(self):
+        c = self.collector
+        for f in c.all_functions():
+            c.function_id(f)
+        graph = c.call_graph
+        components = graph.components()
 
+        cycles = []
+        for members in graph.cycles(components[1]):
+            cycle = [graph.functions[m] for m in members]
+            for f in cycle:
+                f[collector.RECURSIVE_CYCLE] = cycle
+            cycles.append(cycle)
+            print("recursive cycle: %s" % " -> ".join(f[collector.NAME] for f in cycle))
+        return components, cycles
 
-        result = (result[0] + f.get(collector.STACK_SIZE, 0), [f] + result[1])
-        f[cache_attribute] = result
-        return result
+    def recursive_cycles(self):
+        return self.condensation()[1]
+
+    def longest_paths(self, reverse):
+        # recursive cycles are collapsed into single nodes of a DAG on which the
+        # heaviest chain of every function is found in one pass
+        def compute():
+            components, _ = self.condensation()
+            functions = self.collector.call_graph.functions
+            stack = [f.get(collector.STACK_SIZE, 0) or 0 for f in functions]
+            return self.collector.call_graph.longest_paths(stack, reverse, components)
+
+        return self.memoized(("longest_paths", reverse), compute)
+
+    def warm(self):
+        generation = self.collector.generation
 
+        def run():
+            for reverse in [False, True]:
+                if self.collector.generation != generation:
+                    return
+                self.longest_paths(reverse)
+
+        thread = threading.Thread(target=run, name="call-trees", daemon=True)
+        thread.start()
+        return thread
+
+    def deepest_call_tree(self, f, reverse, cache_attribute):
+        result = f.get(cache_attribute)
+        if result is None:
+            paths = self.longest_paths(reverse)
+            function_id = f.get(collector.FUNCTION_ID)
+            if function_id is None or function_id >= len(paths.component):
+                result = (f.get(collector.STACK_SIZE, 0) or 0, [f])
+            else:
+                result = (paths.total(function_id), CallPath(paths, function_id))
+            f[cache_attribute] = result
+        return result
 
     def deepest_callee_tree(self, f):
-        return self.deepest_call_tree(f, collector.CALLEES, collector.DEEPEST_CALLEE_TREE)
+        return self.deepest_call_tree(f, False, collector.DEEPEST_CALLEE_TREE)
 
     def deepest_caller_tree(self, f):
-        return self.deepest_call_tree(f, collector.CALLERS, collector.DEEPEST_CALLER_TREE)
+        return self.deepest_call_tree(f, True, collector.DEEPEST_CALLER_TREE)
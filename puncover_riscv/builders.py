@@ -1,7 +1,12 @@
 import abc
 import os
+import threading
+import time
 from os.path import dirname
+from puncover_riscv import analysis_cache
 from puncover_riscv.backtrace_helper import BacktraceHelper
+from puncover_riscv.stages import StageGraph
+from puncover_riscv.watcher import FileWatcher
 
 
 class Builder:
@@ -11,27 +16,159 @@ class Builder:
         self.collector = collector
         self.backtrace_helper = BacktraceHelper(collector)
         self.src_root = src_root
+        # call trees are otherwise computed when first shown
+        self.warm_call_trees = False
+        # an AnalysisCache that builds with unchanged inputs are loaded from
+        self.cache = None
+        # rebuilds take over the analysis of functions whose code is unchanged
+        self.incremental = True
+        # at most one background build, see build_in_background()
+        self.build_lock = threading.Lock()
+        self.build_thread = None
+        # called with every collector that is shown, e.g. to restart worker processes
+        self.on_build = None
+        # a FileWatcher that tells about changed files, see watch()
+        self.watcher = None
+        self.changed = False
 
     def store_file_time(self, path, store_empty=False):
         self.files[path] = 0 if store_empty else os.path.getmtime(path)
 
     def build(self):
+        # a new collector is built while the current one can still be shown, it
+        # replaces the current one once it is complete
+        self.changed = False
         for f in self.files.keys():
             self.store_file_time(f)
-        self.collector.reset()
-        self.collector.parse_elf(self.get_elf_path())
-        self.collector.parse_su(self.get_su_dir())
-        self.collector.parse_map(self.get_map_path())
-        self.collector.enhance(self.src_root)
-        self.build_call_trees()
+        c = self.collector.next_generation(keep_previous=self.incremental)
+        try:
+            key = self.cache_key() if self.cache else None
+            if not key or not self.cache.load(key, c):
+                self.build_stages(c).run()
+                if key:
+                    self.cache.store(key, c)
+            c.drop_previous()
+        finally:
+            c.close_elf()
+
+        # shown collectors are only read
+        c.prepare()
+        c.build_time = time.time()
+        helper = BacktraceHelper(c)
+        helper.recursive_cycles()
+        self.collector = c
+        self.backtrace_helper = helper
+        if self.warm_call_trees:
+            helper.warm()
+        if self.on_build:
+            self.on_build(c)
+
+    def build_stages(self, c):
+        # tool invocations and file reads only depend on the input files and run
+        # concurrently, the collector is only joined where it needs earlier results.
+        # section headers and symbols are read from the mapped ELF without readelf
+        tools = c.gcc_tools
+        elf_file = self.get_elf_path()
+        su_dir = self.get_su_dir()
+        map_file = self.get_map_path()
+
+        graph = StageGraph()
+        graph.add("elf", lambda: c.open_elf(elf_file))
+        graph.add("sections", c.read_elf_sections, inputs=["elf"])
+        graph.add("symbols", c.read_elf_symbols, inputs=["elf"])
+        graph.add("dwarf", c.parse_dwarf, inputs=["elf"])
+        graph.add("file_lines", c.symbols_add_dwarf_file_lines, after=["symbols"], inputs=["dwarf"])
+        if self.incremental:
+            # digests of the functions that the next build compares against
+            graph.add("reuse", c.reuse_unchanged_functions, after=["symbols"], inputs=["elf"])
+            graph.add("reuse_lines", c.reuse_unchanged_lines, after=["reuse"], inputs=["elf", "dwarf"])
+
+        if c.previous:
+            # only the functions that changed since the previous build are disassembled
+            def parse_assembly(ranges):
+                if ranges != []:
+                    c.parse_assembly(tools.get_assembly_lines(elf_file, ranges))
+
+            graph.add("demangle", c.unmangle_cpp_names, after=["reuse"])
+            graph.add("machine_code", c.decode_machine_code, after=["reuse"], inputs=["elf"])
+            graph.add("assembly", parse_assembly, inputs=["reuse"])
+            graph.add("assembly_lines", parse_assembly, after=["assembly"], inputs=["reuse_lines"])
+        else:
+            graph.add("demangle", c.unmangle_cpp_names, after=["symbols"])
+            graph.add("machine_code", c.decode_machine_code, after=["symbols"], inputs=["elf"])
+            graph.add("assembly", lambda: c.parse_assembly(tools.get_assembly_lines(elf_file)), after=["symbols"])
+        paths_known = ["file_lines", "demangle"]
+
+        if su_dir:
+            graph.add("su_lines", lambda: c.stack_usage_lines(su_dir))
+            graph.add("su", c.parse_stack_usage_lines, after=paths_known, inputs=["su_lines"])
+            paths_known = ["su"]
+
+        if map_file:
+            graph.add("map_table", lambda: c.read_map_cross_reference_table(map_file))
+            graph.add("map", c.parse_map_cross_reference_table, after=paths_known, inputs=["map_table"])
+
+        def enhance():
+            c.elf_mtime = os.path.getmtime(elf_file)
+            c.enhance(self.src_root)
+
+        graph.add("enhance", enhance, after=list(graph.stages))
+        return graph
+
+    def cache_key(self):
+        su_dir = self.get_su_dir()
+        su_files = self.collector.stack_usage_files.find(su_dir) if su_dir else []
+        return analysis_cache.cache_key(self.get_elf_path(), self.get_map_path(), su_files,
+                                        self.collector.gcc_tools.version(), self.src_root)
 
     def needs_build(self):
+        # a watcher saves looking at the files for every request
+        if self.watcher:
+            return self.changed
         return any([os.path.getmtime(f) > t for f, t in self.files.items()])
 
     def build_if_needed(self):
         if self.needs_build():
             self.build()
 
+    def build_in_background(self):
+        # triggers while a build runs are coalesced into at most one more build
+        with self.build_lock:
+            if self.build_thread:
+                return
+            try:
+                if not self.needs_build():
+                    return
+            except OSError:
+                # the linker is still writing the files
+                return
+            self.build_thread = threading.Thread(target=self.build_while_needed, daemon=True)
+            self.build_thread.start()
+
+    def watch(self, debounce=0.2):
+        # changes of the ELF file, the map file and the .su files start a background
+        # build once they were quiet for debounce seconds
+        self.watcher = FileWatcher([self.get_elf_path(), self.get_map_path()], self.get_su_dir(),
+                                   self.files_changed, debounce)
+        self.watcher.start()
+
+    def files_changed(self):
+        self.changed = True
+        self.build_in_background()
+
+    def build_while_needed(self):
+        try:
+            while True:
+                with self.build_lock:
+                    if not self.needs_build():
+                        self.build_thread = None
+                        return
+                self.build()
+        except Exception as e:
+            print("build failed, showing the previous build: %s" % e)
+            with self.build_lock:
+                self.build_thread = None
+
     @abc.abstractmethod
     def get_elf_path(self):
         pass
@@ -44,11 +181,6 @@ class Builder:
     def get_su_dir(self):
         pass
 
-    def build_call_trees(self):
-        for f in self.collector.all_functions():
-            self.backtrace_helper.deepest_callee_tree(f)
-            self.backtrace_helper.deepest_caller_tree(f)
-
 
 class ElfBuilder(Builder):
 
@@ -56,6 +188,8 @@ class ElfBuilder(Builder):
         Builder.__init__(
             self, collector, src_root if src_root else dirname(dirname(elf_file)))
         self.store_file_time(elf_file, store_empty=True)
+        if map_file:
+            self.store_file_time(map_file, store_empty=True)
         self.elf_file = elf_file
         self.map_file = map_file
         self.su_dir = su_dir
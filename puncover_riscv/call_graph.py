@@ -0,0 +1,328 @@
+import array
+import collections.abc
+import threading
+
+
+class CallGraph:
+    """
+    Call graph over functions with dense integer ids.
+
+    Calls are collected as (caller, callee) id pairs and turned into compressed
+    sparse row arrays for both directions, without duplicates, the first time the
+    graph is queried after calls were added.
+    """
+
+    def __init__(self):
+        self.functions = []
+        self.pending_callers = array.array("I")
+        self.pending_callees = array.array("I")
+        self.callee_offsets = array.array("I", [0])
+        self.callee_ids = array.array("I")
+        self.caller_offsets = array.array("I", [0])
+        self.caller_ids = array.array("I")
+        self.self_calls = set()
+        self.dirty = False
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.functions)
+
+    def add_function(self, function):
+        self.functions.append(function)
+        self.dirty = True
+        return len(self.functions) - 1
+
+    def add_call(self, caller_id, callee_id):
+        self.pending_callers.append(caller_id)
+        self.pending_callees.append(callee_id)
+        self.dirty = True
+
+    def add_self_call(self, function_id):
+        # kept out of the rows, a function is not listed as its own caller or callee
+        self.self_calls.add(function_id)
+
+    def freeze(self):
+        with self.lock:
+            if not self.dirty:
+                return
+
+            n = len(self.functions)
+            rows = array.array("I")
+            for caller_id in range(len(self.callee_offsets) - 1):
+                rows.extend([caller_id] * (self.callee_offsets[caller_id + 1] - self.callee_offsets[caller_id]))
+            rows.extend(self.pending_callers)
+            columns = self.callee_ids + self.pending_callees
+
+            # bucketed by caller with a counting sort and deduplicated per caller, the
+            # transposition then yields callers ordered by id and without duplicates
+            self.callee_offsets, self.callee_ids = self.compressed_rows(n, rows, columns, unique=True)
+            rows = array.array("I")
+            for caller_id in range(n):
+                rows.extend([caller_id] * (self.callee_offsets[caller_id + 1] - self.callee_offsets[caller_id]))
+            self.caller_offsets, self.caller_ids = self.compressed_rows(n, self.callee_ids, rows)
+
+            self.pending_callers = array.array("I")
+            self.pending_callees = array.array("I")
+            self.dirty = False
+
+    def compressed_rows(self, n, rows, columns, unique=False):
+        # plain lists, indexing arrays would box every element again
+        rows = list(rows)
+        columns = list(columns)
+
+        counts = [0] * (n + 1)
+        for r in rows:
+            counts[r + 1] += 1
+        for i in range(n):
+            counts[i + 1] += counts[i]
+
+        ids = list(columns)
+        position = counts[:n]
+        for r, c in zip(rows, columns):
+            ids[position[r]] = c
+            position[r] += 1
+
+        if not unique:
+            return array.array("I", counts), array.array("I", ids)
+
+        offsets = [0]
+        unique_ids = []
+        for i in range(n):
+            start, end = counts[i], counts[i + 1]
+            if end - start > 1:
+                unique_ids.extend(sorted(set(ids[start:end])))
+            elif end > start:
+                unique_ids.append(ids[start])
+            offsets.append(len(unique_ids))
+        return array.array("I", offsets), array.array("I", unique_ids)
+
+    def callee_range(self, function_id):
+        if self.dirty:
+            self.freeze()
+        return self.callee_ids, self.callee_offsets[function_id], self.callee_offsets[function_id + 1]
+
+    def caller_range(self, function_id):
+        if self.dirty:
+            self.freeze()
+        return self.caller_ids, self.caller_offsets[function_id], self.caller_offsets[function_id + 1]
+
+    def components(self):
+        """
+        Strongly connected components of the callee graph (Tarjan), without recursion.
+
+        Returns the component index of every function and the components as lists
+        of function ids. A component is listed after all components it calls into.
+        """
+        if self.dirty:
+            self.freeze()
+        offsets, ids = self.callee_offsets, self.callee_ids
+        n = len(self.functions)
+
+        index = [-1] * n
+        low = [0] * n
+        on_stack = bytearray(n)
+        component = [-1] * n
+        components = []
+        stack = []
+        counter = 0
+
+        for root in range(n):
+            if index[root] >= 0:
+                continue
+            index[root] = low[root] = counter
+            counter += 1
+            stack.append(root)
+            on_stack[root] = 1
+            work = [[root, offsets[root]]]
+
+            while work:
+                frame = work[-1]
+                v, i = frame
+                if i < offsets[v + 1]:
+                    frame[1] = i + 1
+                    w = ids[i]
+                    if index[w] < 0:
+                        index[w] = low[w] = counter
+                        counter += 1
+                        stack.append(w)
+                        on_stack[w] = 1
+                        work.append([w, offsets[w]])
+                    elif on_stack[w] and index[w] < low[v]:
+                        low[v] = index[w]
+                    continue
+
+                work.pop()
+                if work:
+                    u = work[-1][0]
+                    if low[v] < low[u]:
+                        low[u] = low[v]
+                if low[v] == index[v]:
+                    members = []
+                    while True:
+                        w = stack.pop()
+                        on_stack[w] = 0
+                        component[w] = len(components)
+                        members.append(w)
+                        if w == v:
+                            break
+                    members.reverse()
+                    components.append(members)
+
+        return component, components
+
+    def cycles(self, components):
+        # components with more than one function or a function calling itself
+        return [members for members in components
+                if len(members) > 1 or members[0] in self.self_calls]
+
+    def longest_paths(self, weights, reverse=False, components=None):
+        """
+        Heaviest call chain from every function towards its callees, or towards its
+        callers if reverse is set, where each function of a cycle is counted once.
+        """
+        component, components = components or self.components()
+        if reverse:
+            offsets, ids = self.caller_offsets, self.caller_ids
+            order = range(len(components) - 1, -1, -1)
+        else:
+            offsets, ids = self.callee_offsets, self.callee_ids
+            order = range(len(components))
+
+        totals = [0] * len(components)
+        entries = [-1] * len(components)
+        for i in order:
+            best, entry = 0, -1
+            members = components[i]
+            for v in members:
+                for k in range(offsets[v], offsets[v + 1]):
+                    j = component[ids[k]]
+                    if j != i and totals[j] > best:
+                        best, entry = totals[j], ids[k]
+            totals[i] = best + sum(weights[v] for v in members)
+            entries[i] = entry
+        return LongestPaths(self.functions, component, components, totals, entries)
+
+    def callees(self, function_id):
+        ids, start, end = self.callee_range(function_id)
+        return ids[start:end]
+
+    def callers(self, function_id):
+        ids, start, end = self.caller_range(function_id)
+        return ids[start:end]
+
+
+class CallList(collections.abc.Sequence):
+    """
+    The callers or callees of one function as a read-only sequence of symbols.
+    """
+
+    __slots__ = ["graph", "function_id", "reverse"]
+
+    def __init__(self, graph, function_id, reverse=False):
+        self.graph = graph
+        self.function_id = function_id
+        self.reverse = reverse
+
+    def range(self):
+        if self.reverse:
+            return self.graph.caller_range(self.function_id)
+        return self.graph.callee_range(self.function_id)
+
+    def __len__(self):
+        _, start, end = self.range()
+        return end - start
+
+    def __getitem__(self, index):
+        ids, start, end = self.range()
+        if isinstance(index, slice):
+            return [self.graph.functions[i] for i in ids[start:end][index]]
+        if index < 0:
+            index += end - start
+        if not 0 <= index < end - start:
+            raise IndexError("call list index out of range")
+        return self.graph.functions[ids[start + index]]
+
+    def __iter__(self):
+        ids, start, end = self.range()
+        functions = self.graph.functions
+        for i in range(start, end):
+            yield functions[ids[i]]
+
+    def __contains__(self, function):
+        return any(f is function for f in self)
+
+    def __eq__(self, other):
+        if isinstance(other, (CallList, list, tuple)):
+            return list(self) == list(other)
+        return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self):
+        return "CallList(%r)" % [f.get("name") for f in self]
+
+
+class LongestPaths:
+    """
+    Result of CallGraph.longest_paths() on the condensed call graph: the total
+    weight of every component and the function its heaviest chain continues with.
+    """
+
+    def __init__(self, functions, component, components, totals, entries):
+        self.functions = functions
+        self.component = component
+        self.components = components
+        self.totals = totals
+        self.entries = entries
+
+    def total(self, function_id):
+        return self.totals[self.component[function_id]]
+
+    def path(self, function_id):
+        result = []
+        v = function_id
+        while v >= 0:
+            members = self.components[self.component[v]]
+            result.append(self.functions[v])
+            if len(members) > 1:
+                result.extend(self.functions[m] for m in members if m != v)
+            v = self.entries[self.component[v]]
+        return result
+
+
+class CallPath(collections.abc.Sequence):
+    """
+    The functions along the heaviest call chain of one function, only listed
+    when first accessed.
+    """
+
+    __slots__ = ["paths", "function_id", "items"]
+
+    def __init__(self, paths, function_id):
+        self.paths = paths
+        self.function_id = function_id
+        self.items = None
+
+    def list(self):
+        if self.items is None:
+            self.items = self.paths.path(self.function_id)
+        return self.items
+
+    def __len__(self):
+        return len(self.list())
+
+    def __getitem__(self, index):
+        return self.list()[index]
+
+    def __iter__(self):
+        return iter(self.list())
+
+    def __eq__(self, other):
+        if isinstance(other, (CallPath, list, tuple)):
+            return self.list() == list(other)
+        return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self):
+        return "CallPath(%r)" % [f.get("name") for f in self]
@@ -1,9 +1,21 @@
-import fnmatch
+import bisect
+import collections
+import hashlib
+import itertools
 import os
 import re
 import sys
+import threading
 import time
 
+from puncover_riscv.assembly import AssemblyStore
+from puncover_riscv.call_graph import CallGraph, CallList
+from puncover_riscv.dwarf import DwarfInfo
+from puncover_riscv.elf import ElfFile, SHT_NOBITS, section_flag_letters, section_type_name
+from puncover_riscv.riscv import EM_RISCV, Decoder
+from puncover_riscv.search import NameIndex
+from puncover_riscv.stack_usage import StackUsageFiles
+
 CANTFIX = "cantfix"
 NAME = "name"
 DISPLAY_NAME = "display_name"
@@ -40,9 +52,22 @@ COLLAPSED_NAME = "collapsed_name"
 COLLAPSED_SUB_FOLDERS = "collapsed_sub_folders"
 CALLEES = "callees"
 CALLERS = "callers"
+FUNCTION_ID = "function_id"
+CODE_DIGEST = "code_digest"
+TOTAL_CODE_SIZE = "total_code_size"
+TOTAL_VAR_SIZE = "total_var_size"
+TOTAL_STACK_SIZE = "total_stack_size"
+LINES_DIGEST = "lines_digest"
 
 DEEPEST_CALLEE_TREE = "deepest_callee_tree"
 DEEPEST_CALLER_TREE = "deepest_caller_tree"
+RECURSIVE_CYCLE = "recursive_cycle"
+
+# taken over from the previous generation by functions whose code digest is unchanged
+REUSED_KEYS = [ASM, SIZE, DISPLAY_NAME, STACK_SIZE, STACK_QUALIFIERS, "call_hard_float"]
+
+# more changed address ranges are disassembled with a single objdump run over the image
+MAX_ASSEMBLY_RANGES = 16
 
 
 def warning(*objs):
@@ -64,6 +89,15 @@ def left_strip_from_list(lines):
     return list([line[len(longest_match):] for line in lines])
 
 
+def search_text(symbol):
+    # fragments of both names are found, mangled C++ names included
+    name = symbol[NAME]
+    display_name = symbol.get(DISPLAY_NAME)
+    if not display_name or display_name == name:
+        return name
+    return "%s\t%s" % (display_name, name)
+
+
 class Collector:
 
     def __init__(self, gcc_tools):
@@ -73,13 +107,106 @@ class Collector:
         self.file_elements = {}
         self.symbols_by_qualified_name = None
         self.symbols_by_name = None
-
-    def reset(self):
+        self.symbols_by_path = None
+        self.symbols_by_path_line = None
+        self.sorted_symbols = None
+        self.search_index = None
+        self.call_graph = CallGraph()
+        # incremented for every build, results derived from a build are keyed by it
+        self.generation = 0
+        # when the builder finished the build
+        self.build_time = None
+        self.call_trees = {}
+        self.call_trees_lock = threading.RLock()
+        self.elf = None
+        self.machine_code = {}
+        self.function_code_ranges = None
+        self.assembly = None
+        # survives reset() so that rebuilds only read changed .su files
+        self.stack_usage_files = StackUsageFiles()
+        # what an incremental build takes over from the previous generation, see reset()
+        self.previous = None
+        self.reused = {}
+        self.reused_assembly = set()
+        self.dwarf_units = {}
+
+    def reset(self, keep_previous=False):
+        self.close_elf()
+        # the disassembly of the previous generation stays in the store for functions
+        # that are taken over by reuse_unchanged_functions()
+        self.previous = self.previous_generation() if keep_previous else None
+        if self.previous is None:
+            # other snapshots may still read from the store, it is closed with the last of them
+            self.assembly = None
+            self.dwarf_units = {}
         self.section = {}
         self.symbols = {}
         self.file_elements = {}
         self.symbols_by_qualified_name = None
         self.symbols_by_name = None
+        self.symbols_by_path = None
+        self.symbols_by_path_line = None
+        self.sorted_symbols = None
+        self.search_index = None
+        self.call_graph = CallGraph()
+        self.generation += 1
+        self.call_trees = {}
+        self.machine_code = {}
+        self.function_code_ranges = None
+        self.reused = {}
+        self.reused_assembly = set()
+
+    def next_generation(self, keep_previous=False):
+        """
+        Returns an empty collector for the next build. Unlike reset() this collector
+        stays untouched, so that it can still be shown while the next one is built.
+        """
+        c = Collector(self.gcc_tools)
+        c.generation = self.generation + 1
+        c.stack_usage_files = self.stack_usage_files
+        c.previous = self.previous_generation() if keep_previous else None
+        if c.previous is not None:
+            # the store is append-only, the disassembly of changed functions is added to it
+            c.assembly = self.assembly
+            c.dwarf_units = self.dwarf_units
+        return c
+
+    def previous_generation(self):
+        # functions by address with their machine code and the addresses they call,
+        # and the display names of all symbols
+        functions = {}
+        self_calls = self.call_graph.self_calls
+        for address, sym in self.symbols.items():
+            if CODE_DIGEST not in sym:
+                continue
+            targets = [int(c[ADDRESS], 16) for c in sym.get(CALLEES, [])]
+            if sym.get(FUNCTION_ID) in self_calls:
+                targets.append(address)
+            functions[address] = (sym, self.machine_code.get(address), targets)
+        if not functions:
+            return None
+
+        display_names = {s[NAME]: s[DISPLAY_NAME] for s in self.symbols.values() if DISPLAY_NAME in s}
+        return functions, display_names
+
+    def drop_previous(self):
+        self.previous = None
+        self.compact_assembly()
+
+    def compact_assembly(self):
+        # incremental builds append the disassembly of changed functions, once most of
+        # the store is no longer referenced the remaining lines are copied to a new one
+        if not self.assembly:
+            return
+        symbols = [s for s in self.symbols.values() if ASM in s]
+        used = sum(s[ASM].length for s in symbols)
+        if self.assembly.size <= 2 * used + (1 << 20):
+            return
+
+        store = AssemblyStore()
+        for s in symbols:
+            s[ASM] = store.add(s[ASM].lines())
+        self.assembly = store
 
     def qualified_symbol_name(self, symbol):
         if BASE_FILE in symbol:
@@ -95,6 +222,20 @@ class Collector:
         int_addr = int(addr, 16)
         return self.symbols.get(int_addr, None)
 
+    def section_create(self, index: int, name: str, type: str, address: int, size: int, flag: str, align: int):
+        if address <= 0:
+            return False
+
+        sec = self.section.get(index, {})
+        sec[NAME] = name
+        sec[TYPE] = type
+        sec[ADDRESS] = address
+        sec[SIZE] = size
+        sec[FLAG] = flag
+        sec[ALIGN] = align
+        self.section[index] = sec
+        return sec
+
     def symbol_create(self, name: str, address: str, type: str, size: int, sec: int, bind: str):
         int_address = int(address, 16)
         sym = self.symbols.get(int_address, {})
@@ -114,6 +255,7 @@ class Collector:
             sym["local"] = True
 
         self.symbols[int_address] = sym
+        self.sorted_symbols = None
         return sym
 
     def symbol_add_file_line(self, address: int, name: str, file: str = None, line: int = None):
@@ -123,12 +265,19 @@ class Collector:
         if sym[NAME] != name:
             return False
 
+        indexed = PATH in sym
         if file:
             sym[PATH] = file
             sym[BASE_FILE] = os.path.basename(file)
         if line:
             sym[LINE] = line
 
+        if self.symbols_by_path is not None:
+            if indexed:
+                self.symbols_by_path = None
+            else:
+                self.index_symbol_path(sym, self.symbols_by_path, self.symbols_by_path_line)
+
         self.symbols[address] = sym
         return sym
 
@@ -142,65 +291,277 @@ class Collector:
 
         if sym[TYPE] == TYPE_FUNCTION:
             assembly = left_strip_from_list(assembly)
-            sym[ASM] = assembly
+            sym[ASM] = self.store_assembly(assembly)
             self.symbols[address] = sym
             return sym
 
         else:
             return False
 
-    def symbol_add_stack_usage(self, file: str, line: int, name: str, stack: int, qualifier: str):
-        samefile_symbols = [
-            s for s in self.symbols.values() if s.get(PATH, None) == file]
+    def store_assembly(self, lines):
+        if self.assembly is None:
+            self.assembly = AssemblyStore()
+        return self.assembly.add(lines)
 
-        for sym in samefile_symbols:
-            if sym.get(LINE, None) == line or self.display_names_match(name, sym.get(DISPLAY_NAME, None)):
-                sym[STACK_SIZE] = stack
-                sym[STACK_QUALIFIERS] = qualifier
-                return True
+    def symbol_add_stack_usage(self, file: str, line: int, name: str, stack: int, qualifier: str):
+        self.build_symbol_path_index()
+
+        sameline_symbols = self.symbols_by_path_line.get((file, line), [])
+        matches = [s for s in sameline_symbols if self.display_names_match(name, s.get(DISPLAY_NAME, None))]
+        if not matches:
+            matches = sameline_symbols
+        if not matches:
+            matches = [s for s in self.symbols_by_path.get(file, [])
+                       if self.display_names_match(name, s.get(DISPLAY_NAME, None))]
+
+        for sym in matches:
+            sym[STACK_SIZE] = stack
+            sym[STACK_QUALIFIERS] = qualifier
+            return True
 
         return False
 
+    # dense id of a function in the call graph, also gives it its CALLERS and CALLEES
+    def function_id(self, function):
+        result = function.get(FUNCTION_ID, None)
+        if result is None:
+            result = self.call_graph.add_function(function)
+            function[FUNCTION_ID] = result
+            function[CALLERS] = CallList(self.call_graph, result, reverse=True)
+            function[CALLEES] = CallList(self.call_graph, result)
+        return result
+
     def symbol_add_function_call(self, caller, callee):
-        if caller != callee:
-            if not callee in caller[CALLEES]:
-                caller[CALLEES].append(callee)
-            if not caller in callee[CALLERS]:
-                callee[CALLERS].append(caller)
+        if caller is not callee:
+            self.call_graph.add_call(self.function_id(caller), self.function_id(callee))
+        else:
+            self.call_graph.add_self_call(self.function_id(caller))
 
     # parse group
 
     def parse_elf(self, elf_file):
         print("parsing ELF at %s" % elf_file)
 
-        print("parsing sections ", end="")
-        for l in self.gcc_tools.get_elf_section(elf_file):
+        elf = self.open_elf(elf_file)
+        self.read_elf_sections(elf)
+        self.read_elf_symbols(elf)
+        self.unmangle_cpp_names()
+        self.symbols_add_dwarf_file_lines(self.parse_dwarf(elf))
+        self.decode_machine_code(elf)
+        self.parse_assembly(self.gcc_tools.get_assembly_lines(elf_file))
+
+        self.elf_mtime = os.path.getmtime(elf_file)
+
+    # the steps below only depend on the tool output they are given (and on
+    # symbols having been created), which lets the builder run the tools concurrently
+
+    def open_elf(self, elf_file):
+        self.close_elf()
+        self.elf = ElfFile(elf_file)
+        return self.elf
+
+    def close_elf(self):
+        if self.elf:
+            self.elf.close()
+            self.elf = None
+
+    def read_elf_sections(self, elf):
+        for s in elf.sections():
+            self.section_create(s.index, s.name, section_type_name(s.type), s.address,
+                                s.size, section_flag_letters(s.flags), s.align)
+        print("parsed total %d sections" % len(self.section.values()))
+
+    def read_elf_symbols(self, elf):
+        types = {"FUNC": TYPE_FUNCTION, "OBJECT": TYPE_VARIABLE}
+
+        for s in elf.symbols():
+            # undefined, absolute and common symbols do not occupy memory of the image
+            if s.size > 0 and s.type in types and s.section is not None:
+                address = "%0*x" % (elf.address_digits, s.value)
+                self.symbol_create(s.name, address, types[s.type], s.size, s.section, s.bind)
+        print("parsed total %d symbols" % len(self.symbols.values()))
+
+    def parse_dwarf(self, elf):
+        dwarf = DwarfInfo(elf).parse(self.dwarf_units)
+        if self.dwarf_units:
+            print("reused %d of %d compile units" % (dwarf.units_reused, len(dwarf.units)))
+        self.dwarf_units = dwarf.units
+        return dwarf
+
+    def symbols_add_dwarf_file_lines(self, dwarf):
+        print("parse symbols path line")
+        for address, sym in list(self.symbols.items()):
+            location = dwarf.location(address)
+            if location:
+                self.symbol_add_file_line(address, sym[NAME], location[0], location[1])
+
+    def code_ranges(self, elf):
+        # (start, end) file offsets of the code of every function, like in an objdump
+        # listing the code of a function runs up to the next symbol
+        if self.function_code_ranges is not None:
+            return self.function_code_ranges
+
+        sections = elf.sections()
+        starts = {}
+        for s in elf.symbols():
+            if s.name and not s.name.startswith(("$", ".L")) and s.type in ["FUNC", "OBJECT", "NOTYPE"] \
+                    and s.section is not None and s.section < len(sections):
+                starts.setdefault(s.section, set()).add(s.value)
+        starts = {index: sorted(values) for index, values in starts.items()}
+
+        result = {}
+        for address, sym in self.symbols.items():
+            index = sym.get(SECTION)
+            if sym[TYPE] != TYPE_FUNCTION or index not in starts:
+                continue
+            section = sections[index]
+            section_end = section.address + section.size
+            if section.type == SHT_NOBITS or not section.address <= address < section_end:
+                continue
+
+            following = starts[index]
+            i = bisect.bisect_right(following, address)
+            end = following[i] if i < len(following) else section_end
+            offset = section.offset + address - section.address
+            result[address] = (offset, offset + min(end, section_end) - address)
+
+        self.function_code_ranges = result
+        return result
+
+    def decode_machine_code(self, elf):
+        if elf.machine != EM_RISCV:
+            return self.machine_code
+
+        decoder = Decoder(elf.address_size * 8)
+        for address, (start, end) in self.code_ranges(elf).items():
+            # reused functions already have the machine code of the previous generation
+            if address not in self.machine_code:
+                self.machine_code[address] = decoder.scan(elf.data, start, end, address)
+
+        print("decoded %d functions" % len(self.machine_code))
+        return self.machine_code
+
+    def reuse_unchanged_functions(self, elf):
+        """
+        Gives every function a digest of its symbol and code. Functions whose digest is
+        unchanged since the previous generation take over its disassembly, sizes, stack
+        usage and calls.
+
+        Returns the address ranges that still need to be disassembled, or None for all.
+        """
+        functions, display_names = self.previous or ({}, {})
+        changed = []
+        for address, (start, end) in sorted(self.code_ranges(elf).items()):
+            sym = self.symbols[address]
+            digest = hashlib.sha1(repr((sym[NAME], sym[SIZE])).encode("utf-8"))
+            digest.update(elf.data[start:end])
+            sym[CODE_DIGEST] = digest.digest()
+
+            previous = functions.get(address)
+            if previous is None or previous[0].get(CODE_DIGEST) != sym[CODE_DIGEST]:
+                changed.append((address, address + end - start))
+                continue
+
+            old, code, targets = previous
+            for k in REUSED_KEYS:
+                if k in old:
+                    sym[k] = old[k]
+            if code:
+                self.machine_code[address] = code
+            self.reused[address] = targets
+            if ASM in sym:
+                self.reused_assembly.add(address)
+
+        for sym in self.symbols.values():
+            name = sym[NAME]
+            if DISPLAY_NAME not in sym and name in display_names:
+                sym[DISPLAY_NAME] = display_names[name]
+        # reused sizes change the size order
+        self.sorted_symbols = None
+
+        if not functions:
+            return None
+        print("reused %d of %d functions" % (len(self.reused), len(changed) + len(self.reused)))
+        return self.assembly_ranges(changed)
+
+    def reuse_unchanged_lines(self, elf, dwarf):
+        """
+        Gives every function a digest of the line table rows locating its code. As the
+        disassembly interleaves the source, reused functions whose rows changed, e.g.
+        as lines were added above them, are disassembled again.
+
+        Returns the address ranges to disassemble, like reuse_unchanged_functions().
+        """
+        functions = self.previous[0] if self.previous else {}
+        changed = []
+        for address, (start, end) in sorted(self.code_ranges(elf).items()):
+            sym = self.symbols[address]
+            if address in self.reused and not dwarf.lines_changed(address, address + end - start):
+                old = functions[address][0]
+                if LINES_DIGEST in old:
+                    sym[LINES_DIGEST] = old[LINES_DIGEST]
+                    continue
+
+            addresses, files, lines = dwarf.lines_in_range(address, address + end - start)
+            digest = hashlib.sha1(addresses.tobytes())
+            digest.update(lines.tobytes())
+            digest.update(repr(files).encode("utf-8"))
+            sym[LINES_DIGEST] = digest.digest()
+
+            if address in self.reused_assembly and functions[address][0].get(LINES_DIGEST) != sym[LINES_DIGEST]:
+                self.reused_assembly.discard(address)
+                changed.append((address, address + end - start))
+
+        return self.assembly_ranges(changed)
+
+    def assembly_ranges(self, changed):
+        # objdump -S shows a few source lines in front of the first function of a run,
+        # starting at the preceding function its listing continues where the one of the
+        # preceding function ended, like in a listing of the whole image. Neighbouring
+        # functions are disassembled together, with too many ranges a single run over
+        # the whole image is faster
+        addresses = sorted(self.function_code_ranges)
+        ranges = []
+        for start, end in changed:
+            i = bisect.bisect_left(addresses, start)
+            if i > 0:
+                start = addresses[i - 1]
+            if ranges and ranges[-1][1] >= start:
+                ranges[-1] = (ranges[-1][0], max(ranges[-1][1], end))
+            else:
+                ranges.append((start, end))
+        return ranges if len(ranges) <= MAX_ASSEMBLY_RANGES else None
+
+    def symbol_machine_code(self, symbol):
+        if not self.machine_code or ADDRESS not in symbol:
+            return None
+        return self.machine_code.get(int(symbol[ADDRESS], 16))
+
+    # readelf based variants of read_elf_sections and read_elf_symbols
+
+    def parse_elf_sections(self, lines):
+        for l in lines:
             self.parse_elf_section(l)
-        print("total %d" % len(self.section.values()))
-        # for sec in self.section.values():
-        #     print(sec)
+        print("parsed total %d sections" % len(self.section.values()))
 
-        print("parsing symbols ", end="")
-        for l in self.gcc_tools.get_elf_symbols(elf_file):
+    def parse_elf_symbol_table(self, lines):
+        for l in lines:
             self.parse_elf_symbols(l)
-        print("total %d" % len(self.symbols.values()))
-
-        print("unmangling c++ symbols")
-        self.unmangle_cpp_names()
+        print("parsed total %d symbols" % len(self.symbols.values()))
 
+    def parse_elf_symbols_file_lines(self, lines):
         print("parse symbols path line")
-        for l in self.gcc_tools.get_elf_symbols_file_line(elf_file):
+        for l in lines:
             self.parse_elf_symbols_file_line(l)
 
+    def parse_assembly(self, lines):
         print("parse assembly text")
-        count = self.parse_assembly_text(
-            "".join(self.gcc_tools.get_assembly_lines(elf_file)))
+        count = self.parse_assembly_lines(lines)
 
         print("parsed total %d functions" % count)
         print("parsed total %d variable" %
               (len(self.symbols.values()) - count))
-
-        self.elf_mtime = os.path.getmtime(elf_file)
+        return count
 
     # [Nr] Name              Type            Addr     Off    Size   ES Flg Lk Inf Al
     # [ 4] .text             PROGBITS        a0000c00 002c00 011cc0 00  AX  0   0 64
@@ -222,19 +583,7 @@ class Collector:
         s_flag = match.group(6)
         s_align = int(match.group(8))
 
-        if s_addr > 0:
-            sec = self.section.get(s_index, {})
-            sec[NAME] = s_name
-            sec[TYPE] = s_type
-            sec[ADDRESS] = s_addr
-            sec[SIZE] = s_size
-            sec[FLAG] = s_flag
-            sec[ALIGN] = s_align
-            self.section[s_index] = sec
-        else:
-            return False
-
-        return sec
+        return self.section_create(s_index, s_name, s_type, s_addr, s_size, s_flag, s_align)
 
     # 41: 00000000     0 FILE    LOCAL  DEFAULT  ABS vfprintf.c
     # 42: a0004d50   146 FUNC    LOCAL  DEFAULT    4 __sbprintf
@@ -263,11 +612,16 @@ class Collector:
             return False
 
     def unmangle_cpp_names(self):
-        s_name = list(symbol[NAME] for symbol in self.all_symbols())
+        print("unmangling c++ symbols")
+        # names known from the previous generation already have their display name
+        symbols = [s for s in self.all_symbols() if DISPLAY_NAME not in s]
+        s_name = list(symbol[NAME] for symbol in symbols)
+        if not s_name:
+            return
 
         unmangled_names = self.gcc_tools.get_unmangled_names(s_name)
 
-        for s in self.all_symbols():
+        for s in symbols:
             s[DISPLAY_NAME] = unmangled_names[s[NAME]]
 
     # 9ffff000 00000100 D fw_header	/home/egahp/bsp/board/bl616dk/fw_header.c:3
@@ -290,31 +644,67 @@ class Collector:
 
         return True
 
-    find_symbol_in_map_pattern = re.compile(
-        r"^\w+\s+([-\.\/\w]+)\(([-\.\/\w]+)\)")
+    # Cross Reference Table
+    #
+    # Symbol                                            File
+    # memcpy                                            /opt/riscv/lib/libc.a(lib_a-memcpy.o)
+    #                                                   build/main.o
+    find_object_in_map_pattern = re.compile(
+        r"^([-\.\/\w+]+)\(([-\.\/\w+]+)\)")
 
     def parse_map(self, map_file):
+        self.parse_map_cross_reference_table(
+            self.read_map_cross_reference_table(map_file))
+
+    def read_map_cross_reference_table(self, map_file):
+        with open(map_file, "r", errors="replace") as f:
+            return self.map_cross_references(f)
+
+    # reads the lines once and keeps only the archive member defining each symbol,
+    # i.e. the first file listed for it
+    def map_cross_references(self, lines):
+        result = {}
+        in_table = False
+        name = None
+
+        for line in lines:
+            if not in_table:
+                in_table = line.startswith("Cross Reference Table")
+                continue
+
+            line = line.rstrip()
+            if not line:
+                continue
+
+            if not line[0].isspace():
+                parts = line.rsplit(None, 1)
+                name = parts[0]
+                if len(parts) == 1:
+                    # the file is on the next line
+                    continue
+                file = parts[1]
+            elif name is not None:
+                file = line.strip()
+            else:
+                continue
 
-        map_file_obj = open(map_file, 'r')
-        map_file_content = ""
-        try:
-            map_file_content = map_file_obj.read()
-        finally:
-            map_file_obj.close()
+            match = self.find_object_in_map_pattern.match(file)
+            if match and name not in result:
+                result[name] = (match.group(1), match.group(2))
+            # further lines of this symbol list the files referencing it
+            name = None
 
-        map_file_content = map_file_content[map_file_content.find(
-            "Cross Reference Table"):]
+        return result
 
+    def parse_map_cross_reference_table(self, references):
         for sym in self.all_functions():
             if PATH not in sym:
                 s_name = sym[NAME]
                 s_addr = int(sym[ADDRESS], 16)
-                map_index = map_file_content.find('\n' + s_name) + 1
-                match = self.find_symbol_in_map_pattern.match(
-                    map_file_content[map_index:])
-                if match:
+                definition = references.get(s_name)
+                if definition:
                     file_path = '$without_debuginfo/' + \
-                        match.group(1) + '/' + match.group(2)
+                        definition[0] + '/' + definition[1]
                     self.symbol_add_file_line(s_addr, s_name, file_path, None)
                 else:
                     file_path = "$unknown_generated/" + sym[BIND]
@@ -334,9 +724,19 @@ class Collector:
     # 00000098 <pbl_table_addr>:
     # 00000098 <pbl_table_addr.constprop.0>:
     parse_assembly_text_function_start_pattern = re.compile(
-        r"^([\da-f]{8})\s+<([\.\w]*)>:")
+        r"^([\da-f]{8,16})\s+<([\.\w]*)>:")
+
+    # app.elf:     file format elf32-littleriscv
+    # Disassembly of section .text:
+    parse_assembly_text_section_start_pattern = re.compile(
+        r"^(\S+:\s+file format\s|Disassembly of section\s)")
 
     def parse_assembly_text(self, assembly):
+        return self.parse_assembly_lines(assembly.split("\n"))
+
+    # consumes any iterable of lines, e.g. a generator reading from the objdump pipe,
+    # and hands over each function as soon as the next one starts
+    def parse_assembly_lines(self, lines):
         name = None
         addr = None
         assembly_lines = []
@@ -344,18 +744,27 @@ class Collector:
 
         def flush_current_symbol():
             if name and addr:
+                # reused functions keep the disassembly of the previous generation
+                if int(addr, 16) in self.reused_assembly:
+                    return 1
                 if False == self.symbol_add_assembly(int(addr, 16), assembly_lines):
                     return 0
                 return 1
             return 0
 
-        for line in assembly.split("\n"):
+        for line in lines:
+            line = line.rstrip("\n")
             match = self.parse_assembly_text_function_start_pattern.match(line)
             if match:
                 found_symbols += flush_current_symbol()
                 addr = match.group(1)
                 name = match.group(2)
                 assembly_lines = []
+            elif self.parse_assembly_text_section_start_pattern.match(line):
+                # headers of the listing, or of the next objdump run over an address range
+                found_symbols += flush_current_symbol()
+                name = addr = None
+                assembly_lines = []
             else:
                 if line.strip() != "":
                     assembly_lines.append(line)
@@ -363,48 +772,32 @@ class Collector:
         found_symbols += flush_current_symbol()
         return found_symbols
 
-    def parse_su(self, su_dir):
-
-        def gen_find(filepat, top):
-            for path, dirlist, filelist in os.walk(top):
-                for name in fnmatch.filter(filelist, filepat):
-                    yield os.path.join(path, name)
-
-        def gen_open(filenames):
-            for name in filenames:
-                yield open(name)
-
-        def gen_cat(sources):
-            for s in sources:
-                for item in s:
-                    yield item
-
-        def get_stack_usage_lines(su_dir):
-            names = gen_find("*.su", su_dir)
-            files = gen_open(names)
-            lines = gen_cat(files)
-            return lines
+    def stack_usage_lines(self, su_dir):
+        return self.stack_usage_files.lines(su_dir)
 
+    def parse_su(self, su_dir):
         if su_dir:
             print("parsing stack usages starting at %s" % su_dir)
-            print("find symbol missing paths from su file")
+            self.parse_stack_usage_lines(self.stack_usage_lines(su_dir))
+
+    def parse_stack_usage_lines(self, lines):
+        print("find symbol missing paths from su file")
 
-            missing_path_symbols = [
-                s for s in self.all_functions() if s.get(PATH, None) == None]
+        missing_path_symbols = [
+            s for s in self.symbols.values() if s.get(TYPE, None) == TYPE_FUNCTION and s.get(PATH, None) == None]
 
-            # find canfix path symbols
-            for sym1 in missing_path_symbols:
-                for sym2 in missing_path_symbols:
-                    if (sym1[ADDRESS] != sym2[ADDRESS]):
-                        if (sym1[NAME] == sym2[NAME]):
-                            sym1[CANTFIX] = True
-                            sym2[CANTFIX] = True
+        # a name shared by several functions without path cannot be told apart in .su files
+        name_counts = collections.Counter(s[NAME] for s in missing_path_symbols)
 
-            canfix_path_symbols = [
-                s for s in missing_path_symbols if s.get(CANTFIX, False) == False]
+        canfix_path_symbols = {}
+        for s in missing_path_symbols:
+            if name_counts[s[NAME]] > 1:
+                s[CANTFIX] = True
+            else:
+                canfix_path_symbols[s[NAME]] = s
 
-            for l in get_stack_usage_lines(su_dir):
-                self.parse_stack_usage_line(l, canfix_path_symbols)
+        for l in lines:
+            self.parse_stack_usage_line(l, canfix_path_symbols)
 
     # puncover_riscv.c:8:43:dynamic_stack2	16	dynamic
     # puncover_riscv.c:14:40:0	16	dynamic,bounded
@@ -424,12 +817,10 @@ class Collector:
         s_stack_size = int(match.group(6))
         s_qualifier = match.group(7)
 
-        for sym in canfix_symbols:
-            if sym[NAME] == s_name:
-                self.symbol_add_file_line(
-                    int(sym[ADDRESS], 16), sym[NAME], s_file, s_line)
-                canfix_symbols.remove(sym)
-                break
+        sym = canfix_symbols.pop(s_name, None)
+        if sym:
+            self.symbol_add_file_line(
+                int(sym[ADDRESS], 16), sym[NAME], s_file, s_line)
 
         return self.symbol_add_stack_usage(s_file, s_line, s_name, s_stack_size, s_qualifier)
 
@@ -498,27 +889,47 @@ class Collector:
 
     def normalize_files_paths(self, base_dir):
         base_dir = os.path.abspath(base_dir) if base_dir else "/"
+        self.symbols_by_path = None
+        # far fewer files than symbols
+        normalized = {}
 
         for s in self.all_symbols():
             path = s.get(PATH, None)
             if path:
-                if path.startswith(base_dir):
-                    path = os.path.relpath(path, base_dir)
-                elif path.startswith("/"):
-                    path = path[1:]
-                s[PATH] = path
+                result = normalized.get(path)
+                if result is None:
+                    result = path
+                    if path.startswith(base_dir):
+                        result = os.path.relpath(path, base_dir)
+                    elif path.startswith("/"):
+                        result = path[1:]
+                    normalized[path] = result
+                s[PATH] = result
 
     def sorted_by_size(self, symbols):
         return sorted(symbols, key=lambda k: k.get("size", 0), reverse=True)
 
+    # the lists are built once and shared by all callers until symbols are added,
+    # resized or reset, callers must not modify them
+    def symbol_views(self):
+        # reset wherever symbols are added or their sizes change
+        if self.sorted_symbols is None:
+            symbols = self.sorted_by_size(self.symbols.values())
+            self.sorted_symbols = (
+                symbols,
+                list([f for f in symbols if f.get(TYPE, None) == TYPE_FUNCTION]),
+                list([f for f in symbols if f.get(TYPE, None) == TYPE_VARIABLE]),
+            )
+        return self.sorted_symbols
+
     def all_symbols(self):
-        return self.sorted_by_size(self.symbols.values())
+        return self.symbol_views()[0]
 
     def all_functions(self):
-        return list([f for f in self.all_symbols() if f.get(TYPE, None) == TYPE_FUNCTION])
+        return self.symbol_views()[1]
 
     def all_variables(self):
-        return list([f for f in self.all_symbols() if f.get(TYPE, None) == TYPE_VARIABLE])
+        return self.symbol_views()[2]
 
     def enhance(self, src_root):
         print("enhancing libc symbols")
@@ -526,11 +937,12 @@ class Collector:
 
         self.normalize_files_paths(src_root)
         print("enhancing function sizes")
-        self.enhance_function_size_from_assembly()
+        self.enhance_function_size()
         print("deriving folders")
         self.derive_folders()
         print("enhancing file elements")
         self.enhance_file_elements()
+        self.enhance_size_totals()
         print("enhancing assembly")
         self.enhance_assembly()
         print("enhancing call tree")
@@ -550,6 +962,7 @@ class Collector:
                       "free", "kmalloc", "kfree", "pvPortMallocStack", "vPortFreeStack"]
 
     def enhance_libc_symbols(self):
+        self.symbols_by_path = None
         for sym in self.symbols.values():
             match = self.is_libc_softfp_pattern.match(sym[PATH])
 
@@ -576,9 +989,13 @@ class Collector:
         return True
 
     def derive_folders(self):
+        self.symbols_by_path = None
+        normalized = {}
         for s in self.all_symbols():
             p = s.get(PATH, "$unknown/unknown")
-            p = os.path.normpath(p)
+            if p not in normalized:
+                normalized[p] = os.path.normpath(p)
+            p = normalized[p]
             s[PATH] = p
             s[BASE_FILE] = os.path.basename(p)
             s[FILE] = self.file_for_path(p)
@@ -586,9 +1003,12 @@ class Collector:
 
     def enhance_assembly(self):
         for key, symbol in self.symbols.items():
-            if ASM in symbol:
-                symbol[ASM] = list([self.enhanced_assembly_line(l)
-                                   for l in symbol[ASM]])
+            if ASM in symbol and key not in self.reused_assembly:
+                lines = list(symbol[ASM])
+                enhanced = list([self.enhanced_assembly_line(l) for l in lines])
+                # only functions with calls to link get a second copy in the store
+                if enhanced != lines:
+                    symbol[ASM] = self.store_assembly(enhanced)
 
     #   98: a8a8a8a8  bl 98
     # a0004074:	35a1                	jal	a0003ebc
@@ -605,14 +1025,37 @@ class Collector:
 
     def enhance_call_tree(self):
         for f in self.all_functions():
-            for k in [CALLERS, CALLEES]:
-                f[k] = f.get(k, [])
+            self.function_id(f)
 
         for f in self.all_functions():
-            if ASM in f:
+            targets = self.reused.get(int(f[ADDRESS], 16))
+            code = self.symbol_machine_code(f)
+            if targets is not None:
+                self.enhance_call_tree_from_targets(f, targets)
+            elif code:
+                self.enhance_call_tree_from_machine_code(f, code)
+            elif ASM in f:
                 [self.enhance_call_tree_from_assembly_line(
                     f, l) for l in f[ASM]]
 
+    def enhance_call_tree_from_targets(self, function, targets):
+        # the calls of a reused function, by the addresses of its callees
+        for target in targets:
+            callee = self.symbols.get(target)
+            if callee and callee.get(TYPE) == TYPE_FUNCTION:
+                self.symbol_add_function_call(function, callee)
+
+    def enhance_call_tree_from_machine_code(self, function, code):
+        if code.fpu:
+            function["call_hard_float"] = True
+
+        # jumps to other functions are tail calls, jumps to the own start are loops
+        for targets, loops in [(code.calls, False), (code.jumps, True)]:
+            for target in targets:
+                callee = self.symbols.get(target)
+                if callee and callee.get(TYPE) == TYPE_FUNCTION and not (loops and callee is function):
+                    self.symbol_add_function_call(function, callee)
+
     # 寄存器跳转无法追踪
     # a0002c3e:	8682                	jr	a3
     # a0003f04:	9982                	jalr	s3
@@ -664,7 +1107,8 @@ class Collector:
 
         if match:
             callee = self.symbol_by_addr(match.group(6))
-            if callee:
+            # only jal and jalr link, other jumps to the own start are loops
+            if callee and (callee is not function or (match.group(3) or match.group(4)).upper() in ["JAL", "JALR"]):
                 self.symbol_add_function_call(function, callee)
                 return True
 
@@ -682,11 +1126,27 @@ class Collector:
             return len(match.group(1).replace(" ", "")) // 2
         return 0
 
+    def enhance_function_size(self):
+        if not self.machine_code:
+            return self.enhance_function_size_from_assembly()
+
+        for key, f in self.symbols.items():
+            if key in self.reused:
+                continue
+            code = self.machine_code.get(key)
+            if code:
+                f[SIZE] = code.size
+            elif ASM in f:
+                f[SIZE] = sum([self.count_assembly_code_bytes(l)
+                              for l in f[ASM]])
+        self.sorted_symbols = None
+
     def enhance_function_size_from_assembly(self):
-        for f in self.all_symbols():
-            if ASM in f:
+        for key, f in self.symbols.items():
+            if ASM in f and key not in self.reused:
                 f[SIZE] = sum([self.count_assembly_code_bytes(l)
                               for l in f[ASM]])
+        self.sorted_symbols = None
 
     def enhance_sibling_symbols(self):
         for f in self.all_functions():
@@ -769,6 +1229,33 @@ class Collector:
             f[COLLAPSED_SUB_FOLDERS] = sorted(
                 f[COLLAPSED_SUB_FOLDERS], key=lambda s: s[COLLAPSED_NAME])
 
+    def enhance_size_totals(self):
+        # added up once per build, pages list and sort files and folders by them
+        def add(a, b):
+            if a is None:
+                return b
+            return a + b if b is not None else a
+
+        for f in self.all_files():
+            stack = None
+            for s in f[FUNCTIONS]:
+                stack = add(stack, s.get(STACK_SIZE, None))
+            f[TOTAL_CODE_SIZE] = sum(s.get(SIZE, 0) or 0 for s in f[FUNCTIONS])
+            f[TOTAL_VAR_SIZE] = sum(s.get(SIZE, 0) or 0 for s in f[VARIABLES])
+            f[TOTAL_STACK_SIZE] = stack
+
+        # sub folders before their folders
+        for f in sorted(self.all_folders(), key=lambda f: len(f[ANCESTORS]), reverse=True):
+            code = var = 0
+            stack = None
+            for e in itertools.chain(f[SUB_FOLDERS], f[FILES]):
+                code += e[TOTAL_CODE_SIZE]
+                var += e[TOTAL_VAR_SIZE]
+                stack = add(stack, e[TOTAL_STACK_SIZE])
+            f[TOTAL_CODE_SIZE] = code
+            f[TOTAL_VAR_SIZE] = var
+            f[TOTAL_STACK_SIZE] = stack
+
     def all_files(self):
         return [f for f in self.file_elements.values() if f[TYPE] == TYPE_FILE]
 
@@ -803,18 +1290,23 @@ class Collector:
         # soft_float_func = [
         #     f for f in self.all_functions() if is_float_function_name(f[NAME])]
 
-        soft_float_func = [
-            f for f in self.all_functions() if f.get("is_libc_softfp", False)]
-        heap_func = [f for f in self.all_functions()
-                     if f.get("is_heap", False)]
+        functions = self.all_functions()
+        for f in functions:
+            self.function_id(f)
 
-        for f in self.all_functions():
-            callees = f[CALLEES]
+        soft_float_func = bytearray(len(self.call_graph))
+        heap_func = bytearray(len(self.call_graph))
+        for f in functions:
+            soft_float_func[f[FUNCTION_ID]] = f.get("is_libc_softfp", False)
+            heap_func[f[FUNCTION_ID]] = f.get("is_heap", False)
+
+        for f in functions:
+            callees = self.call_graph.callees(f[FUNCTION_ID])
             f["call_soft_float"] = any(
-                [ff in callees for ff in soft_float_func])
+                [soft_float_func[c] for c in callees])
             f["call_hard_float"] = f.get("call_hard_float", False)
             f["call_heap"] = any(
-                [ff in callees for ff in heap_func])
+                [heap_func[c] for c in callees])
 
         for file in self.all_files():
             file["call_soft_float"] = any(
@@ -850,16 +1342,61 @@ class Collector:
         for folder in self.root_folders():
             folder_calls_some(folder)
 
+    # the indexes are complete before they are published, requests may look up
+    # symbols of the same build concurrently
+
+    def build_symbol_path_index(self):
+        if self.symbols_by_path is None or self.symbols_by_path_line is None:
+            by_path = {}
+            by_path_line = {}
+
+            for s in self.symbols.values():
+                self.index_symbol_path(s, by_path, by_path_line)
+            self.symbols_by_path_line = by_path_line
+            self.symbols_by_path = by_path
+
+    def index_symbol_path(self, sym, by_path, by_path_line):
+        path = sym.get(PATH, None)
+        if path is None:
+            return
+
+        by_path.setdefault(path, []).append(sym)
+        line = sym.get(LINE, None)
+        if line is not None:
+            by_path_line.setdefault((path, line), []).append(sym)
+
     def build_symbol_name_index(self):
         if not self.symbols_by_name or not self.symbols_by_qualified_name:
-            self.symbols_by_name = {}
-            self.symbols_by_qualified_name = {}
+            by_name = {}
+            by_qualified_name = {}
 
             for s in self.symbols.values():
                 name = s[NAME]
                 if name:
-                    self.symbols_by_name[name] = s
+                    by_name[name] = s
 
                 qualified_name = self.qualified_symbol_name(s)
                 if qualified_name:
-                    self.symbols_by_qualified_name[qualified_name] = s
+                    by_qualified_name[qualified_name] = s
+            self.symbols_by_qualified_name = by_qualified_name
+            self.symbols_by_name = by_name
+
+    def build_search_index(self):
+        if self.search_index is None:
+            # ranked by size, the largest symbols are listed first
+            self.search_index = NameIndex(self.all_symbols(), lambda s: [s[NAME], s.get(DISPLAY_NAME)], search_text)
+
+    def search_symbols(self, query, limit=20):
+        self.build_search_index()
+        return self.search_index.search(query, limit)
+
+    def prepare(self):
+        """
+        Builds everything that pages would otherwise derive on first use. Afterwards
+        requests only read the collector, also from forked worker processes.
+        """
+        self.build_symbol_name_index()
+        self.build_symbol_path_index()
+        self.symbol_views()
+        self.build_search_index()
+        self.call_graph.freeze()
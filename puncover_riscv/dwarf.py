@@ -0,0 +1,741 @@
+import array
+import bisect
+import hashlib
+import os
+import struct
+
+# DWARF constants, see http://dwarfstd.org/doc/DWARF5.pdf
+
+DW_TAG_compile_unit = 0x11
+DW_TAG_partial_unit = 0x3c
+DW_TAG_subprogram = 0x2e
+DW_TAG_variable = 0x34
+
+DW_AT_location = 0x02
+DW_AT_stmt_list = 0x10
+DW_AT_low_pc = 0x11
+DW_AT_comp_dir = 0x1b
+DW_AT_decl_file = 0x3a
+DW_AT_decl_line = 0x3b
+DW_AT_str_offsets_base = 0x72
+DW_AT_addr_base = 0x73
+
+DW_UT_compile = 0x01
+DW_UT_partial = 0x03
+DW_UT_skeleton = 0x04
+DW_UT_split_compile = 0x05
+
+DW_FORM_addr = 0x01
+DW_FORM_block2 = 0x03
+DW_FORM_block4 = 0x04
+DW_FORM_data2 = 0x05
+DW_FORM_data4 = 0x06
+DW_FORM_data8 = 0x07
+DW_FORM_string = 0x08
+DW_FORM_block = 0x09
+DW_FORM_block1 = 0x0a
+DW_FORM_data1 = 0x0b
+DW_FORM_flag = 0x0c
+DW_FORM_sdata = 0x0d
+DW_FORM_strp = 0x0e
+DW_FORM_udata = 0x0f
+DW_FORM_ref_addr = 0x10
+DW_FORM_ref1 = 0x11
+DW_FORM_ref2 = 0x12
+DW_FORM_ref4 = 0x13
+DW_FORM_ref8 = 0x14
+DW_FORM_ref_udata = 0x15
+DW_FORM_indirect = 0x16
+DW_FORM_sec_offset = 0x17
+DW_FORM_exprloc = 0x18
+DW_FORM_flag_present = 0x19
+DW_FORM_strx = 0x1a
+DW_FORM_addrx = 0x1b
+DW_FORM_ref_sup4 = 0x1c
+DW_FORM_strp_sup = 0x1d
+DW_FORM_data16 = 0x1e
+DW_FORM_line_strp = 0x1f
+DW_FORM_ref_sig8 = 0x20
+DW_FORM_implicit_const = 0x21
+DW_FORM_loclistx = 0x22
+DW_FORM_rnglistx = 0x23
+DW_FORM_ref_sup8 = 0x24
+DW_FORM_strx1 = 0x25
+DW_FORM_strx2 = 0x26
+DW_FORM_strx3 = 0x27
+DW_FORM_strx4 = 0x28
+DW_FORM_addrx1 = 0x29
+DW_FORM_addrx2 = 0x2a
+DW_FORM_addrx3 = 0x2b
+DW_FORM_addrx4 = 0x2c
+DW_FORM_GNU_addr_index = 0x1f01
+DW_FORM_GNU_str_index = 0x1f02
+DW_FORM_GNU_ref_alt = 0x1f20
+DW_FORM_GNU_strp_alt = 0x1f21
+
+DW_OP_addr = 0x03
+DW_OP_addrx = 0xa1
+DW_OP_GNU_addr_index = 0xfb
+
+DW_LNS_copy = 1
+DW_LNS_advance_pc = 2
+DW_LNS_advance_line = 3
+DW_LNS_set_file = 4
+DW_LNS_const_add_pc = 8
+DW_LNS_fixed_advance_pc = 9
+
+DW_LNE_end_sequence = 1
+DW_LNE_set_address = 2
+DW_LNE_define_file = 3
+
+DW_LNCT_path = 1
+DW_LNCT_directory_index = 2
+
+ADDRESS_INDEX_FORMS = [DW_FORM_addrx, DW_FORM_addrx1, DW_FORM_addrx2, DW_FORM_addrx3, DW_FORM_addrx4,
+                       DW_FORM_GNU_addr_index]
+BLOCK_FORMS = [DW_FORM_block, DW_FORM_block1, DW_FORM_block2, DW_FORM_block4, DW_FORM_exprloc]
+
+
+class Reader:
+    """Sequential reader over a section of a memory-mapped ELF file."""
+
+    def __init__(self, data, endian, offset=0, end=None):
+        self.data = data
+        self.endian = endian
+        self.offset = offset
+        self.end = len(data) if end is None else end
+
+    def unpack(self, fmt, size):
+        value = struct.unpack_from(self.endian + fmt, self.data, self.offset)[0]
+        self.offset += size
+        return value
+
+    def u8(self):
+        value = self.data[self.offset]
+        self.offset += 1
+        return value
+
+    def s8(self):
+        return self.unpack("b", 1)
+
+    def u16(self):
+        return self.unpack("H", 2)
+
+    def u24(self):
+        b = self.data[self.offset:self.offset + 3]
+        self.offset += 3
+        return int.from_bytes(b, "little" if self.endian == "<" else "big")
+
+    def u32(self):
+        return self.unpack("I", 4)
+
+    def u64(self):
+        return self.unpack("Q", 8)
+
+    def uint(self, size):
+        return {1: self.u8, 2: self.u16, 3: self.u24, 4: self.u32, 8: self.u64}[size]()
+
+    def uleb(self):
+        result = 0
+        shift = 0
+        data = self.data
+        while True:
+            b = data[self.offset]
+            self.offset += 1
+            result |= (b & 0x7f) << shift
+            if b < 0x80:
+                return result
+            shift += 7
+
+    def sleb(self):
+        result = 0
+        shift = 0
+        data = self.data
+        while True:
+            b = data[self.offset]
+            self.offset += 1
+            result |= (b & 0x7f) << shift
+            shift += 7
+            if b < 0x80:
+                if b & 0x40:
+                    result -= 1 << shift
+                return result
+
+    def cstr(self):
+        end = self.data.find(b"\0", self.offset)
+        value = self.data[self.offset:end].decode("utf-8", errors="replace")
+        self.offset = end + 1
+        return value
+
+    def initial_length(self):
+        # returns the unit length and the size of section offsets (4 for 32-bit DWARF, 8 for 64-bit DWARF)
+        length = self.u32()
+        if length == 0xffffffff:
+            return self.u64(), 8
+        return length, 4
+
+
+class Unit:
+    """Sizes and bases of a compile unit that are needed to decode its attribute values."""
+
+    def __init__(self, version, address_size, offset_size):
+        self.version = version
+        self.address_size = address_size
+        self.offset_size = offset_size
+        self.str_offsets_base = None
+        self.addr_base = None
+
+
+class LineRows:
+    """Line table rows as parallel arrays of addresses, file indexes and line numbers."""
+
+    def __init__(self):
+        self.addresses = array.array("Q")
+        self.file_ids = array.array("l")
+        self.lines = array.array("L")
+        self.files = []
+        self.file_indexes = {}
+
+    def __len__(self):
+        return len(self.addresses)
+
+    def file_index(self, path):
+        index = self.file_indexes.get(path)
+        if index is None:
+            index = len(self.files)
+            self.files.append(path)
+            self.file_indexes[path] = index
+        return index
+
+    def key(self, i):
+        # an end of sequence sorts before a sequence starting at the same address
+        return self.addresses[i], self.file_ids[i] >= 0
+
+    def sort(self):
+        order = sorted(range(len(self.addresses)), key=self.key)
+        self.addresses = array.array("Q", (self.addresses[i] for i in order))
+        self.file_ids = array.array("l", (self.file_ids[i] for i in order))
+        self.lines = array.array("L", (self.lines[i] for i in order))
+
+    def extend(self, rows):
+        # appends the rows of another LineRows, its file indexes are translated to ours
+        file_ids = [self.file_index(f) for f in rows.files]
+        self.addresses.extend(rows.addresses)
+        self.file_ids.extend(file_ids[i] if i >= 0 else -1 for i in rows.file_ids)
+        self.lines.extend(rows.lines)
+
+
+class UnitResult:
+    """
+    Line rows and declarations of one compile unit, together with the ranges of other
+    sections that decoding the unit has read and a digest over their contents.
+    """
+
+    def __init__(self, reads, digest, rows, declarations):
+        self.reads = reads
+        self.digest = digest
+        self.rows = rows
+        self.declarations = declarations
+
+
+class DwarfInfo:
+    """
+    Decodes `.debug_line` and the declarations of functions and variables in `.debug_info`
+    of an ElfFile. `location(address)` then answers what `nm -l` would print for a symbol.
+    """
+
+    def __init__(self, elf):
+        self.elf = elf
+        self.data = elf.data
+        self.endian = elf.endian
+        self.sections = {s.name: s for s in elf.sections() if s.name.startswith(".debug_")}
+
+        # sorted line table rows of all units
+        self.rows = LineRows()
+        self.line_tables = {}
+        self.abbreviation_tables = {}
+
+        # exact locations of function entries and variables from their declarations
+        self.declarations = {}
+
+        # UnitResult of every compile unit by a digest of its bytes, see parse()
+        self.units = {}
+        self.units_reused = 0
+        # first and last row address of every unit that was decoded rather than taken over
+        self.decoded_spans = []
+        # (section, offset, length) read outside of .debug_info while a unit is decoded
+        self.reads = None
+
+    def has_debug_info(self):
+        return ".debug_line" in self.sections or ".debug_info" in self.sections
+
+    def parse(self, previous=None):
+        # a unit with the same bytes as one in previous, the units of an earlier parse,
+        # is taken over if everything it read from other sections is unchanged as well
+        previous = previous or {}
+        results = []
+        for unit_offset, unit, die_offset, abbrev_offset in self.compile_units():
+            key = hashlib.sha1(self.data[unit_offset:die_offset[1]]).digest()
+            result = previous.get(key)
+            if result is not None and self.reads_digest(result.reads) == result.digest:
+                self.units_reused += 1
+            else:
+                result = self.parse_unit(unit, die_offset, abbrev_offset)
+                if len(result.rows):
+                    self.decoded_spans.append((result.rows.addresses[0], result.rows.addresses[-1]))
+            self.units[key] = result
+            results.append(result)
+
+        if results:
+            self.add_units(results)
+        elif ".debug_line" in self.sections:
+            # no .debug_info, e.g. assembler sources: decode all line programs back to back
+            section = self.sections[".debug_line"]
+            offset = 0
+            while offset < section.size:
+                offset = self.line_table(offset, None, self.rows)[0]
+            self.rows.sort()
+            self.decoded_spans.append((0, 1 << 64))
+
+        return self
+
+    def parse_unit(self, unit, die_offset, abbrev_offset):
+        self.reads = set()
+        # every unit decodes its line program itself, for its reads to be complete
+        self.line_tables = {}
+        try:
+            abbrevs = self.abbreviations(abbrev_offset)
+            rows = LineRows()
+            cu = self.compile_unit_attributes(unit, die_offset, abbrevs)
+            stmt_list = cu.get(DW_AT_stmt_list)
+            if stmt_list is not None:
+                self.line_table(stmt_list, cu.get(DW_AT_comp_dir), rows)
+            rows.sort()
+
+            declarations = {}
+            self.parse_declarations(unit, die_offset, abbrevs, declarations)
+            reads = sorted(self.reads)
+        finally:
+            self.reads = None
+        return UnitResult(reads, self.reads_digest(reads), rows, declarations)
+
+    def add_units(self, results):
+        # the rows are sorted within each unit, and as units usually cover separate
+        # address ranges, putting them in order mostly avoids sorting all rows again
+        ordered = sorted((r.rows for r in results if len(r.rows)), key=lambda rows: rows.key(0))
+        needs_sort = False
+        for i, rows in enumerate(ordered):
+            if i > 0 and rows.key(0) < ordered[i - 1].key(len(ordered[i - 1]) - 1):
+                needs_sort = True
+            self.rows.extend(rows)
+        if needs_sort:
+            self.rows.sort()
+
+        for result in results:
+            for address, location in result.declarations.items():
+                self.declarations.setdefault(address, location)
+
+    def record_read(self, section_name, offset, length):
+        if self.reads is not None:
+            self.reads.add((section_name, offset, length))
+
+    def reads_digest(self, reads):
+        h = hashlib.sha1()
+        for section_name, offset, length in reads:
+            section = self.sections.get(section_name)
+            if section is None or offset + length > section.size:
+                return None
+            start = section.offset + offset
+            h.update(self.data[start:start + length])
+        return h.digest()
+
+    # ---- .debug_line ----
+
+    def line_table(self, stmt_list, comp_dir, rows):
+        # returns (end offset, file names) of the line program at stmt_list, decoded only once
+        if stmt_list in self.line_tables:
+            return self.line_tables[stmt_list]
+
+        section = self.sections[".debug_line"]
+        r = Reader(self.data, self.endian, section.offset + stmt_list)
+        unit_length, offset_size = r.initial_length()
+        end = r.offset + unit_length
+        version = r.u16()
+        address_size = self.elf.address_size
+        if version >= 5:
+            address_size = r.u8()
+            r.u8()  # segment selector size
+        header_length = r.uint(offset_size)
+        program_start = r.offset + header_length
+        min_instruction_length = r.u8()
+        if version >= 4:
+            r.u8()  # maximum operations per instruction, only relevant for VLIW
+        r.u8()  # default_is_stmt
+        line_base = r.s8()
+        line_range = r.u8()
+        opcode_base = r.u8()
+        standard_opcode_lengths = [0] + [r.u8() for _ in range(opcode_base - 1)]
+
+        unit = Unit(version, address_size, offset_size)
+        if version >= 5:
+            directories = [d.get(DW_LNCT_path, "") for d in self.line_table_entries(r, unit)]
+            files = [(f.get(DW_LNCT_path, ""), f.get(DW_LNCT_directory_index, 0))
+                     for f in self.line_table_entries(r, unit)]
+        else:
+            # directory 0 is the compilation directory, file 0 does not exist
+            directories = [comp_dir or ""]
+            while True:
+                d = r.cstr()
+                if not d:
+                    break
+                directories.append(d)
+            files = [None]
+            while True:
+                name = r.cstr()
+                if not name:
+                    break
+                dir_index = r.uleb()
+                r.uleb()  # modification time
+                r.uleb()  # file length
+                files.append((name, dir_index))
+
+        def file_path(entry):
+            if entry is None:
+                return None
+            name, dir_index = entry
+            directory = directories[dir_index] if dir_index < len(directories) else ""
+            # relative directories are relative to the compilation directory, which
+            # DWARF 5 lists as directory 0
+            base = comp_dir if version < 5 else (directories[0] if directories else None)
+            if dir_index > 0 and base:
+                directory = os.path.join(base, directory)
+            return os.path.join(directory, name)
+
+        file_names = [file_path(f) for f in files]
+        file_ids = [rows.file_index(f) if f else -1 for f in file_names]
+
+        r.offset = program_start
+        addresses = rows.addresses
+        line_files = rows.file_ids
+        line_numbers = rows.lines
+
+        def reset_state():
+            return 0, 1, 1
+
+        address, file, line = reset_state()
+        last = None
+
+        def emit_row():
+            nonlocal last
+            file_id = file_ids[file] if file < len(file_ids) else -1
+            # keep the first row at an address and drop rows that don't change the location
+            if last is not None and (last[0] == address or last[1:] == (file_id, line)):
+                return
+            addresses.append(address)
+            line_files.append(file_id)
+            line_numbers.append(line)
+            last = (address, file_id, line)
+
+        while r.offset < end:
+            opcode = r.u8()
+            if opcode >= opcode_base:
+                adjusted = opcode - opcode_base
+                address += (adjusted // line_range) * min_instruction_length
+                line += line_base + adjusted % line_range
+                emit_row()
+            elif opcode == 0:
+                length = r.uleb()
+                next_offset = r.offset + length
+                sub_opcode = r.u8()
+                if sub_opcode == DW_LNE_end_sequence:
+                    # rows after the end of a sequence don't belong to any source
+                    addresses.append(address)
+                    line_files.append(-1)
+                    line_numbers.append(0)
+                    address, file, line = reset_state()
+                    last = None
+                elif sub_opcode == DW_LNE_set_address:
+                    address = r.uint(length - 1)
+                elif sub_opcode == DW_LNE_define_file:
+                    name = r.cstr()
+                    dir_index = r.uleb()
+                    file_names.append(file_path((name, dir_index)))
+                    file_ids.append(rows.file_index(file_names[-1]))
+                r.offset = next_offset
+            elif opcode == DW_LNS_copy:
+                emit_row()
+            elif opcode == DW_LNS_advance_pc:
+                address += r.uleb() * min_instruction_length
+            elif opcode == DW_LNS_advance_line:
+                line += r.sleb()
+            elif opcode == DW_LNS_set_file:
+                file = r.uleb()
+            elif opcode == DW_LNS_const_add_pc:
+                address += ((255 - opcode_base) // line_range) * min_instruction_length
+            elif opcode == DW_LNS_fixed_advance_pc:
+                address += r.u16()
+            else:
+                # set_column, negate_stmt, set_basic_block, prologue/epilogue flags, set_isa, vendor opcodes
+                for _ in range(standard_opcode_lengths[opcode]):
+                    r.uleb()
+
+        result = (end - section.offset, file_names)
+        self.line_tables[stmt_list] = result
+        self.record_read(".debug_line", stmt_list, result[0] - stmt_list)
+        return result
+
+    def line_table_entries(self, r, unit):
+        formats = [(r.uleb(), r.uleb()) for _ in range(r.u8())]
+        entries = []
+        for _ in range(r.uleb()):
+            entry = {}
+            for content_type, form in formats:
+                entry[content_type] = self.attribute_value(r, form, unit)
+            entries.append(entry)
+        return entries
+
+    def line_for_address(self, address):
+        rows = self.rows
+        i = bisect.bisect_right(rows.addresses, address) - 1
+        if i < 0 or rows.file_ids[i] < 0:
+            return None
+        return rows.files[rows.file_ids[i]], rows.lines[i]
+
+    def lines_changed(self, start, end):
+        # whether rows of units decoded by this parse may locate code in [start, end),
+        # all other rows are the same as in the parse the units were taken over from
+        i = bisect.bisect_right(self.rows.addresses, start) - 1
+        first = self.rows.addresses[i] if i >= 0 else start
+        return any(low < end and high >= first for low, high in self.decoded_spans)
+
+    def lines_in_range(self, start, end):
+        # addresses, files and line numbers of the rows locating the code in [start, end)
+        rows = self.rows
+        i = max(bisect.bisect_right(rows.addresses, start) - 1, 0)
+        j = bisect.bisect_left(rows.addresses, end)
+        files = [rows.files[k] if k >= 0 else None for k in rows.file_ids[i:j]]
+        return rows.addresses[i:j], files, rows.lines[i:j]
+
+    # ---- .debug_info ----
+
+    def compile_units(self):
+        section = self.sections.get(".debug_info")
+        if not section:
+            return
+
+        r = Reader(self.data, self.endian, section.offset)
+        end = section.offset + section.size
+        while r.offset < end:
+            unit_offset = r.offset
+            unit_length, offset_size = r.initial_length()
+            unit_end = r.offset + unit_length
+            version = r.u16()
+            unit_type = DW_UT_compile
+            if version >= 5:
+                unit_type = r.u8()
+                address_size = r.u8()
+                abbrev_offset = r.uint(offset_size)
+                if unit_type in [DW_UT_skeleton, DW_UT_split_compile]:
+                    r.u64()  # dwo id
+            else:
+                abbrev_offset = r.uint(offset_size)
+                address_size = r.u8()
+
+            # type units don't describe code or data of the image
+            if unit_type in [DW_UT_compile, DW_UT_partial, DW_UT_skeleton]:
+                yield unit_offset, Unit(version, address_size, offset_size), (r.offset, unit_end), abbrev_offset
+
+            r.offset = unit_end
+
+    def abbreviations(self, abbrev_offset):
+        # units usually share their abbreviation table, it is decoded only once
+        cached = self.abbreviation_tables.get(abbrev_offset)
+        if cached is None:
+            cached = self.read_abbreviations(abbrev_offset)
+            self.abbreviation_tables[abbrev_offset] = cached
+        result, length = cached
+        self.record_read(".debug_abbrev", abbrev_offset, length)
+        return result
+
+    def read_abbreviations(self, abbrev_offset):
+        section = self.sections[".debug_abbrev"]
+        r = Reader(self.data, self.endian, section.offset + abbrev_offset)
+        result = {}
+        while True:
+            code = r.uleb()
+            if code == 0:
+                return result, r.offset - section.offset - abbrev_offset
+            tag = r.uleb()
+            has_children = r.u8()
+            attributes = []
+            while True:
+                name = r.uleb()
+                form = r.uleb()
+                if name == 0 and form == 0:
+                    break
+                implicit_const = r.sleb() if form == DW_FORM_implicit_const else None
+                attributes.append((name, form, implicit_const))
+            result[code] = (tag, has_children, attributes)
+
+    def compile_unit_attributes(self, unit, die_offset, abbrevs):
+        r = Reader(self.data, self.endian, die_offset[0], die_offset[1])
+        code = r.uleb()
+        if code == 0 or code not in abbrevs:
+            return {}
+        tag, _, attributes = abbrevs[code]
+        raw = self.read_attributes(r, unit, attributes)
+        unit.str_offsets_base = raw.get(DW_AT_str_offsets_base, (None, None))[1]
+        unit.addr_base = raw.get(DW_AT_addr_base, (None, None))[1]
+        return {name: self.resolve(form, value, unit) for name, (form, value) in raw.items()}
+
+    def parse_declarations(self, unit, die_offset, abbrevs, declarations):
+        r = Reader(self.data, self.endian, die_offset[0], die_offset[1])
+        file_names = None
+        interesting = [DW_TAG_subprogram, DW_TAG_variable]
+
+        while r.offset < r.end:
+            code = r.uleb()
+            if code == 0:
+                continue
+            tag, _, attributes = abbrevs[code]
+
+            if tag in [DW_TAG_compile_unit, DW_TAG_partial_unit]:
+                raw = self.read_attributes(r, unit, attributes)
+                unit.str_offsets_base = raw.get(DW_AT_str_offsets_base, (None, None))[1]
+                unit.addr_base = raw.get(DW_AT_addr_base, (None, None))[1]
+                stmt_list = raw.get(DW_AT_stmt_list, (None, None))[1]
+                file_names = self.line_tables[stmt_list][1] if stmt_list in self.line_tables else None
+            elif tag in interesting:
+                raw = self.read_attributes(r, unit, attributes)
+                if file_names is None or DW_AT_decl_file not in raw or DW_AT_decl_line not in raw:
+                    continue
+                address = None
+                if tag == DW_TAG_subprogram and DW_AT_low_pc in raw:
+                    address = self.resolve(*raw[DW_AT_low_pc], unit)
+                elif tag == DW_TAG_variable and DW_AT_location in raw:
+                    address = self.location_address(raw[DW_AT_location], unit)
+                decl_file = raw[DW_AT_decl_file][1]
+                if address and decl_file < len(file_names) and file_names[decl_file]:
+                    declarations.setdefault(address, (file_names[decl_file], raw[DW_AT_decl_line][1]))
+            else:
+                self.skip_attributes(r, unit, attributes)
+
+    def location_address(self, attribute, unit):
+        # only static storage, i.e. a location expression that is exactly one address operation
+        form, value = attribute
+        if form not in BLOCK_FORMS or not value:
+            return None
+        r = Reader(value, self.endian)
+        op = r.u8()
+        if op == DW_OP_addr and len(value) == 1 + unit.address_size:
+            return r.uint(unit.address_size)
+        if op in [DW_OP_addrx, DW_OP_GNU_addr_index]:
+            index = r.uleb()
+            if r.offset == len(value):
+                return self.indexed_address(index, unit)
+        return None
+
+    def read_attributes(self, r, unit, attributes):
+        result = {}
+        for name, form, implicit_const in attributes:
+            if form == DW_FORM_implicit_const:
+                result[name] = (form, implicit_const)
+                continue
+            if form == DW_FORM_indirect:
+                form = r.uleb()
+            result[name] = (form, self.attribute_value(r, form, unit))
+        return result
+
+    def skip_attributes(self, r, unit, attributes):
+        for _, form, _ in attributes:
+            if form != DW_FORM_implicit_const:
+                self.attribute_value(r, form, unit, skip=True)
+
+    def attribute_value(self, r, form, unit, skip=False):
+        if form in FIXED_FORM_SIZES:
+            size = FIXED_FORM_SIZES[form]
+            if skip or size > 8:
+                r.offset += size
+                return None
+            return r.uint(size)
+        if form == DW_FORM_addr:
+            return r.uint(unit.address_size)
+        if form in [DW_FORM_strp, DW_FORM_line_strp, DW_FORM_sec_offset, DW_FORM_strp_sup,
+                    DW_FORM_GNU_ref_alt, DW_FORM_GNU_strp_alt]:
+            value = r.uint(unit.offset_size)
+            if skip or form not in [DW_FORM_strp, DW_FORM_line_strp]:
+                return value
+            return self.string(".debug_str" if form == DW_FORM_strp else ".debug_line_str", value)
+        if form == DW_FORM_ref_addr:
+            return r.uint(unit.address_size if unit.version <= 2 else unit.offset_size)
+        if form in [DW_FORM_udata, DW_FORM_ref_udata, DW_FORM_strx, DW_FORM_addrx, DW_FORM_loclistx,
+                    DW_FORM_rnglistx, DW_FORM_GNU_addr_index, DW_FORM_GNU_str_index]:
+            return r.uleb()
+        if form == DW_FORM_sdata:
+            return r.sleb()
+        if form == DW_FORM_string:
+            return r.cstr()
+        if form in BLOCK_FORMS:
+            size = {DW_FORM_block1: r.u8, DW_FORM_block2: r.u16, DW_FORM_block4: r.u32}.get(form, r.uleb)()
+            start = r.offset
+            r.offset += size
+            return None if skip else self.data[start:start + size]
+        if form == DW_FORM_flag_present:
+            return True
+        raise Exception("Unsupported DWARF form 0x%x" % form)
+
+    def resolve(self, form, value, unit):
+        # turns indexed strings and addresses into their values, once the unit's bases are known
+        if form in [DW_FORM_strx, DW_FORM_strx1, DW_FORM_strx2, DW_FORM_strx3, DW_FORM_strx4, DW_FORM_GNU_str_index]:
+            return self.indexed_string(value, unit)
+        if form in ADDRESS_INDEX_FORMS:
+            return self.indexed_address(value, unit)
+        return value
+
+    def string(self, section_name, offset):
+        section = self.sections.get(section_name)
+        if not section:
+            return None
+        r = Reader(self.data, self.endian, section.offset + offset)
+        value = r.cstr()
+        self.record_read(section_name, offset, r.offset - section.offset - offset)
+        return value
+
+    def indexed_string(self, index, unit):
+        section = self.sections.get(".debug_str_offsets")
+        if not section:
+            return None
+        # without DW_AT_str_offsets_base, skip the header of a single contribution
+        base = unit.str_offsets_base if unit.str_offsets_base is not None else 2 * unit.offset_size
+        self.record_read(".debug_str_offsets", base + index * unit.offset_size, unit.offset_size)
+        r = Reader(self.data, self.endian, section.offset + base + index * unit.offset_size)
+        return self.string(".debug_str", r.uint(unit.offset_size))
+
+    def indexed_address(self, index, unit):
+        section = self.sections.get(".debug_addr")
+        if not section:
+            return None
+        base = unit.addr_base if unit.addr_base is not None else 8
+        self.record_read(".debug_addr", base + index * unit.address_size, unit.address_size)
+        r = Reader(self.data, self.endian, section.offset + base + index * unit.address_size)
+        return r.uint(unit.address_size)
+
+    # ---- lookup ----
+
+    def location(self, address):
+        # declarations are what nm -l reports for functions and variables, the line table
+        # covers code without debug info entries, e.g. assembler sources
+        result = self.declarations.get(address)
+        if result:
+            return result
+        return self.line_for_address(address)
+
+
+FIXED_FORM_SIZES = {
+    DW_FORM_data1: 1, DW_FORM_ref1: 1, DW_FORM_flag: 1, DW_FORM_strx1: 1, DW_FORM_addrx1: 1,
+    DW_FORM_data2: 2, DW_FORM_ref2: 2, DW_FORM_strx2: 2, DW_FORM_addrx2: 2,
+    DW_FORM_strx3: 3, DW_FORM_addrx3: 3,
+    DW_FORM_data4: 4, DW_FORM_ref4: 4, DW_FORM_ref_sup4: 4, DW_FORM_strx4: 4, DW_FORM_addrx4: 4,
+    DW_FORM_data8: 8, DW_FORM_ref8: 8, DW_FORM_ref_sig8: 8, DW_FORM_ref_sup8: 8,
+    DW_FORM_data16: 16,
+}
@@ -0,0 +1,238 @@
+import collections
+import mmap
+import struct
+
+ELFCLASS32 = 1
+ELFCLASS64 = 2
+ELFDATA2LSB = 1
+ELFDATA2MSB = 2
+
+SHN_UNDEF = 0
+SHN_LORESERVE = 0xff00
+SHN_XINDEX = 0xffff
+
+SHT_SYMTAB = 2
+SHT_NOTE = 7
+SHT_NOBITS = 8
+SHT_DYNSYM = 11
+SHT_SYMTAB_SHNDX = 18
+
+NT_GNU_BUILD_ID = 3
+
+SECTION_TYPES = {
+    0: "NULL",
+    1: "PROGBITS",
+    2: "SYMTAB",
+    3: "STRTAB",
+    4: "RELA",
+    5: "HASH",
+    6: "DYNAMIC",
+    7: "NOTE",
+    8: "NOBITS",
+    9: "REL",
+    10: "SHLIB",
+    11: "DYNSYM",
+    14: "INIT_ARRAY",
+    15: "FINI_ARRAY",
+    16: "PREINIT_ARRAY",
+    17: "GROUP",
+    18: "SYMTAB_SHNDX",
+    0x70000003: "RISCV_ATTRIBUTES",
+}
+
+# same letters and order as `readelf -S`
+SECTION_FLAGS = [
+    (0x1, "W"),
+    (0x2, "A"),
+    (0x4, "X"),
+    (0x10, "M"),
+    (0x20, "S"),
+    (0x40, "I"),
+    (0x80, "L"),
+    (0x100, "O"),
+    (0x200, "G"),
+    (0x400, "T"),
+    (0x800, "C"),
+    (0x80000000, "E"),
+]
+
+SYMBOL_TYPES = {0: "NOTYPE", 1: "OBJECT", 2: "FUNC", 3: "SECTION", 4: "FILE", 5: "COMMON", 6: "TLS"}
+SYMBOL_BINDS = {0: "LOCAL", 1: "GLOBAL", 2: "WEAK", 10: "UNIQUE"}
+SYMBOL_VISIBILITIES = {0: "DEFAULT", 1: "INTERNAL", 2: "HIDDEN", 3: "PROTECTED"}
+
+ElfSection = collections.namedtuple(
+    "ElfSection", ["index", "name", "type", "flags", "address", "offset", "size", "link", "info", "align", "entsize"])
+
+# shndx is the raw section index, section the index of the section the symbol is
+# defined in, also when it is extended, or None for undefined, absolute and common ones
+ElfSymbol = collections.namedtuple(
+    "ElfSymbol", ["name", "value", "size", "type", "bind", "visibility", "shndx", "section"])
+
+
+def section_type_name(sh_type):
+    return SECTION_TYPES.get(sh_type, "0x%x" % sh_type)
+
+
+def section_flag_letters(sh_flags):
+    return "".join(letter for bit, letter in SECTION_FLAGS if sh_flags & bit)
+
+
+class ElfFile:
+    """
+    Reads section headers, section contents and symbol tables of ELF32/ELF64 files
+    straight from a memory mapping, without spawning readelf.
+    """
+
+    # e_type .. e_shstrndx, following e_ident
+    header_formats = {ELFCLASS32: "HHIIIIIHHHHHH", ELFCLASS64: "HHIQQQIHHHHHH"}
+    section_formats = {ELFCLASS32: "IIIIIIIIII", ELFCLASS64: "IIQQQQIIQQ"}
+    symbol_formats = {ELFCLASS32: "IIIBBH", ELFCLASS64: "IBBHQQ"}
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            try:
+                self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                raise Exception("%s is empty" % path)
+
+        if self.data[:4] != b"\x7fELF":
+            self.close()
+            raise Exception("%s is not an ELF file" % path)
+
+        self.elf_class = self.data[4]
+        endianness = self.data[5]
+        if self.elf_class not in self.header_formats or endianness not in [ELFDATA2LSB, ELFDATA2MSB]:
+            self.close()
+            raise Exception("%s has an unsupported ELF class or data encoding" % path)
+
+        self.endian = "<" if endianness == ELFDATA2LSB else ">"
+        self.address_size = 4 if self.elf_class == ELFCLASS32 else 8
+        # width of addresses as printed by binutils, e.g. a0000c00
+        self.address_digits = self.address_size * 2
+
+        (self.type, self.machine, _, self.entry, _, self.shoff, self.flags, _, _, _,
+         self.shentsize, shnum, shstrndx) = self.unpack(self.header_formats[self.elf_class], 16)
+
+        self._sections = None
+        self._symbols = None
+        self._shnum = shnum
+        self._shstrndx = shstrndx
+
+    def close(self):
+        if self.data is not None:
+            self.data.close()
+            self.data = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def unpack(self, fmt, offset):
+        return struct.unpack_from(self.endian + fmt, self.data, offset)
+
+    def string_at(self, offset):
+        end = self.data.find(b"\0", offset)
+        if end < 0:
+            end = len(self.data)
+        return self.data[offset:end].decode("utf-8", errors="replace")
+
+    def sections(self):
+        if self._sections is None:
+            self._sections = self.read_sections()
+        return self._sections
+
+    def read_sections(self):
+        if not self.shoff:
+            return []
+
+        fmt = self.section_formats[self.elf_class]
+        headers = [self.unpack(fmt, self.shoff)]
+
+        # more than SHN_LORESERVE sections store their count and the name table index in section 0
+        shnum = self._shnum if self._shnum else headers[0][5]
+        shstrndx = self._shstrndx if self._shstrndx != SHN_XINDEX else headers[0][6]
+
+        for i in range(1, shnum):
+            headers.append(self.unpack(fmt, self.shoff + i * self.shentsize))
+
+        names_offset = headers[shstrndx][4] if shstrndx < len(headers) else None
+
+        result = []
+        for index, (name, sh_type, flags, address, offset, size, link, info, align, entsize) in enumerate(headers):
+            name = self.string_at(names_offset + name) if names_offset is not None else ""
+            result.append(ElfSection(index, name, sh_type, flags, address, offset, size, link, info, align, entsize))
+        return result
+
+    def section(self, name):
+        for s in self.sections():
+            if s.name == name:
+                return s
+        return None
+
+    def section_data(self, section):
+        if section.type == SHT_NOBITS:
+            return b""
+        return self.data[section.offset:section.offset + section.size]
+
+    def build_id(self):
+        # hex digest of the GNU build-id note, None if the linker did not add one
+        for s in self.sections():
+            if s.type != SHT_NOTE:
+                continue
+            offset, end = s.offset, s.offset + s.size
+            while offset + 12 <= end:
+                namesz, descsz, note_type = self.unpack("III", offset)
+                name_offset = offset + 12
+                desc_offset = name_offset + (namesz + 3) // 4 * 4
+                offset = desc_offset + (descsz + 3) // 4 * 4
+                if note_type == NT_GNU_BUILD_ID and self.data[name_offset:name_offset + namesz] == b"GNU\0":
+                    return self.data[desc_offset:desc_offset + descsz].hex()
+        return None
+
+    def symbol_table(self):
+        # firmware images carry a full .symtab, shared objects may only have .dynsym
+        for sh_type in [SHT_SYMTAB, SHT_DYNSYM]:
+            for s in self.sections():
+                if s.type == sh_type:
+                    return s
+        return None
+
+    def symbols(self):
+        # several build stages go through the symbol table, it is only read once
+        if self._symbols is None:
+            self._symbols = list(self.read_symbols())
+        return self._symbols
+
+    def read_symbols(self):
+        table = self.symbol_table()
+        if not table:
+            return
+
+        strings = self.sections()[table.link]
+        fmt = self.symbol_formats[self.elf_class]
+        entsize = table.entsize or struct.calcsize(fmt)
+        # section indexes that do not fit a symbol are kept in a parallel table
+        extended = [s for s in self.sections() if s.type == SHT_SYMTAB_SHNDX and s.link == table.index]
+
+        for i, offset in enumerate(range(table.offset, table.offset + table.size - entsize + 1, entsize)):
+            if self.elf_class == ELFCLASS32:
+                name, value, size, info, other, shndx = self.unpack(fmt, offset)
+            else:
+                name, info, other, shndx, value, size = self.unpack(fmt, offset)
+            section = shndx if SHN_UNDEF < shndx < SHN_LORESERVE else None
+            if shndx == SHN_XINDEX and extended and 4 * (i + 1) <= extended[0].size:
+                section = self.unpack("I", extended[0].offset + 4 * i)[0] or None
+
+            yield ElfSymbol(
+                name=self.string_at(strings.offset + name) if name else "",
+                value=value,
+                size=size,
+                type=SYMBOL_TYPES.get(info & 0xf, str(info & 0xf)),
+                bind=SYMBOL_BINDS.get(info >> 4, str(info >> 4)),
+                visibility=SYMBOL_VISIBILITIES.get(other & 0x3),
+                shndx=shndx,
+                section=section,
+            )
@@ -11,6 +11,7 @@ class GCCTools:
             gcc_base_filename = os.path.join(gcc_base_filename, '')
 
         self.gcc_base_filename = gcc_base_filename
+        self._version = None
 
     def gcc_tool_path(self, name):
         path = self.gcc_base_filename + name
@@ -19,12 +20,37 @@ class GCCTools:
 
         return path
 
-    def gcc_tool_lines(self, name, args, cwd=None):
+    def gcc_tool_line_iter(self, name, args, cwd=None):
+        # yields the output line by line while the tool is still running,
+        # so callers never hold the complete output in memory
         proc = subprocess.Popen([self.gcc_tool_path(name)] + args, stdout=subprocess.PIPE, cwd=cwd)
-        return [l.decode() for l in proc.stdout.readlines()]
+        try:
+            for l in proc.stdout:
+                yield l.decode()
+        finally:
+            proc.stdout.close()
+            proc.wait()
+
+    def gcc_tool_lines(self, name, args, cwd=None):
+        return list(self.gcc_tool_line_iter(name, args, cwd))
+
+    def version(self):
+        # first line of `objdump --version`, e.g. "GNU objdump (GNU Binutils) 2.38"
+        if self._version is None:
+            lines = self.gcc_tool_lines('objdump', ['--version'])
+            self._version = lines[0].strip() if lines else ""
+        return self._version
+
+    def get_assembly_lines(self, elf_file, address_ranges=None):
+        # objdump output for large images easily reaches hundreds of megabytes, stream it
+        if address_ranges is None:
+            return self.gcc_tool_line_iter('objdump', ['-dSw', os.path.basename(elf_file)], os.path.dirname(elf_file))
 
-    def get_assembly_lines(self, elf_file):
-        return self.gcc_tool_lines('objdump', ['-dSw', os.path.basename(elf_file)], os.path.dirname(elf_file))
+        # only the given [start, stop) ranges, one objdump run each
+        return itertools.chain.from_iterable(
+            self.gcc_tool_line_iter('objdump', ['-dSw', '--start-address=0x%x' % start, '--stop-address=0x%x' % stop,
+                                                os.path.basename(elf_file)], os.path.dirname(elf_file))
+            for start, stop in address_ranges)
 
     def get_elf_symbols_file_line(self, elf_file):
         return self.gcc_tool_lines('nm', ['-Sl', os.path.basename(elf_file)], os.path.dirname(elf_file))
@@ -1,3 +1,6 @@
+# the collector a request is rendered from, the same for the whole request
+ENVIRON_COLLECTOR = "puncover_riscv.collector"
+
 
 class BuilderMiddleware(object):
     def __init__(self, app, builder):
@@ -5,5 +8,9 @@ class BuilderMiddleware(object):
         self.builder = builder
 
     def __call__(self, environ, start_response):
-        self.builder.build_if_needed()
-        return self.app(environ, start_response)
\ No newline at end of file
+        # changed files are analysed in the background, until then the previous
+        # build is shown. A watcher starts builds without waiting for a request
+        if not self.builder.watcher:
+            self.builder.build_in_background()
+        environ[ENVIRON_COLLECTOR] = self.builder.collector
+        return self.app(environ, start_response)
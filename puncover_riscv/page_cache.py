@@ -0,0 +1,105 @@
+import collections
+import datetime
+import functools
+import hashlib
+import threading
+
+from flask import Response, request
+
+from puncover_riscv.middleware import ENVIRON_COLLECTOR
+
+
+class GenerationCache:
+    """
+    Keeps values of the current build generation up to the given number of entries
+    and, if given, bytes. The least recently used ones are evicted first.
+    """
+
+    def __init__(self, max_entries, max_bytes=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.entries = collections.OrderedDict()
+        self.size = 0
+        self.generation = None
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, generation, key):
+        with self.lock:
+            entry = self.entries.get((generation, key))
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end((generation, key))
+            self.hits += 1
+            return entry[0]
+
+    def put(self, generation, key, value, size=0):
+        with self.lock:
+            if self.generation is None or generation > self.generation:
+                # values of earlier builds are no longer shown
+                self.entries.clear()
+                self.size = 0
+                self.generation = generation
+            elif generation < self.generation:
+                return value
+
+            previous = self.entries.pop((generation, key), None)
+            if previous:
+                self.size -= previous[1]
+            self.entries[(generation, key)] = (value, size)
+            self.size += size
+            while self.entries and (len(self.entries) > self.max_entries or
+                                    self.max_bytes is not None and self.size > self.max_bytes):
+                _, (_, evicted) = self.entries.popitem(last=False)
+                self.size -= evicted
+        return value
+
+
+class PageCache(GenerationCache):
+    """
+    Keeps recently rendered pages, keyed by build generation and URL including the
+    query string, e.g. the sort order. Pages only change with a new build, so the
+    least recently used pages of the current build are kept up to the given limits.
+    """
+
+    def __init__(self, max_pages=256, max_bytes=64 << 20):
+        super().__init__(max_pages, max_bytes)
+
+    def put(self, generation, url, body):
+        # the digest of the page is its ETag, it stays valid across restarts
+        page = (body, hashlib.sha1(body).hexdigest())
+        return super().put(generation, url, page, len(body))
+
+
+def cached_view(view, cache, collector=None):
+    """
+    Answers GET requests of a view from the cache, with an ETag and the time the build
+    was shown as Last-Modified. Browsers revalidate and get 304 while the build is unchanged.
+    """
+
+    @functools.wraps(view)
+    def wrapper(**kwargs):
+        if request.method != "GET":
+            return view(**kwargs)
+
+        c = collector if collector is not None else request.environ[ENVIRON_COLLECTOR]
+        url = request.full_path
+        page = cache.get(c.generation, url)
+        if page is None:
+            # rendered pages are text, redirects and errors are not kept
+            response = view(**kwargs)
+            if not isinstance(response, str):
+                return response
+            page = cache.put(c.generation, url, response.encode("utf-8"))
+
+        body, etag = page
+        response = Response(body, mimetype="text/html")
+        response.set_etag(etag)
+        if c.build_time:
+            response.last_modified = datetime.datetime.utcfromtimestamp(int(c.build_time))
+        response.cache_control.no_cache = True
+        return response.make_conditional(request)
+
+    return wrapper
@@ -9,11 +9,13 @@ from threading import Timer
 
 from flask import Flask
 
-from puncover_riscv import renderers
+from puncover_riscv import api, renderers
+from puncover_riscv.analysis_cache import AnalysisCache, default_cache_dir
 from puncover_riscv.builders import ElfBuilder
 from puncover_riscv.collector import Collector
 from puncover_riscv.gcc_tools import GCCTools
 from puncover_riscv.middleware import BuilderMiddleware
+from puncover_riscv.server import PreforkServer
 from puncover_riscv.version import __version__
 
 
@@ -61,12 +63,20 @@ def main():
                         help='location of your sources')
     parser.add_argument('--build_dir', '--build-dir',
                         help='location of your build output')
+    parser.add_argument('--warm-call-trees', action='store_true',
+                        help='compute the worst-case call trees in the background after each build')
+    parser.add_argument('--cache-dir', default=default_cache_dir(),
+                        help='directory for the analysis of earlier builds')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='always analyse the build instead of loading a cached analysis')
     parser.add_argument('--debug', action='store_true',
                         help='enable Flask debugger')
     parser.add_argument('--port', dest='port', default=5000, type=int,
                         help='port the HTTP server runs on')
     parser.add_argument('--host', default='127.0.0.1',
                         help='host IP the HTTP server runs on')
+    parser.add_argument('--workers', default=1, type=int,
+                        help='number of forked worker processes serving pages, each on several threads')
     parser.add_argument('--no-open-browser', action='store_true',
                         help="don't automatically open a browser window")
     parser.add_argument('--version', action='version',
@@ -79,9 +89,14 @@ def main():
 
     builder = create_builder(args.gcc_tools_base, elf_file=args.elf_file, map_file=args.map_file,
                              src_root=args.src_root, su_dir=args.build_dir)
+    builder.warm_call_trees = args.warm_call_trees
+    if not args.no_cache:
+        builder.cache = AnalysisCache(args.cache_dir)
     builder.build_if_needed()
+    builder.watch()
     renderers.register_jinja_filters(app.jinja_env)
-    renderers.register_urls(app, builder.collector)
+    renderers.register_urls(app)
+    api.register_urls(app)
     app.wsgi_app = BuilderMiddleware(app.wsgi_app, builder)
 
     if args.debug:
@@ -95,7 +110,10 @@ def main():
         Timer(1, open_browser, kwargs={
               "host": args.host, "port": args.port}).start()
 
-    app.run(host=args.host, port=args.port)
+    if args.workers > 1 and not args.debug:
+        PreforkServer(app, builder, args.host, args.port, args.workers).serve_forever()
+    else:
+        app.run(host=args.host, port=args.port, threaded=True)
 
 
 if __name__ == '__main__':
@@ -17,9 +17,17 @@ from werkzeug.urls import Href
 
 from puncover_riscv import collector
 from puncover_riscv.backtrace_helper import BacktraceHelper
+from puncover_riscv.call_graph import CallList, CallPath
+from puncover_riscv.middleware import ENVIRON_COLLECTOR
+from puncover_riscv.page_cache import GenerationCache, PageCache, cached_view
 
 KEY_OUTPUT_FILE_NAME = "output_file_name"
 
+# rows of the all symbols page, the response stays bounded for any image size
+ALL_SYMBOLS_PAGE_SIZE = 500
+
+SEARCH_RESULTS = 100
+
 def renderer_from_context(context):
     if isinstance(context, HTMLRenderer):
         return context
@@ -49,14 +57,18 @@ def none_sum(a, b):
         return a + b if b is not None else a
     return b
 
-def symbol_traverse(s, func):
-    if isinstance(s, list):
+def symbol_traverse(s, func, total=None):
+    if isinstance(s, (list, CallList, CallPath)):
         result = None
-        for si in [symbol_traverse(i, func) for i in s]:
+        for si in [symbol_traverse(i, func, total) for i in s]:
             if si is not None:
                 result = none_sum(result, si)
         return result
 
+    # files and folders carry the totals of their symbols, see Collector.enhance_size_totals()
+    if total in s:
+        return s[total]
+
     if collector.TYPE in s:
         if s[collector.TYPE] == collector.TYPE_FILE:
             return sum([symbol_traverse(s, func) for s in s[collector.SYMBOLS]])
@@ -65,23 +77,26 @@ def symbol_traverse(s, func):
 
     return func(s)
 
-def traverse_filter_wrapper(value, func):
-    result = symbol_traverse(value, func)
+def traverse_filter_wrapper(value, func, total=None):
+    result = symbol_traverse(value, func, total)
     return result if result != 0 else ""
 
 @jinja2.pass_context
 def symbol_code_size_filter(context, value):
-    return traverse_filter_wrapper(value, lambda s: s.get(collector.SIZE, None) if s.get(collector.TYPE, None) == collector.TYPE_FUNCTION else 0)
+    return traverse_filter_wrapper(value, lambda s: s.get(collector.SIZE, None) if s.get(collector.TYPE, None) == collector.TYPE_FUNCTION else 0,
+                                   collector.TOTAL_CODE_SIZE)
 
 @jinja2.pass_context
 def symbol_var_size_filter(context, value):
-    return traverse_filter_wrapper(value, lambda s: s.get(collector.SIZE, None) if s.get(collector.TYPE, None) == collector.TYPE_VARIABLE else 0)
+    return traverse_filter_wrapper(value, lambda s: s.get(collector.SIZE, None) if s.get(collector.TYPE, None) == collector.TYPE_VARIABLE else 0,
+                                   collector.TOTAL_VAR_SIZE)
 
 @jinja2.pass_context
 def symbol_stack_size_filter(context, value, stack_base=None):
     if isinstance(stack_base, str):
         stack_base = None
-    result = traverse_filter_wrapper(value, lambda s: s.get(collector.STACK_SIZE, None) if s.get(collector.TYPE, None) == collector.TYPE_FUNCTION else None)
+    result = traverse_filter_wrapper(value, lambda s: s.get(collector.STACK_SIZE, None) if s.get(collector.TYPE, None) == collector.TYPE_FUNCTION else None,
+                                     collector.TOTAL_STACK_SIZE)
     if result == "":
         result = None
     return none_sum(result, stack_base)
@@ -102,30 +117,34 @@ def unique_filter(context, value):
     return value
 
 
-@jinja2.pass_context
-def assembly_filter(context, value):
-    renderer = context.parent.get("renderer", None)
-    def linked_symbol_name(name):
-        if context:
-            display_name = renderer.display_name_for_symbol_name(name)
-            url = renderer.url_for_symbol_name(name, context)
-            if url:
-                return '<a href="%s">%s</a>' % (url, display_name)
-        return name
+# Get a clean display name - and a URL - for symbol names in comments
+#   b8:	f000 f8de 	bleq	278 &lt:__aeabi_dmul+0x1dc&gt:
+ASSEMBLY_SYMBOL_PATTERN = re.compile(r"&lt;(\w+)")
 
-    value = str(value)
+# Get a clean display name for symbol names in labels
+# _ZN6Stream9readBytesEPcj():
+# FIXME: Unfortunately symbols that have been inlined will not be in our global
+# symbol name list and we will not be able to unmangle them (this is only a problem
+# for c++ symbols).
+ASSEMBLY_LABEL_PATTERN = re.compile(r"^(_.*)\(\):$")
 
-    # Get a clean display name - and a URL - for symbol names in comments
-    #   b8:	f000 f8de 	bleq	278 &lt:__aeabi_dmul+0x1dc&gt:
-    pattern = re.compile(r"&lt;(\w+)")
-    s = pattern.sub(lambda match: "&lt;"+linked_symbol_name(match.group(1)), value)
 
-    # Get a clean display name for symbol names in labels
-    # _ZN6Stream9readBytesEPcj():
-    # FIXME: Unfortunately symbols that have been inlined will not be in our global
-    # symbol name list and we will not be able to unmangle them (this is only a problem
-    # for c++ symbols).
-    pattern = re.compile(r"^(_.*)\(\):$")
+def assembly_linker(renderer, context):
+    """
+    Returns a function that links the symbol names of an escaped assembly line,
+    names are looked up once per linker.
+    """
+    links = {}
+
+    def linked_symbol_name(match):
+        name = match.group(1)
+        link = links.get(name)
+        if link is None:
+            display_name = renderer.display_name_for_symbol_name(name)
+            url = renderer.url_for_symbol_name(name, context)
+            link = '<a href="%s">%s</a>' % (url, display_name) if url else name
+            links[name] = link
+        return "&lt;" + link
 
     def display_name_for_label(match):
         display_name = renderer.display_name_for_symbol_name(match.group(1))
@@ -136,10 +155,19 @@ def assembly_filter(context, value):
         else:
             # Other symbols will just have a name
             return display_name + "():"
-    s = pattern.sub(display_name_for_label, s)
 
-    return s
-    # return str("&lt;")
+    def link(value):
+        s = ASSEMBLY_SYMBOL_PATTERN.sub(linked_symbol_name, str(value))
+        return ASSEMBLY_LABEL_PATTERN.sub(display_name_for_label, s)
+
+    return link
+
+
+@jinja2.pass_context
+def assembly_filter(context, value):
+    renderer = context.parent.get("renderer", None)
+    return assembly_linker(renderer, context)(value)
+
 
 @jinja2.pass_context
 def symbols_filter(context, value):
@@ -211,17 +239,22 @@ def col_sortable_filter(context, title, is_alpha=False, id=None):
 
     next_sort = id + '_' + next_sort
 
-    # replace/set ?sort= in URL
+    # replace/set ?sort= in URL, a new order starts on the first page
     args = request.args.copy()
     args['sort'] = next_sort
-    url = Href(request.base_url, sort=True)
+    args.pop('page', None)
+    url = Href(request.script_root + request.path, sort=True)
 
     return '<a href="%s" class="%s">%s</a>' % (url(args), ' '.join(classes), title)
 
 
 @jinja2.pass_context
 def sorted_filter(context, symbols):
-    sort_id, sort_order = context.parent['sort'].split('_')
+    return sorted_symbols(symbols, context.parent['sort'])
+
+
+def sorted_symbols(symbols, sort):
+    sort_id, sort_order = sort.split('_')
 
     def to_num(v):
         if v is None or v == '':
@@ -230,9 +263,9 @@ def sorted_filter(context, symbols):
 
     key = {
         'name': lambda e: e.get(collector.DISPLAY_NAME, e.get(collector.NAME, None)).lower(),
-        'code': lambda e: to_num(symbol_code_size_filter(context, e)),
-        'stack': lambda e: to_num(symbol_stack_size_filter(context, e)),
-        'vars': lambda e: to_num(symbol_var_size_filter(context, e)),
+        'code': lambda e: to_num(symbol_code_size_filter(None, e)),
+        'stack': lambda e: to_num(symbol_stack_size_filter(None, e)),
+        'vars': lambda e: to_num(symbol_var_size_filter(None, e)),
     }[sort_id]
 
     return list(sorted(symbols, key=key, reverse=(sort_order == 'desc')))
@@ -240,8 +273,12 @@ def sorted_filter(context, symbols):
 
 class HTMLRenderer(View):
 
-    def __init__(self, collector):
+    def __init__(self, collector=None, listing_cache=None):
+        if collector is None:
+            # the build current when the request arrived, see BuilderMiddleware
+            collector = request.environ[ENVIRON_COLLECTOR]
         self.collector = collector
+        self.listing_cache = listing_cache
         self.template_vars = {
             "renderer": self,
             "SLASH": '<span class="slash">/</span>',
@@ -252,11 +289,15 @@ class HTMLRenderer(View):
             "all_variables": collector.all_variables(),
         }
 
-    def render_template(self, template_name, file_name):
-        self.template_vars['sort'] = request.args.get('sort', 'name_asc')
-        self.template_vars['request'] = request
-        self.template_vars[KEY_OUTPUT_FILE_NAME] = file_name
-        return render_template(template_name, **self.template_vars)
+    def render_template(self, template_name, file_name, **values):
+        # marks the members of recursive cycles, their call trees are computed on demand
+        BacktraceHelper(self.collector).recursive_cycles()
+        # renderers may serve several requests at once, each gets its own variables
+        template_vars = dict(self.template_vars, **values)
+        template_vars['sort'] = request.args.get('sort', 'name_asc')
+        template_vars['request'] = request
+        template_vars[KEY_OUTPUT_FILE_NAME] = file_name
+        return render_template(template_name, **template_vars)
 
     def url_for_symbol_name(self, name, context=None):
         symbol = self.collector.symbol(name, False)
@@ -266,12 +307,29 @@ class HTMLRenderer(View):
         symbol = self.collector.symbol(name, False)
         return symbol['display_name'] if symbol else name
 
+    def assembly_listing(self, symbol):
+        # links carry the query parameters of the request along, see url_for()
+        key = (self.collector.qualified_symbol_name(symbol), request.query_string)
+        if self.listing_cache is not None:
+            listing = self.listing_cache.get(self.collector.generation, key)
+            if listing is not None:
+                return listing
+
+        link = assembly_linker(self, self)
+        listing = markupsafe.Markup("".join(link(markupsafe.escape(line)) + "\n" for line in symbol.get(collector.ASM, [])))
+        if self.listing_cache is not None:
+            self.listing_cache.put(self.collector.generation, key, listing, len(listing))
+        return listing
+
     def url_for(self, endpoint, **values):
         result = url_for(endpoint, **values)
         href = Href(result)
-        # pass along any query parameters
-        # this is kind of hacky as it replaces any existing parameters
-        return href(request.args)
+        # pass along any query parameters but the page of the all symbols list and
+        # the search query, this is kind of hacky as it replaces any existing parameters
+        args = request.args.copy()
+        args.pop('page', None)
+        args.pop('q', None)
+        return href(args)
 
     def url_for_symbol(self, value):
         if value[collector.TYPE] in [collector.TYPE_FUNCTION]:
@@ -300,16 +358,16 @@ class PathRenderer(HTMLRenderer):
 
         symbol = self.collector.symbol(path)
         if symbol:
-            self.template_vars["symbol"] = symbol
-            return self.render_template("symbol.html.jinja", "symbol")
+            helper = BacktraceHelper(self.collector)
+            helper.deepest_callee_tree(symbol)
+            helper.deepest_caller_tree(symbol)
+            return self.render_template("symbol.html.jinja", "symbol", symbol=symbol)
 
         file_element = self.collector.file_elements.get(path, None)
         if file_element and file_element[collector.TYPE] == collector.TYPE_FILE:
-            self.template_vars["file"] = file_element
-            return self.render_template("file.html.jinja", path)
+            return self.render_template("file.html.jinja", path, file=file_element)
         elif file_element and file_element[collector.TYPE] == collector.TYPE_FOLDER:
-            self.template_vars["folder"] = file_element
-            return self.render_template("folder.html.jinja", path)
+            return self.render_template("folder.html.jinja", path, folder=file_element)
 
         print("### " + path)
         for f in sorted([f[collector.PATH] for f in self.collector.file_elements.values()]):
@@ -335,21 +393,75 @@ class SymbolRenderer(HTMLRenderer):
 
 class AllSymbolsRenderer(HTMLRenderer):
 
+    def __init__(self, collector=None, sorted_cache=None):
+        super().__init__(collector)
+        self.sorted_cache = sorted_cache
+
+    def sorted_symbols(self, sort):
+        # sorted once per build and order, pages are slices of the lists
+        result = self.sorted_cache.get(self.collector.generation, sort) if self.sorted_cache is not None else None
+        if result is None:
+            functions = self.collector.all_functions()
+            variables = self.collector.all_variables()
+            result = (sorted_symbols(functions, sort), sorted_symbols(variables, sort), {
+                "functions": len(functions),
+                "variables": len(variables),
+                "code_size": symbol_code_size_filter(None, functions),
+                "var_size": symbol_var_size_filter(None, variables),
+            })
+            if self.sorted_cache is not None:
+                self.sorted_cache.put(self.collector.generation, sort, result)
+        return result
+
+    def page_url(self, page):
+        args = request.args.copy()
+        args['page'] = page
+        return Href(request.script_root + request.path, sort=True)(args)
+
     def dispatch_request(self, symbol_name=None):
-        return self.render_template("all_symbols.html.jinja", "all")
+        try:
+            functions, variables, totals = self.sorted_symbols(request.args.get('sort', 'name_asc'))
+        except (KeyError, ValueError):
+            abort(404)
+
+        count = len(functions) + len(variables)
+        pages = max(1, (count + ALL_SYMBOLS_PAGE_SIZE - 1) // ALL_SYMBOLS_PAGE_SIZE)
+        page = request.args.get('page', 1, type=int)
+        if page < 1 or page > pages:
+            abort(404)
+
+        # functions are listed before variables, a page may hold both
+        start = (page - 1) * ALL_SYMBOLS_PAGE_SIZE
+        end = min(start + ALL_SYMBOLS_PAGE_SIZE, count)
+        n = len(functions)
+        return self.render_template("all_symbols.html.jinja", "all",
+                                    functions=functions[start:end],
+                                    variables=variables[max(0, start - n):max(0, end - n)],
+                                    totals=totals, page=page, pages=pages,
+                                    first=start + 1 if count else 0, last=end, count=count)
+
+
+class SearchRenderer(HTMLRenderer):
+
+    def dispatch_request(self):
+        query = request.args.get('q', '')
+        results = self.collector.search_symbols(query, SEARCH_RESULTS)
+        return self.render_template("search.html.jinja", "search", query=query, results=results,
+                                    limit=SEARCH_RESULTS)
 
 
 class RackRenderer(HTMLRenderer):
 
     def dispatch_request(self, symbol_name=None):
+        values = {}
         if request.method == "POST":
             helper = BacktraceHelper(self.collector)
 
             snippet = request.form["snippet"]
-            self.template_vars["snippet"] = snippet
-            self.template_vars["functions"] = helper.derive_function_symbols(snippet)
+            values["snippet"] = snippet
+            values["functions"] = helper.derive_function_symbols(snippet)
 
-        return self.render_template("rack.html.jinja", "rack")
+        return self.render_template("rack.html.jinja", "rack", **values)
 
 
 def register_jinja_filters(jinja_env):
@@ -370,9 +482,16 @@ def register_jinja_filters(jinja_env):
 
 
 
-def register_urls(app, collector):
-    app.add_url_rule("/", view_func=OverviewRenderer.as_view("overview", collector=collector))
-    app.add_url_rule("/all/", view_func=AllSymbolsRenderer.as_view("all", collector=collector))
-    app.add_url_rule("/path/<path:path>/", view_func=PathRenderer.as_view("path", collector=collector))
+def register_urls(app, collector=None, page_cache=None, listing_cache=None):
+    # pages only change with the build, repeated requests are answered from the cache
+    cache = page_cache or PageCache()
+    # assembly listings are linked once per build and kept beyond the pages they are on
+    listing_cache = listing_cache or GenerationCache(max_entries=1024, max_bytes=64 << 20)
+    app.add_url_rule("/", view_func=cached_view(OverviewRenderer.as_view("overview", collector=collector), cache, collector))
+    # one entry per sort order
+    sorted_cache = GenerationCache(max_entries=8)
+    app.add_url_rule("/all/", view_func=cached_view(AllSymbolsRenderer.as_view("all", collector=collector, sorted_cache=sorted_cache), cache, collector))
+    app.add_url_rule("/path/<path:path>/", view_func=cached_view(PathRenderer.as_view("path", collector=collector, listing_cache=listing_cache), cache, collector))
+    app.add_url_rule("/search/", view_func=cached_view(SearchRenderer.as_view("search", collector=collector), cache, collector))
     app.add_url_rule("/symbol/<string:symbol_name>", view_func=SymbolRenderer.as_view("symbol", collector=collector))
     app.add_url_rule("/rack/", view_func=RackRenderer.as_view("rack", collector=collector), methods=["GET", "POST"])
@@ -0,0 +1,236 @@
+import collections
+
+EM_RISCV = 243
+
+Instruction = collections.namedtuple("Instruction", ["address", "length", "target", "call", "fpu"])
+
+# calls hold the targets of instructions that link a return address, jumps those of
+# branches and plain jumps, which include tail calls
+CodeSummary = collections.namedtuple("CodeSummary", ["size", "calls", "jumps", "fpu"])
+
+# 32 bit major opcodes, instruction bits 6:0
+OP_LOAD_FP = 0x07
+OP_AUIPC = 0x17
+OP_STORE_FP = 0x27
+OP_LUI = 0x37
+OP_MADD = 0x43
+OP_MSUB = 0x47
+OP_NMSUB = 0x4b
+OP_NMADD = 0x4f
+OP_FP = 0x53
+OP_BRANCH = 0x63
+OP_JALR = 0x67
+OP_JAL = 0x6f
+OP_SYSTEM = 0x73
+
+# fflags, frm and fcsr
+FP_CSRS = [1, 2, 3]
+
+REG_ZERO = 0
+REG_RA = 1
+REG_SP = 2
+REG_T0 = 5
+
+# the registers jal and jalr link to, see "Unconditional Jumps"
+LINK_REGISTERS = [REG_RA, REG_T0]
+
+
+def sign_extend(value, bits):
+    sign = 1 << (bits - 1)
+    return (value & (sign - 1)) - (value & sign)
+
+
+def instruction_length(parcel):
+    # length encoding of the first 16 bit parcel, see "Base Instruction-Length Encoding"
+    if parcel & 0x3 != 0x3:
+        return 2
+    if parcel & 0x1c != 0x1c:
+        return 4
+    if parcel & 0x3f == 0x1f:
+        return 6
+    if parcel & 0x7f == 0x3f:
+        return 8
+    # reserved encodings of 80 bits and more, treat as a parcel of data
+    return 2
+
+
+class Decoder:
+    """
+    Decodes the parts of RV32/RV64 machine code (including the C extension) that
+    matter for the analysis: instruction lengths, direct jump and branch targets,
+    indirect calls whose target is set up by the preceding auipc/lui and whether
+    an instruction belongs to the F/D/Q extensions.
+
+    The handlers are looked up by major opcode, and by quadrant and funct3 for
+    compressed instructions. Each handler returns (target, call, fpu, upper), where
+    call tells whether the instruction links a return address and upper is the
+    (register, value) an auipc or lui leaves for the next instruction.
+    """
+
+    def __init__(self, xlen=32):
+        if xlen not in [32, 64]:
+            raise Exception("Unsupported XLEN %s" % xlen)
+        self.xlen = xlen
+        self.mask = (1 << xlen) - 1
+
+        self.handlers = {
+            OP_LOAD_FP: self.fp_load_store,
+            OP_STORE_FP: self.fp_load_store,
+            OP_MADD: self.fp,
+            OP_MSUB: self.fp,
+            OP_NMSUB: self.fp,
+            OP_NMADD: self.fp,
+            OP_FP: self.fp,
+            OP_AUIPC: self.auipc,
+            OP_LUI: self.lui,
+            OP_BRANCH: self.branch,
+            OP_JAL: self.jal,
+            OP_JALR: self.jalr,
+            OP_SYSTEM: self.system,
+        }
+
+        # (quadrant, funct3); quadrant 0 and 2 slots 3 and 7 are
+        # c.flw/c.fsw(sp) on RV32 but c.ld/c.sd(sp) on RV64, quadrant 1 slot 1
+        # is c.jal on RV32 but c.addiw on RV64
+        self.compressed_handlers = {
+            (0, 1): self.c_fp,
+            (0, 5): self.c_fp,
+            (1, 3): self.c_lui,
+            (1, 5): self.c_j,
+            (1, 6): self.c_branch,
+            (1, 7): self.c_branch,
+            (2, 1): self.c_fp,
+            (2, 4): self.c_jr,
+            (2, 5): self.c_fp,
+        }
+        if xlen == 32:
+            self.compressed_handlers.update({
+                (0, 3): self.c_fp,
+                (0, 7): self.c_fp,
+                (1, 1): self.c_j,
+                (2, 3): self.c_fp,
+                (2, 7): self.c_fp,
+            })
+
+    def decode(self, data, offset, address, upper=None):
+        """
+        Decodes the instruction at data[offset] located at address and returns
+        (length, target, call, fpu, upper).
+        """
+        parcel = data[offset] | data[offset + 1] << 8
+        length = instruction_length(parcel)
+        if length == 2:
+            handler = self.compressed_handlers.get((parcel & 0x3, parcel >> 13))
+            if handler:
+                return (2,) + handler(parcel, address, upper)
+        elif length == 4:
+            insn = int.from_bytes(data[offset:offset + 4], "little")
+            handler = self.handlers.get(insn & 0x7f)
+            if handler:
+                return (4,) + handler(insn, address, upper)
+        return length, None, False, False, None
+
+    def instructions(self, data, start, end, address):
+        upper = None
+        offset = start
+        while offset + 2 <= end:
+            length, target, call, fpu, upper = self.decode(data, offset, address, upper)
+            if offset + length > end:
+                break
+            yield Instruction(address, length, target, call, fpu)
+            offset += length
+            address += length
+
+    def scan(self, data, start, end, address):
+        """
+        Summarizes the code in data[start:end] located at address. Trailing bytes
+        that do not form a complete instruction count to the size as well, like
+        they do in an objdump listing.
+        """
+        calls = []
+        jumps = []
+        seen = set()
+        fpu = False
+        for i in self.instructions(data, start, end, address):
+            if i.target is not None and (i.target, i.call) not in seen:
+                seen.add((i.target, i.call))
+                (calls if i.call else jumps).append(i.target)
+            fpu = fpu or i.fpu
+        return CodeSummary(max(end - start, 0), calls, jumps, fpu)
+
+    # 32 bit instructions
+
+    def fp(self, insn, address, upper):
+        return None, False, True, None
+
+    def fp_load_store(self, insn, address, upper):
+        # the same major opcodes hold vector loads and stores, which use other widths
+        return None, False, 1 <= (insn >> 12) & 0x7 <= 4, None
+
+    def system(self, insn, address, upper):
+        # frcsr, fscsr, frrm, ... are csr instructions on the floating point csrs
+        return None, False, (insn >> 12) & 0x7 != 0 and (insn >> 20) in FP_CSRS, None
+
+    def auipc(self, insn, address, upper):
+        rd = (insn >> 7) & 0x1f
+        return None, False, False, (rd, (address + sign_extend(insn & 0xfffff000, 32)) & self.mask)
+
+    def lui(self, insn, address, upper):
+        rd = (insn >> 7) & 0x1f
+        return None, False, False, (rd, sign_extend(insn & 0xfffff000, 32) & self.mask)
+
+    def branch(self, insn, address, upper):
+        imm = ((insn >> 31) & 0x1) << 12 | ((insn >> 7) & 0x1) << 11 | \
+              ((insn >> 25) & 0x3f) << 5 | ((insn >> 8) & 0xf) << 1
+        return (address + sign_extend(imm, 13)) & self.mask, False, False, None
+
+    def jal(self, insn, address, upper):
+        imm = ((insn >> 31) & 0x1) << 20 | ((insn >> 12) & 0xff) << 12 | \
+              ((insn >> 20) & 0x1) << 11 | ((insn >> 21) & 0x3ff) << 1
+        rd = (insn >> 7) & 0x1f
+        return (address + sign_extend(imm, 21)) & self.mask, rd in LINK_REGISTERS, False, None
+
+    def jalr(self, insn, address, upper):
+        # only `call` and `tail` style pairs, i.e. auipc/lui immediately followed by jalr
+        rs1 = (insn >> 15) & 0x1f
+        rd = (insn >> 7) & 0x1f
+        if upper and upper[0] == rs1 and rs1 != REG_ZERO:
+            return (upper[1] + sign_extend(insn >> 20, 12)) & self.mask, rd in LINK_REGISTERS, False, None
+        return None, False, False, None
+
+    # compressed instructions
+
+    def c_fp(self, parcel, address, upper):
+        return None, False, True, None
+
+    def c_lui(self, parcel, address, upper):
+        # c.lui, unless rd is sp (c.addi16sp)
+        rd = (parcel >> 7) & 0x1f
+        if rd in [REG_ZERO, REG_SP]:
+            return None, False, False, None
+        imm = ((parcel >> 12) & 0x1) << 17 | ((parcel >> 2) & 0x1f) << 12
+        return None, False, False, (rd, sign_extend(imm, 18) & self.mask)
+
+    def c_j(self, parcel, address, upper):
+        # c.j and c.jal, which links ra
+        imm = ((parcel >> 12) & 0x1) << 11 | ((parcel >> 11) & 0x1) << 4 | \
+              ((parcel >> 9) & 0x3) << 8 | ((parcel >> 8) & 0x1) << 10 | \
+              ((parcel >> 7) & 0x1) << 6 | ((parcel >> 6) & 0x1) << 7 | \
+              ((parcel >> 3) & 0x7) << 1 | ((parcel >> 2) & 0x1) << 5
+        return (address + sign_extend(imm, 12)) & self.mask, parcel >> 13 == 1, False, None
+
+    def c_branch(self, parcel, address, upper):
+        # c.beqz and c.bnez
+        imm = ((parcel >> 12) & 0x1) << 8 | ((parcel >> 10) & 0x3) << 3 | \
+              ((parcel >> 5) & 0x3) << 6 | ((parcel >> 3) & 0x3) << 1 | \
+              ((parcel >> 2) & 0x1) << 5
+        return (address + sign_extend(imm, 9)) & self.mask, False, False, None
+
+    def c_jr(self, parcel, address, upper):
+        # c.jr and c.jalr have rs2 == 0, c.mv and c.add do not
+        rs1 = (parcel >> 7) & 0x1f
+        rs2 = (parcel >> 2) & 0x1f
+        if rs2 == REG_ZERO and rs1 != REG_ZERO and upper and upper[0] == rs1:
+            # c.jalr links ra, c.jr does not
+            return upper[1], (parcel >> 12) & 0x1 == 1, False, None
+        return None, False, False, None
@@ -0,0 +1,95 @@
+import bisect
+import heapq
+import itertools
+
+# sorted names are grouped into blocks that keep the best ranks of their names,
+# a prefix shared by many names merges those instead of all ranks
+BLOCK_SIZE = 1024
+MAX_LIMIT = 100
+
+
+class NameIndex:
+    """
+    Finds items by their names, ignoring case. Exact matches come first, then
+    names starting with the query, then texts containing it, each group in the
+    order the items were given.
+
+    Names are kept sorted for exact and prefix lookups. The texts are joined in the
+    order of the items and scanned with str.find, which stops once enough items
+    were found, so only queries with few matches scan all of it.
+    """
+
+    def __init__(self, items, names, text):
+        # the position of an item is its rank
+        self.items = list(items)
+        keys = []
+        ranks = []
+        for rank, item in enumerate(self.items):
+            for key in {n.lower() for n in names(item) if n}:
+                keys.append(key)
+                ranks.append(rank)
+        lines = [(text(item) or "").lower().replace("\n", " ") for item in self.items]
+
+        order = sorted(range(len(keys)), key=keys.__getitem__)
+        self.keys = [keys[i] for i in order]
+        self.ranks = [ranks[i] for i in order]
+        self.block_size = BLOCK_SIZE
+        self.blocks = [sorted(self.ranks[i:i + BLOCK_SIZE])[:MAX_LIMIT]
+                       for i in range(0, len(self.ranks), BLOCK_SIZE)]
+
+        # every line is preceded by a line break
+        self.text = "\n" + "\n".join(lines) + "\n"
+        self.starts = list(itertools.accumulate(itertools.chain([1], (len(l) + 1 for l in lines))))
+
+    def search(self, query, limit=20):
+        q = query.strip().lower()
+        limit = min(limit, MAX_LIMIT)
+        result = []
+        if not q or limit <= 0:
+            return result
+
+        seen = set()
+
+        def add(ranks):
+            for rank in ranks:
+                if len(result) >= limit:
+                    return
+                if rank not in seen:
+                    seen.add(rank)
+                    result.append(rank)
+
+        lo = bisect.bisect_left(self.keys, q)
+        hi = bisect.bisect_right(self.keys, q, lo)
+        add(sorted(self.ranks[lo:hi]))
+        if len(result) < limit:
+            add(self.prefix_ranks(q, limit + len(result)))
+        if len(result) < limit and "\n" not in q:
+            add(self.scan(q, limit + len(result)))
+        return [self.items[r] for r in result]
+
+    def prefix_ranks(self, q, limit):
+        # the best ranks of the names starting with q, in order
+        lo = bisect.bisect_left(self.keys, q)
+        hi = bisect.bisect_left(self.keys, q + "\U0010ffff", lo)
+        size = self.block_size
+        first = -(-lo // size)
+        last = hi // size
+        if first >= last:
+            return heapq.nsmallest(limit, self.ranks[lo:hi])
+
+        ranks = self.ranks[lo:first * size] + self.ranks[last * size:hi]
+        ranks.extend(itertools.chain.from_iterable(b[:limit] for b in self.blocks[first:last]))
+        return heapq.nsmallest(limit, ranks)
+
+    def scan(self, q, limit):
+        # yields the ranks of the texts containing q in order, at most limit of them
+        text = self.text
+        start = 0
+        for _ in range(limit):
+            position = text.find(q, start)
+            if position < 0:
+                return
+            line = bisect.bisect_right(self.starts, position) - 1
+            yield line
+            # continues with the next line
+            start = self.starts[line + 1]
@@ -0,0 +1,116 @@
+import gc
+import os
+import signal
+import threading
+import time
+import traceback
+
+from werkzeug.serving import make_server
+
+from puncover_riscv.backtrace_helper import BacktraceHelper
+
+
+class PreforkServer:
+    """
+    Serves the app from forked worker processes that share the listening socket and,
+    copy-on-write, the collector that was shown when they were forked. Every build
+    forks a new set of workers, the previous ones finish their requests and exit.
+    """
+
+    def __init__(self, app, builder, host, port, workers, threaded=True):
+        if not hasattr(os, "fork"):
+            raise Exception("worker processes are not supported on this platform")
+        self.builder = builder
+        self.workers = workers
+        self.server = make_server(host, port, app, threaded=threaded)
+        # workers that lose the race for a connection go back to waiting
+        self.server.socket.setblocking(False)
+        # threads of the parent must not hold locks of the collector while forking
+        self.warm_call_trees = builder.warm_call_trees
+        builder.warm_call_trees = False
+        self.lock = threading.Lock()
+        self.pids = []
+        self.stopping = []
+
+    def fork_workers(self, collector, count):
+        if self.warm_call_trees:
+            helper = BacktraceHelper(collector)
+            helper.longest_paths(False)
+            helper.longest_paths(True)
+
+        pids = []
+        for _ in range(count):
+            pid = os.fork()
+            if pid == 0:
+                self.run_worker()
+            pids.append(pid)
+        return pids
+
+    def run_worker(self):
+        status = 0
+        # collections would otherwise write to every page of the collector. Only the
+        # workers freeze, the parent has to free the collectors that were replaced
+        if hasattr(gc, "freeze"):
+            gc.freeze()
+        try:
+            # shutdown() waits for serve_forever() to return, so it runs on another thread
+            signal.signal(signal.SIGTERM, lambda *args: threading.Thread(target=self.server.shutdown).start())
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            self.server.serve_forever()
+            # requests that were accepted are still answered
+            for thread in threading.enumerate():
+                if thread.daemon and thread is not threading.current_thread():
+                    thread.join()
+        except BaseException:
+            traceback.print_exc()
+            status = 1
+        finally:
+            os._exit(status)
+
+    def restart(self, collector):
+        with self.lock:
+            previous = self.pids
+            self.pids = self.fork_workers(collector, self.workers)
+            self.stopping.extend(previous)
+        for pid in previous:
+            self.kill(pid)
+        print("serving build %d from %d worker processes" % (collector.generation, self.workers))
+
+    def kill(self, pid):
+        try:
+            os.kill(pid, signal.SIGTERM)
+        except OSError:
+            pass
+
+    def reap(self):
+        # replaces workers that died, only waits for the own children as the
+        # builder waits for its tools itself
+        with self.lock:
+            for pid in list(self.stopping):
+                if os.waitpid(pid, os.WNOHANG)[0]:
+                    self.stopping.remove(pid)
+            for pid in list(self.pids):
+                if os.waitpid(pid, os.WNOHANG)[0]:
+                    print("worker process %d exited" % pid)
+                    self.pids.remove(pid)
+            # a running build replaces all workers once it is done
+            missing = self.workers - len(self.pids)
+            if missing > 0 and not self.builder.build_thread:
+                self.pids.extend(self.fork_workers(self.builder.collector, missing))
+
+    def serve_forever(self, interval=1.0):
+        self.builder.on_build = self.restart
+        self.restart(self.builder.collector)
+        try:
+            while True:
+                time.sleep(interval)
+                self.reap()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.builder.on_build = None
+            with self.lock:
+                for pid in self.pids + self.stopping:
+                    self.kill(pid)
+                    os.waitpid(pid, 0)
+            self.server.server_close()
@@ -0,0 +1,48 @@
+import fnmatch
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+
+class StackUsageFiles:
+    """
+    Finds the .su files below a directory and reads them on a thread pool.
+
+    The lines of every file are cached under its path together with its mtime and
+    size, so scanning a build directory again only reads the files that changed.
+    """
+
+    def __init__(self, max_workers=None, pattern="*.su"):
+        self.max_workers = max_workers
+        self.pattern = pattern
+        self.cache = {}
+        self.files_read = 0
+
+    def find(self, su_dir):
+        result = []
+        for path, dirlist, filelist in os.walk(su_dir):
+            dirlist.sort()
+            for name in sorted(fnmatch.filter(filelist, self.pattern)):
+                result.append(os.path.join(path, name))
+        return result
+
+    def read(self, path):
+        st = os.stat(path)
+        key = (st.st_mtime_ns, st.st_size)
+        cached = self.cache.get(path)
+        if cached and cached[0] == key:
+            return path, key, cached[1], False
+
+        with open(path, "r", errors="replace") as f:
+            return path, key, f.readlines(), True
+
+    def lines(self, su_dir):
+        paths = self.find(su_dir)
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            results = list(executor.map(self.read, paths))
+
+        self.cache = {path: (key, lines) for path, key, lines, _ in results}
+        self.files_read = sum(1 for _, _, _, was_read in results if was_read)
+        print("read %d of %d stack usage files" % (self.files_read, len(results)))
+
+        return [l for _, _, lines, _ in results for l in lines]
@@ -0,0 +1,55 @@
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+
+class StageGraph:
+    """
+    A small dependency graph of build stages.
+
+    Each stage is started on a worker thread as soon as all stages it depends on
+    have finished. Stages listed in `inputs` also pass their return values to the
+    stage function as positional arguments, stages listed in `after` only order it.
+    """
+
+    def __init__(self, max_workers=None):
+        self.max_workers = max_workers
+        self.stages = {}
+
+    def add(self, name, func, after=(), inputs=()):
+        if name in self.stages:
+            raise Exception("Stage %s was already added" % name)
+        self.stages[name] = (func, list(after), list(inputs))
+
+    def dependencies(self, name):
+        _, after, inputs = self.stages[name]
+        return after + inputs
+
+    def run(self):
+        for name in self.stages:
+            for d in self.dependencies(name):
+                if d not in self.stages:
+                    raise Exception("Stage %s depends on unknown stage %s" % (name, d))
+
+        results = {}
+        pending = list(self.stages)
+        running = {}
+        max_workers = self.max_workers or max(1, len(self.stages))
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            while pending or running:
+                for name in list(pending):
+                    if all(d in results for d in self.dependencies(name)):
+                        func, _, inputs = self.stages[name]
+                        args = [results[i] for i in inputs]
+                        running[executor.submit(func, *args)] = name
+                        pending.remove(name)
+
+                if not running:
+                    raise Exception("Stages %s have circular dependencies" % ", ".join(pending))
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    # re-raises the exception of a failed stage
+                    results[name] = future.result()
+
+        return results
@@ -0,0 +1,198 @@
+import ctypes
+import ctypes.util
+import fnmatch
+import os
+import select
+import struct
+import sys
+import threading
+import time
+
+IN_ATTRIB = 0x4
+IN_CLOSE_WRITE = 0x8
+IN_MOVED_FROM = 0x40
+IN_MOVED_TO = 0x80
+IN_CREATE = 0x100
+IN_DELETE = 0x200
+IN_Q_OVERFLOW = 0x4000
+IN_IGNORED = 0x8000
+IN_ONLYDIR = 0x1000000
+IN_MASK_ADD = 0x20000000
+IN_ISDIR = 0x40000000
+
+# a file counts as changed once it has been written and closed, or moved into place
+FILE_EVENTS = IN_CLOSE_WRITE | IN_MOVED_TO | IN_ATTRIB
+TREE_EVENTS = IN_CLOSE_WRITE | IN_MOVED_TO | IN_MOVED_FROM | IN_CREATE | IN_DELETE | IN_ONLYDIR
+
+EVENT_HEADER = struct.Struct("iIII")
+
+
+class Inotify:
+    """
+    Waits for changes of files and of the files matching a pattern below a directory
+    with the inotify API of Linux. Raises OSError where inotify is not available.
+    """
+
+    def __init__(self, files, directory=None, pattern="*.su"):
+        if not sys.platform.startswith("linux"):
+            raise OSError("inotify is only available on Linux")
+        self.libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self.fd = self.libc.inotify_init1(os.O_CLOEXEC | os.O_NONBLOCK)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+
+        # files are watched through their folder, linkers often replace the file
+        self.names = {}
+        for path in files:
+            folder, name = os.path.split(os.path.abspath(path))
+            self.names.setdefault(folder, set()).add(name)
+        self.directory = os.path.abspath(directory) if directory else None
+        self.pattern = pattern
+        self.watches = {}
+        self.add_watches()
+
+    def add_watch(self, path, mask):
+        # the ELF file is often in the directory with the .su files
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(path), mask | IN_MASK_ADD)
+        if wd >= 0:
+            self.watches[wd] = path
+        return wd >= 0
+
+    def add_watches(self):
+        # also picks up folders that were removed and created again, folders below
+        # the directory are added as they are created
+        watched = set(self.watches.values())
+        for folder in self.names:
+            if folder not in watched:
+                self.add_watch(folder, FILE_EVENTS | IN_ONLYDIR)
+        if self.directory and self.directory not in watched:
+            self.add_tree(self.directory)
+
+    def add_tree(self, directory):
+        added = False
+        for path, _, _ in os.walk(directory):
+            added = self.add_watch(path, TREE_EVENTS) or added
+        return added
+
+    def below_directory(self, folder):
+        # not sibling folders that merely start with the same name
+        return folder == self.directory or folder.startswith(self.directory.rstrip(os.sep) + os.sep)
+
+    def changed(self, folder, name, mask):
+        if mask & IN_Q_OVERFLOW:
+            return True
+        if folder in self.names and name in self.names[folder]:
+            return True
+        if self.directory and self.below_directory(folder):
+            if mask & IN_ISDIR:
+                # files written before the watch was added are missed otherwise
+                return bool(mask & (IN_CREATE | IN_MOVED_TO)) and self.add_tree(os.path.join(folder, name))
+            return fnmatch.fnmatch(name, self.pattern)
+        return False
+
+    def wait(self, timeout):
+        if not select.select([self.fd], [], [], timeout)[0]:
+            self.add_watches()
+            return False
+
+        data = os.read(self.fd, 1 << 16)
+        result = False
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = os.fsdecode(data[offset:offset + length].rstrip(b"\0"))
+            offset += length
+            if mask & IN_IGNORED:
+                self.watches.pop(wd, None)
+            folder = self.watches.get(wd)
+            if folder is not None or mask & IN_Q_OVERFLOW:
+                result = self.changed(folder, name, mask) or result
+        return result
+
+    def close(self):
+        os.close(self.fd)
+
+
+class Polling:
+    """
+    Waits for changes like Inotify, by comparing the mtime and size of the files.
+    """
+
+    def __init__(self, files, directory=None, pattern="*.su", interval=1.0):
+        self.files = [os.path.abspath(f) for f in files]
+        self.directory = directory
+        self.pattern = pattern
+        self.interval = interval
+        self.state = self.scan()
+
+    def scan(self):
+        paths = list(self.files)
+        if self.directory:
+            for path, dirlist, filelist in os.walk(self.directory):
+                paths.extend(os.path.join(path, name) for name in fnmatch.filter(filelist, self.pattern))
+
+        result = {}
+        for path in paths:
+            try:
+                st = os.stat(path)
+                result[path] = (st.st_mtime_ns, st.st_size)
+            except OSError:
+                result[path] = None
+        return result
+
+    def wait(self, timeout):
+        time.sleep(min(timeout, self.interval))
+        state = self.scan()
+        result = state != self.state
+        self.state = state
+        return result
+
+    def close(self):
+        pass
+
+
+class FileWatcher:
+    """
+    Calls on_change on a background thread once the watched files, or the .su files
+    below a directory, have changed and then not changed for debounce seconds.
+    Uses inotify where available and falls back to polling the files.
+    """
+
+    def __init__(self, files, directory, on_change, debounce=0.2, poll_interval=1.0):
+        self.files = [f for f in files if f]
+        self.directory = directory
+        self.on_change = on_change
+        self.debounce = debounce
+        self.poll_interval = poll_interval
+        self.backend = None
+        self.thread = None
+        self.stopped = threading.Event()
+
+    def start(self):
+        try:
+            self.backend = Inotify(self.files, self.directory)
+        except (OSError, AttributeError) as e:
+            print("watching files by polling: %s" % e)
+            self.backend = Polling(self.files, self.directory, interval=self.poll_interval)
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def run(self):
+        deadline = None
+        while not self.stopped.is_set():
+            timeout = max(0, deadline - time.time()) if deadline else self.poll_interval
+            if self.backend.wait(timeout):
+                deadline = time.time() + self.debounce
+            elif deadline and time.time() >= deadline:
+                deadline = None
+                try:
+                    self.on_change()
+                except Exception as e:
+                    print("handling changed files failed: %s" % e)
+        self.backend.close()
+
+    def stop(self):
+        self.stopped.set()
+        if self.thread:
+            self.thread.join()
@@ -0,0 +1,10 @@
+#!/bin/sh
+# Rebuilds the RISC-V test images from src/, e.g. with the clang shipped by
+# `pip install ziglang`: CC="python -m ziglang cc" ./build.sh
+set -e
+cd "$(dirname "$0")"
+CC=${CC:-clang}
+FLAGS="-g -O1 -fno-inline -ffunction-sections -fstack-usage -nostdlib"
+
+$CC -target riscv32-freestanding-none -mcpu=generic_rv32+m+a+f+d+c -gdwarf-4 $FLAGS -o riscv32.elf src/a.c src/b.c
+$CC -target riscv64-freestanding-none -mcpu=generic_rv64+m+a+f+d+c -gdwarf-5 $FLAGS -o riscv64.elf src/a.c src/b.c
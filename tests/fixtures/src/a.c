@@ -0,0 +1,26 @@
+int rec2(int n);
+
+static int counter;
+int table[16] = {1, 2, 3};
+float scale = 2.0f;
+
+int helper(int x)
+{
+    counter++;
+    return x * 3 + counter;
+}
+
+float fhelper(float a)
+{
+    return a * scale + 1.0f;
+}
+
+int rec(int n)
+{
+    return n ? rec2(n - 1) : 0;
+}
+
+int rec2(int n)
+{
+    return n ? rec(n - 1) + 1 : 0;
+}
@@ -0,0 +1,23 @@
+int helper(int x);
+float fhelper(float a);
+int rec(int n);
+
+static char buf[64];
+
+double dd(double x, double y)
+{
+    return x / y;
+}
+
+int main(void)
+{
+    buf[0] = helper(2);
+    return rec(5) + (int)fhelper(1.5f) + (int)dd(1.0, buf[1]);
+}
+
+void _start(void)
+{
+    main();
+    for (;;) {
+    }
+}
@@ -0,0 +1,115 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from mock import patch
+
+from puncover_riscv import analysis_cache, collector
+from puncover_riscv.analysis_cache import AnalysisCache
+from puncover_riscv.backtrace_helper import BacktraceHelper
+from puncover_riscv.collector import Collector
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures")
+
+ASSEMBLY = """
+00000098 <board_init>:
+board_init():
+/src/app/main.c:3
+00000098:	215020ef          	jal	ra,0000009c <app_log>
+
+0000009c <app_log>:
+app_log():
+/src/app/log.c:7
+0000009c:	00008067          	ret
+"""
+
+
+class TestAnalysisCache(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir)
+        self.cache = AnalysisCache(self.dir, keep=2)
+
+    def build(self):
+        c = Collector(None)
+        c.symbol_create("board_init", "00000098", collector.TYPE_FUNCTION, 4, 1, "GLOBAL")
+        c.symbol_create("app_log", "0000009c", collector.TYPE_FUNCTION, 4, 1, "GLOBAL")
+        c.parse_assembly_text(ASSEMBLY)
+        c.symbol_add_file_line(0x98, "board_init", "/src/app/main.c", 3)
+        c.symbol_add_file_line(0x9c, "app_log", "/src/app/log.c", 7)
+        c.symbols[0x9c][collector.STACK_SIZE] = 16
+        c.enhance("/src")
+        return c
+
+    def test_loads_stored_model(self):
+        c = self.build()
+        BacktraceHelper(c).deepest_callee_tree(c.symbols[0x98])
+        self.assertTrue(self.cache.store("k", c))
+
+        loaded = Collector(None)
+        self.assertTrue(self.cache.load("k", loaded))
+        board_init, app_log = loaded.symbols[0x98], loaded.symbols[0x9c]
+
+        self.assertEqual([app_log], board_init[collector.CALLEES])
+        self.assertEqual([board_init], app_log[collector.CALLERS])
+        self.assertEqual(list(c.symbols[0x98][collector.ASM]), list(board_init[collector.ASM]))
+        self.assertIs(loaded.file_elements["app/main.c"], board_init[collector.FILE])
+        self.assertIn(board_init, board_init[collector.FILE][collector.SYMBOLS])
+        self.assertIs(app_log, board_init[collector.NEXT_FUNCTION])
+        self.assertNotIn(collector.DEEPEST_CALLEE_TREE, board_init)
+        self.assertEqual(16, BacktraceHelper(loaded).deepest_callee_tree(board_init)[0])
+        self.assertEqual([f[collector.NAME] for f in c.all_functions()], [f[collector.NAME] for f in loaded.all_functions()])
+
+    def test_ignores_missing_and_foreign_files(self):
+        self.assertFalse(self.cache.load("k", Collector(None)))
+
+        self.cache.store("k", self.build())
+        os.rename(self.cache.path("k"), self.cache.path("other"))
+        self.assertFalse(self.cache.load("other", Collector(None)))
+
+        with open(self.cache.path("k"), "wb") as f:
+            f.write(b"garbage")
+        c = Collector(None)
+        self.assertFalse(self.cache.load("k", c))
+        self.assertEqual({}, c.symbols)
+
+    def test_keeps_recently_used_files(self):
+        for i, key in enumerate(["a", "b", "c"]):
+            self.cache.store(key, Collector(None))
+            os.utime(self.cache.path(key), (1000000000 + i, 1000000000 + i))
+        self.cache.prune()
+        self.assertEqual(["b.cache", "c.cache"], sorted(os.listdir(self.dir)))
+
+    def test_key_depends_on_inputs(self):
+        elf_file = os.path.join(FIXTURES, "riscv32.elf")
+        su_file = os.path.join(self.dir, "a.su")
+        with open(su_file, "w") as f:
+            f.write("a.c:3:5:a\t16\tstatic\n")
+
+        key = analysis_cache.cache_key(elf_file, None, [su_file], "objdump 2.38", "/src")
+        self.assertEqual(key, analysis_cache.cache_key(elf_file, None, [su_file], "objdump 2.38", "/src"))
+        self.assertNotEqual(key, analysis_cache.cache_key(elf_file, None, [su_file], "objdump 2.40", "/src"))
+        self.assertNotEqual(key, analysis_cache.cache_key(os.path.join(FIXTURES, "riscv64.elf"), None, [su_file],
+                                                          "objdump 2.38", "/src"))
+        self.assertNotEqual(key, analysis_cache.cache_key(elf_file, elf_file, [su_file], "objdump 2.38", "/src"))
+
+        os.utime(su_file, (1000000000, 1000000000))
+        self.assertNotEqual(key, analysis_cache.cache_key(elf_file, None, [su_file], "objdump 2.38", "/src"))
+
+    def test_builder_loads_instead_of_building(self):
+        from puncover_riscv.builders import ElfBuilder
+
+        gcc_tools = type("FakeTools", (), {"version": lambda self: "objdump 2.38"})()
+        builder = ElfBuilder(Collector(gcc_tools), "/src", os.path.join(FIXTURES, "riscv32.elf"), None, None)
+        builder.cache = self.cache
+        with patch.object(ElfBuilder, "build_stages") as build_stages:
+            builder.build()
+            builder.build()
+        self.assertEqual(1, build_stages.call_count)
+        self.assertEqual(1, len(os.listdir(self.dir)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,123 @@
+import unittest
+
+from flask import Flask
+
+from puncover_riscv import api, collector
+from puncover_riscv.collector import Collector
+
+ASSEMBLY = """
+00000098 <board_init>:
+board_init():
+/src/app/main.c:3
+00000098:	215020ef          	jal	ra,0000009c <app_log>
+
+0000009c <app_log>:
+app_log():
+/src/app/log.c:7
+0000009c:	00050513          	mv	a0,a0
+000000a0:	00008067          	ret
+"""
+
+
+class TestApi(unittest.TestCase):
+
+    def setUp(self):
+        c = Collector(None)
+        c.symbol_create("board_init", "00000098", collector.TYPE_FUNCTION, 4, 1, "GLOBAL")
+        c.symbol_create("app_log", "0000009c", collector.TYPE_FUNCTION, 8, 1, "GLOBAL")
+        c.symbol_create("app_state", "00000200", collector.TYPE_VARIABLE, 16, 2, "LOCAL")
+        c.parse_assembly_text(ASSEMBLY)
+        c.symbol_add_file_line(0x98, "board_init", "/src/app/main.c", 3)
+        c.symbol_add_file_line(0x9c, "app_log", "/src/app/log.c", 7)
+        c.symbol_add_file_line(0x200, "app_state", "/src/app/log.c", 2)
+        c.symbols[0x98][collector.STACK_SIZE] = 32
+        c.symbols[0x9c][collector.STACK_SIZE] = 16
+        c.enhance("/src")
+        c.prepare()
+        self.collector = c
+
+        app = Flask(__name__)
+        api.register_urls(app, c)
+        self.client = app.test_client()
+
+    def get(self, url, status=200):
+        response = self.client.get(url)
+        self.assertEqual(status, response.status_code, response.get_data(as_text=True))
+        return response.get_json()
+
+    def test_lists_symbols(self):
+        result = self.get("/api/v1/symbols?type=function&sort=-stack_size&fields=id,name,stack_size,callees")
+        self.assertEqual(2, result["total"])
+        self.assertEqual([
+            {"id": "app/main.c/board_init", "name": "board_init", "stack_size": 32, "callees": 1},
+            {"id": "app/log.c/app_log", "name": "app_log", "stack_size": 16, "callees": 0},
+        ], result["items"])
+        self.assertIsNone(result["next"])
+
+        result = self.get("/api/v1/symbols?file=app/log.c&size_min=10&fields=name")
+        self.assertEqual([{"name": "app_state"}], result["items"])
+        result = self.get("/api/v1/symbols?name_prefix=app_&sort=name&fields=name")
+        self.assertEqual(["app_log", "app_state"], [s["name"] for s in result["items"]])
+
+    def test_pages_with_cursor(self):
+        names = []
+        url = "/api/v1/symbols?sort=address&fields=name&limit=2"
+        result = self.get(url)
+        names.extend(s["name"] for s in result["items"])
+        result = self.get(url + "&cursor=" + result["next"])
+        names.extend(s["name"] for s in result["items"])
+        self.assertEqual(["board_init", "app_log", "app_state"], names)
+        self.assertIsNone(result["next"])
+
+        # a new build invalidates the cursor
+        cursor = api.encode_cursor(self.collector.generation - 1, 2)
+        self.assertIn("error", self.get(url + "&cursor=" + cursor, 410))
+        self.get(url + "&cursor=garbage", 400)
+
+    def test_rejects_unknown_fields_and_filters(self):
+        self.get("/api/v1/symbols?fields=name,colour", 400)
+        self.get("/api/v1/symbols?sort=colour", 400)
+        self.get("/api/v1/symbols?colour=red", 400)
+        self.get("/api/v1/symbols?size_min=big", 400)
+        self.get("/api/v1/symbols/missing", 404)
+
+    def test_symbol_and_calls(self):
+        self.assertEqual({"name": "app_log", "file": "app/log.c", "line": 7},
+                         self.get("/api/v1/symbols/app/log.c/app_log?fields=name,file,line"))
+        # plain names are found as well
+        self.assertEqual("app/log.c/app_log", self.get("/api/v1/symbols/app_log")["id"])
+
+        callers = self.get("/api/v1/symbols/app/log.c/app_log/callers?fields=name")
+        self.assertEqual([{"name": "board_init"}], callers["items"])
+        callees = self.get("/api/v1/symbols/board_init/callees?fields=name")
+        self.assertEqual([{"name": "app_log"}], callees["items"])
+
+    def test_stack_chains(self):
+        result = self.get("/api/v1/symbols/board_init/stack?fields=name")
+        self.assertEqual({"stack_size": 48, "functions": [{"name": "board_init"}, {"name": "app_log"}]},
+                         result["callees"])
+        self.assertEqual({"stack_size": 32, "functions": [{"name": "board_init"}]}, result["callers"])
+        self.assertIsNone(result["recursive_cycle"])
+        self.get("/api/v1/symbols/app_state/stack", 404)
+
+    def test_search(self):
+        result = self.get("/api/v1/search?q=APP_&fields=name")
+        # larger symbols first
+        self.assertEqual([{"name": "app_state"}, {"name": "app_log"}], result["items"])
+        self.assertEqual([{"name": "app_log"}], self.get("/api/v1/search?q=log&fields=name")["items"])
+        self.assertEqual([], self.get("/api/v1/search?q=")["items"])
+
+    def test_files_and_folders(self):
+        files = self.get("/api/v1/files?sort=-code_size&fields=id,code_size,var_size")
+        self.assertEqual([
+            {"id": "app/log.c", "code_size": 8, "var_size": 16},
+            {"id": "app/main.c", "code_size": 4, "var_size": 0},
+        ], files["items"])
+        self.assertEqual({"id": "app", "code_size": 12, "files": 2},
+                         self.get("/api/v1/folders/app?fields=id,code_size,files"))
+        self.get("/api/v1/files/app", 404)
+        self.assertEqual(3, self.get("/api/v1/")["symbols"])
+
+
+if __name__ == '__main__':
+    unittest.main()
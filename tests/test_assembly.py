@@ -0,0 +1,80 @@
+import unittest
+
+from mock import patch
+
+from puncover_riscv import collector
+from puncover_riscv.assembly import AssemblyLines, AssemblyStore
+from puncover_riscv.collector import Collector
+
+
+class TestAssemblyStore(unittest.TestCase):
+
+    def setUp(self):
+        self.store = AssemblyStore()
+        self.addCleanup(self.store.close)
+
+    def test_reads_lines_back(self):
+        a = self.store.add(["main():", "a0003df8:\t7179\taddi\tsp,sp,-48"])
+        b = self.store.add(["a0003e80:\t0ff5f593\tandi\ta1,a1,255 µ"])
+        self.assertEqual(2, len(a))
+        self.assertEqual("main():", a[0])
+        self.assertEqual(["a0003e80:\t0ff5f593\tandi\ta1,a1,255 µ"], b)
+        self.assertEqual(["main():", "a0003df8:\t7179\taddi\tsp,sp,-48"], list(a))
+
+    def test_indexes_lines(self):
+        lines = ["main():", "", "a0003df8:\t7179 µ", "ret"]
+        a = self.store.add(lines)
+        with patch.object(self.store, "read_bytes", wraps=self.store.read_bytes) as read_bytes:
+            self.assertEqual(lines, [a[i] for i in range(len(a))])
+            # the offsets are only collected once
+            self.assertEqual(len(lines) + 1, read_bytes.call_count)
+        self.assertEqual("ret", a[-1])
+        self.assertEqual(lines[1:3], a[1:3])
+        self.assertEqual(lines[::2], a[::2])
+        self.assertEqual([], a[3:1])
+        with self.assertRaises(IndexError):
+            a[4]
+
+    def test_grows_after_first_read(self):
+        a = self.store.add(["a"])
+        self.assertEqual(["a"], a)
+        b = self.store.add(["b", "c"])
+        self.assertEqual(["b", "c"], b)
+        self.assertEqual(["a"], a)
+
+    def test_empty(self):
+        a = self.store.add([])
+        self.assertEqual(0, len(a))
+        self.assertEqual([], list(a))
+        self.assertEqual([""], self.store.add([""]))
+
+
+class TestCollectorAssembly(unittest.TestCase):
+
+    def test_keeps_assembly_in_store(self):
+        c = Collector(None)
+        c.symbol_create("main", "a0003df8", collector.TYPE_FUNCTION, 8, 4, "GLOBAL")
+        c.parse_assembly_text("""
+a0003df8 <main>:
+main():
+a0003df8:	7179                	addi	sp,sp,-48
+""")
+        asm = c.symbols[0xa0003df8][collector.ASM]
+        self.assertIsInstance(asm, AssemblyLines)
+        self.assertEqual(["main():", "a0003df8:\t7179                \taddi\tsp,sp,-48"], asm)
+
+        c.reset()
+        self.assertIsNone(c.assembly)
+
+    def test_parses_rv64_function_headers(self):
+        c = Collector(None)
+        c.symbol_create("main", "00000000010013e6", collector.TYPE_FUNCTION, 92, 3, "GLOBAL")
+        self.assertEqual(1, c.parse_assembly_text("""
+00000000010013e6 <main>:
+ 10013e6:	1101                	addi	sp,sp,-32
+"""))
+        self.assertEqual(["10013e6:\t1101                \taddi\tsp,sp,-32"], c.symbols[0x10013e6][collector.ASM])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -50,22 +50,21 @@ class TestBacktraceHelper(unittest.TestCase):
 
 class TestBacktraceHelperTreeSizes(unittest.TestCase):
 
+    CALLS = ["ab", "ac", "ba", "cb", "cd", "de", "df"]
+
     def setUp(self):
+        self.build(self.CALLS)
+
+    def build(self, calls):
         self.cc = collector.Collector(None)
-        self.a = self.cc.add_symbol("a", "a", type=collector.TYPE_FUNCTION, stack_size=1)
-        self.b = self.cc.add_symbol("b", "b", type=collector.TYPE_FUNCTION, stack_size=10)
-        self.c = self.cc.add_symbol("c", "c", type=collector.TYPE_FUNCTION, stack_size=100)
-        self.d = self.cc.add_symbol("d", "d", type=collector.TYPE_FUNCTION, stack_size=1000)
-        self.e = self.cc.add_symbol("e", "e", type=collector.TYPE_FUNCTION, stack_size=10000)
-        self.f = self.cc.add_symbol("f", "f", type=collector.TYPE_FUNCTION)
+        for i, (name, stack_size) in enumerate([("a", 1), ("b", 10), ("c", 100), ("d", 1000), ("e", 10000), ("f", None)]):
+            s = self.cc.symbol_create(name, "%08x" % (i * 16), collector.TYPE_FUNCTION, 16, 4, "GLOBAL")
+            if stack_size is not None:
+                s[collector.STACK_SIZE] = stack_size
+            setattr(self, name, s)
         self.cc.enhance_call_tree()
-        self.cc.add_function_call(self.a, self.b)
-        self.cc.add_function_call(self.a, self.c)
-        self.cc.add_function_call(self.b, self.a)
-        self.cc.add_function_call(self.c, self.b)
-        self.cc.add_function_call(self.c, self.d)
-        self.cc.add_function_call(self.d, self.e)
-        self.cc.add_function_call(self.d, self.f)
+        for caller, callee in calls:
+            self.cc.symbol_add_function_call(getattr(self, caller), getattr(self, callee))
         self.h = BacktraceHelper(self.cc)
 
     def test_leaf_with_stack(self):
@@ -82,32 +81,72 @@ class TestBacktraceHelperTreeSizes(unittest.TestCase):
 
     def test_non_leaf(self):
         self.assertEqual((11000, [self.d, self.e]), self.h.deepest_callee_tree(self.d))
-        self.assertIn(collector.DEEPEST_CALLEE_TREE, self.f)
-        self.assertIn(collector.DEEPEST_CALLEE_TREE, self.e)
         self.assertIn(collector.DEEPEST_CALLEE_TREE, self.d)
+        self.assertNotIn(collector.DEEPEST_CALLEE_TREE, self.e)
+        self.assertNotIn(collector.DEEPEST_CALLER_TREE, self.d)
 
-    def test_cycle_2(self):
-        self.a[collector.CALLEES].remove(self.c)
+    def test_memoized_per_generation(self):
+        paths = self.h.longest_paths(False)
+        self.assertIs(paths, self.h.longest_paths(False))
+
+        self.cc.reset()
+        self.assertIsNot(paths, self.h.longest_paths(False))
 
-        expected = (11, [self.a, self.b])
-        actual = self.h.deepest_callee_tree(self.a)
-        self.assertEqual(expected, actual)
+    def test_warm(self):
+        self.h.warm().join()
+        self.assertEqual({(self.cc.generation, "components"),
+                          (self.cc.generation, ("longest_paths", False)),
+                          (self.cc.generation, ("longest_paths", True))}, set(self.cc.call_trees))
+        self.assertNotIn(collector.DEEPEST_CALLEE_TREE, self.a)
 
-        expected = (10, [self.b])
-        actual = self.h.deepest_callee_tree(self.b)
-        self.assertEqual(expected, actual)
+    def test_cycle_2(self):
+        self.build([c for c in self.CALLS if c != "ac"])
+
+        # the result does not depend on where the cycle is entered
+        self.assertEqual((11, [self.a, self.b]), self.h.deepest_callee_tree(self.a))
+        self.assertEqual((11, [self.b, self.a]), self.h.deepest_callee_tree(self.b))
+        self.assertEqual((11100, [self.c, self.d, self.e]), self.h.deepest_callee_tree(self.c))
 
     def test_cycle_3(self):
-        self.c[collector.CALLEES].remove(self.d)
+        self.build([c for c in self.CALLS if c != "cd"])
         self.assertEqual(111, self.h.deepest_callee_tree(self.a)[0])
-        self.assertEqual(10, self.h.deepest_callee_tree(self.b)[0])
-        self.assertEqual(110, self.h.deepest_callee_tree(self.c)[0])
+        self.assertEqual(111, self.h.deepest_callee_tree(self.b)[0])
+        self.assertEqual(111, self.h.deepest_callee_tree(self.c)[0])
+        self.assertEqual(11000, self.h.deepest_callee_tree(self.d)[0])
+
+    def test_cycle_leads_to_callees(self):
+        self.assertEqual((11111, [self.a, self.b, self.c, self.d, self.e]), self.h.deepest_callee_tree(self.a))
+        self.assertEqual((11111, [self.c, self.a, self.b, self.d, self.e]), self.h.deepest_callee_tree(self.c))
 
     def test_caller(self):
-        self.d[collector.CALLERS] = []
+        self.build([c for c in self.CALLS if c != "cd"])
         self.assertEqual(1000, self.h.deepest_caller_tree(self.f)[0])
         self.assertEqual(11000, self.h.deepest_caller_tree(self.e)[0])
 
     def test_caller_cycle(self):
         self.assertEqual(1111, self.h.deepest_caller_tree(self.f)[0])
-        self.assertEqual(11111, self.h.deepest_caller_tree(self.e)[0])
\ No newline at end of file
+        self.assertEqual((11111, [self.e, self.d, self.c, self.a, self.b]), self.h.deepest_caller_tree(self.e))
+
+    def test_recursive_cycles(self):
+        self.cc.symbol_add_function_call(self.e, self.e)
+        cycles = self.h.recursive_cycles()
+
+        self.assertEqual([[self.e], [self.a, self.b, self.c]], cycles)
+        self.assertIs(cycles[1], self.b[collector.RECURSIVE_CYCLE])
+        self.assertNotIn(collector.RECURSIVE_CYCLE, self.d)
+        self.assertEqual((10000, [self.e]), self.h.deepest_callee_tree(self.e))
+
+    def test_deep_chain_without_recursion_limit(self):
+        c = collector.Collector(None)
+        chain = [c.symbol_create("f%d" % i, "%08x" % (i * 16), collector.TYPE_FUNCTION, 16, 4, "GLOBAL")
+                 for i in range(5000)]
+        for s in chain:
+            s[collector.STACK_SIZE] = 8
+        c.enhance_call_tree()
+        for caller, callee in zip(chain, chain[1:]):
+            c.symbol_add_function_call(caller, callee)
+        c.symbol_add_function_call(chain[-1], chain[0])
+
+        h = BacktraceHelper(c)
+        self.assertEqual(5000 * 8, h.deepest_callee_tree(chain[0])[0])
+        self.assertEqual(5000 * 8, h.deepest_caller_tree(chain[-1])[0])
@@ -0,0 +1,170 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+from mock import MagicMock, patch
+
+from puncover_riscv import collector
+from puncover_riscv.builders import ElfBuilder
+from puncover_riscv.collector import Collector
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures")
+
+FUNCTIONS = {0x1129c: "helper", 0x112c2: "fhelper", 0x112e6: "rec", 0x11308: "rec2", 0x11326: "dd",
+             0x1133a: "main", 0x11394: "_start"}
+
+
+def disassembly(elf_file, address_ranges=None):
+    # one line per function and objdump's header in front of every run
+    ranges = address_ranges or [(0, 1 << 32)]
+    for start, stop in ranges:
+        yield "riscv32.elf:     file format elf32-littleriscv\n"
+        yield "Disassembly of section .text:\n"
+        for address in sorted(FUNCTIONS):
+            if start <= address < stop:
+                yield "%08x <%s>:\n" % (address, FUNCTIONS[address])
+                yield "   %x:\t00000013          \tnop\n" % address
+
+
+class TestIncrementalBuild(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir)
+        self.elf_file = os.path.join(self.dir, "riscv32.elf")
+        shutil.copy(os.path.join(FIXTURES, "riscv32.elf"), self.elf_file)
+
+        tools = MagicMock()
+        tools.get_unmangled_names.side_effect = lambda names: {n: n for n in names}
+        tools.get_assembly_lines.side_effect = disassembly
+        self.tools = tools
+        self.builder = ElfBuilder(Collector(tools), self.dir, self.elf_file, None, None)
+
+    def patch_code(self, address, data):
+        text_address, text_offset = 0x1129c, 0x29c
+        with open(self.elf_file, "r+b") as f:
+            f.seek(text_offset + address - text_address)
+            f.write(data)
+
+    def test_reuses_unchanged_functions(self):
+        self.builder.build()
+        main = self.builder.collector.symbol("main", qualified=False)
+        self.assertEqual(((self.elf_file,), {}), self.tools.get_assembly_lines.call_args)
+        self.assertEqual(["1133a:\t00000013          \tnop"], list(main[collector.ASM]))
+        callees = [f[collector.NAME] for f in main[collector.CALLEES]]
+        size = main[collector.SIZE]
+
+        self.tools.reset_mock()
+        self.builder.build()
+        self.c = self.builder.collector
+        self.assertEqual(len(FUNCTIONS), len(self.c.reused))
+        self.assertFalse(self.tools.get_assembly_lines.called)
+        self.assertFalse(self.tools.get_unmangled_names.called)
+
+        # only the changed function is disassembled again, starting at the one in front of it
+        self.patch_code(0x11326, b"\x13\x00\x00\x00")
+        self.builder.build()
+        self.c = self.builder.collector
+        self.tools.get_assembly_lines.assert_called_once_with(self.elf_file, [(0x11308, 0x1133a)])
+        self.assertNotIn(0x11326, self.c.reused)
+        self.assertEqual(len(FUNCTIONS) - 1, len(self.c.reused))
+
+        main = self.c.symbol("main", qualified=False)
+        self.assertEqual(["1133a:\t00000013          \tnop"], list(main[collector.ASM]))
+        self.assertEqual(["11326:\t00000013          \tnop"], list(self.c.symbol("dd", qualified=False)[collector.ASM]))
+        self.assertEqual(callees, [f[collector.NAME] for f in main[collector.CALLEES]])
+        self.assertEqual(size, main[collector.SIZE])
+        self.assertIsNone(self.c.previous)
+
+    def test_full_build_without_incremental(self):
+        self.builder.incremental = False
+        self.builder.build()
+        self.builder.build()
+        self.assertEqual({}, self.builder.collector.reused)
+        self.assertEqual(2, self.tools.get_assembly_lines.call_count)
+
+    def test_watched_files_start_builds(self):
+        self.builder.build_if_needed()
+        shown = self.builder.collector
+        self.builder.watch(debounce=0.05)
+        self.addCleanup(self.builder.watcher.stop)
+        self.assertFalse(self.builder.needs_build())
+
+        self.patch_code(0x11326, b"\x13\x00\x00\x00")
+        for _ in range(100):
+            if self.builder.collector is not shown and not self.builder.build_thread:
+                break
+            time.sleep(0.05)
+        self.assertIsNot(shown, self.builder.collector)
+        self.assertEqual(["11326:\t00000013          \tnop"],
+                         list(self.builder.collector.symbol("dd", qualified=False)[collector.ASM]))
+
+
+class TestBackgroundBuild(unittest.TestCase):
+
+    def setUp(self):
+        tools = MagicMock()
+        tools.get_unmangled_names.side_effect = lambda names: {n: n for n in names}
+        tools.get_assembly_lines.side_effect = disassembly
+        elf_file = os.path.join(FIXTURES, "riscv32.elf")
+        self.builder = ElfBuilder(Collector(tools), FIXTURES, elf_file, None, None)
+        self.builder.build_if_needed()
+
+    def test_swaps_in_complete_build(self):
+        shown = self.builder.collector
+        started = threading.Event()
+        resume = threading.Event()
+        build_stages = self.builder.build_stages
+
+        def slow_build_stages(c):
+            started.set()
+            resume.wait(5)
+            return build_stages(c)
+
+        self.builder.files[self.builder.elf_file] = 0
+        with patch.object(self.builder, "build_stages", side_effect=slow_build_stages) as stages:
+            self.builder.build_in_background()
+            self.assertTrue(started.wait(5))
+            # the previous build is shown and further triggers are coalesced
+            self.builder.files[self.builder.elf_file] = 0
+            self.builder.build_in_background()
+            self.assertIs(shown, self.builder.collector)
+            self.assertEqual(len(FUNCTIONS), len(list(shown.all_functions())))
+            thread = self.builder.build_thread
+            resume.set()
+            thread.join(5)
+
+        self.assertIsNone(self.builder.build_thread)
+        self.assertEqual(2, stages.call_count)
+        # shown collectors are only read
+        self.assertIsNotNone(self.builder.collector.symbols_by_name)
+        self.assertIsNotNone(self.builder.collector.symbols_by_path)
+        self.assertIsNot(shown, self.builder.collector)
+        self.assertEqual(shown.generation + 2, self.builder.collector.generation)
+        self.assertEqual(len(FUNCTIONS), len(list(shown.all_functions())))
+        self.assertEqual(["1133a:\t00000013          \tnop"], list(shown.symbol("main", False)[collector.ASM]))
+
+    def test_keeps_previous_build_on_failure(self):
+        shown = self.builder.collector
+        self.builder.files[self.builder.elf_file] = 0
+        resume = threading.Event()
+
+        def failing_build_stages(c):
+            resume.wait(5)
+            raise Exception("truncated ELF file")
+
+        with patch.object(self.builder, "build_stages", side_effect=failing_build_stages):
+            self.builder.build_in_background()
+            thread = self.builder.build_thread
+            resume.set()
+            thread.join(5)
+        self.assertIsNone(self.builder.build_thread)
+        self.assertIs(shown, self.builder.collector)
+        self.assertFalse(self.builder.needs_build())
+
+
+if __name__ == '__main__':
+    unittest.main()
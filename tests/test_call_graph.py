@@ -0,0 +1,98 @@
+import unittest
+
+from puncover_riscv import collector
+from puncover_riscv.call_graph import CallGraph, CallList, CallPath
+from puncover_riscv.collector import Collector
+
+
+class TestCallGraph(unittest.TestCase):
+
+    def setUp(self):
+        self.graph = CallGraph()
+        self.a, self.b, self.c = [{"name": n} for n in "abc"]
+        for f in [self.a, self.b, self.c]:
+            self.graph.add_function(f)
+
+    def test_compressed_rows_without_duplicates(self):
+        for caller, callee in [(0, 2), (0, 1), (0, 2), (1, 0), (2, 1)]:
+            self.graph.add_call(caller, callee)
+
+        self.assertEqual([1, 2], list(self.graph.callees(0)))
+        self.assertEqual([0], list(self.graph.callees(1)))
+        self.assertEqual([1], list(self.graph.callers(0)))
+        self.assertEqual([0, 2], list(self.graph.callers(1)))
+        self.assertEqual([0], list(self.graph.callers(2)))
+        self.assertEqual([0, 2, 3, 4], list(self.graph.callee_offsets))
+
+    def test_calls_added_after_query(self):
+        self.graph.add_call(0, 1)
+        self.assertEqual([1], list(self.graph.callees(0)))
+
+        d = {"name": "d"}
+        self.graph.add_call(0, self.graph.add_function(d))
+        self.graph.add_call(0, 1)
+        self.assertEqual([1, 3], list(self.graph.callees(0)))
+        self.assertEqual([0], list(self.graph.callers(3)))
+        self.assertEqual([], list(self.graph.callees(3)))
+
+    def test_call_list(self):
+        self.graph.add_call(0, 1)
+        self.graph.add_call(0, 2)
+        callees = CallList(self.graph, 0)
+        self.assertEqual(2, len(callees))
+        self.assertEqual([self.b, self.c], callees)
+        self.assertIs(self.c, callees[-1])
+        self.assertIn(self.b, callees)
+        self.assertNotIn(self.a, callees)
+        self.assertEqual([self.a], CallList(self.graph, 2, reverse=True))
+
+    def test_components_after_their_callees(self):
+        d = self.graph.add_function({"name": "d"})
+        for caller, callee in [(0, 1), (1, 0), (1, 2), (2, d)]:
+            self.graph.add_call(caller, callee)
+        self.graph.add_self_call(d)
+
+        component, components = self.graph.components()
+        self.assertEqual([[d], [2], [0, 1]], components)
+        self.assertEqual([2, 2, 1, 0], component)
+        self.assertEqual([[d], [0, 1]], self.graph.cycles(components))
+
+    def test_longest_paths(self):
+        for caller, callee in [(0, 1), (1, 0), (0, 2)]:
+            self.graph.add_call(caller, callee)
+
+        paths = self.graph.longest_paths([1, 2, 4])
+        self.assertEqual(7, paths.total(1))
+        self.assertEqual([self.b, self.a, self.c], CallPath(paths, 1))
+        self.assertEqual(4, paths.total(2))
+
+        paths = self.graph.longest_paths([1, 2, 4], reverse=True)
+        self.assertEqual(7, paths.total(2))
+        self.assertEqual([self.c, self.a, self.b], CallPath(paths, 2))
+
+
+class TestCollectorCallGraph(unittest.TestCase):
+
+    def test_flags_from_callees(self):
+        c = Collector(None)
+        main = c.symbol_create("main", "00000010", collector.TYPE_FUNCTION, 8, 4, "GLOBAL")
+        malloc = c.symbol_create("malloc", "00000020", collector.TYPE_FUNCTION, 8, 4, "GLOBAL")
+        other = c.symbol_create("other", "00000030", collector.TYPE_FUNCTION, 8, 4, "GLOBAL")
+        malloc["is_heap"] = True
+        c.enhance_call_tree()
+        c.symbol_add_function_call(main, malloc)
+        c.symbol_add_function_call(main, malloc)
+        c.symbol_add_function_call(other, main)
+        c.symbol_add_function_call(other, other)
+
+        c.enhance_symbol_flags()
+        self.assertEqual([malloc], main[collector.CALLEES])
+        self.assertEqual([other], main[collector.CALLERS])
+        self.assertEqual([], other[collector.CALLERS])
+        self.assertTrue(main["call_heap"])
+        self.assertFalse(other["call_heap"])
+        self.assertFalse(main["call_soft_float"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,7 +1,9 @@
 import unittest
 from puncover_riscv.collector import Collector, left_strip_from_list
-from mock import patch
-from puncover_riscv import collector
+from mock import Mock, patch
+from puncover_riscv import collector, renderers
+from puncover_riscv.backtrace_helper import BacktraceHelper
+from puncover_riscv.riscv import CodeSummary
 
 
 class TestCollector(unittest.TestCase):
@@ -169,7 +171,52 @@ board_init():
         self.assertEqual(pbl_table_addr["callees"], [app_log])
         self.assertEqual(app_log["callers"], [pbl_table_addr])
         self.assertEqual(app_log["callees"], [])
-        
+
+    def test_loop_to_own_start_is_not_recursion(self):
+        assembly = """
+00000098 <strlen_like>:
+strlen_like():
+00000098:	00054783          	lbu	a5,0(a0)
+0000009c:	fe079ee3          	bnez	a5,00000098 <strlen_like>
+000000a0:	ff9ff06f          	j	00000098 <strlen_like>
+
+000000a4 <fact>:
+fact():
+000000a4:	ff5ff0ef          	jal	ra,00000098 <strlen_like>
+000000a8:	ffdff0ef          	jal	ra,000000a4 <fact>
+        """
+        for machine_code in [False, True]:
+            c = Collector(None)
+            c.symbol_create("strlen_like", "00000098", collector.TYPE_FUNCTION, 12, 1, "GLOBAL")
+            c.symbol_create("fact", "000000a4", collector.TYPE_FUNCTION, 8, 1, "GLOBAL")
+            c.parse_assembly_text(assembly)
+            strlen_like = c.symbols[0x98]
+            fact = c.symbols[0xa4]
+            if machine_code:
+                c.machine_code = {
+                    0x98: CodeSummary(12, [], [0x98], False),
+                    0xa4: CodeSummary(8, [0x98, 0xa4], [], False),
+                }
+            c.enhance_call_tree()
+
+            with patch("sys.stdout"):
+                cycles = BacktraceHelper(c).recursive_cycles()
+            self.assertEqual([[fact]], cycles)
+            self.assertNotIn(collector.RECURSIVE_CYCLE, strlen_like)
+            self.assertEqual([fact], strlen_like[collector.CALLERS])
+
+    def test_reused_calls_only_reach_functions(self):
+        c = Collector(None)
+        c.symbol_create("main", "00000098", collector.TYPE_FUNCTION, 8, 1, "GLOBAL")
+        c.symbol_create("helper", "000000a0", collector.TYPE_FUNCTION, 4, 1, "GLOBAL")
+        c.symbol_create("table", "00000200", collector.TYPE_VARIABLE, 16, 2, "GLOBAL")
+        # the addresses the previous generation found in main
+        c.reused = {0x98: [0xa0, 0x200]}
+        c.enhance_call_tree()
+
+        self.assertEqual([c.symbols[0xa0]], c.symbols[0x98][collector.CALLEES])
+        self.assertNotIn(collector.CALLERS, c.symbols[0x200])
+
 
 
     def test_enhance_call_tree_from_assembly_line(self):
@@ -459,6 +506,146 @@ uses_doubles2():
         self.assertListEqual([baa], ba[collector.COLLAPSED_SUB_FOLDERS])
         self.assertListEqual([], baa[collector.COLLAPSED_SUB_FOLDERS])
 
+    def test_enhance_size_totals(self):
+        c = Collector(None)
+        f = c.symbol_create("f", "00000010", collector.TYPE_FUNCTION, 8, 1, "GLOBAL")
+        g = c.symbol_create("g", "00000020", collector.TYPE_FUNCTION, 4, 1, "GLOBAL")
+        h = c.symbol_create("h", "00000030", collector.TYPE_FUNCTION, 2, 1, "GLOBAL")
+        v = c.symbol_create("v", "00000040", collector.TYPE_VARIABLE, 16, 2, "GLOBAL")
+        f[collector.STACK_SIZE] = 24
+        h[collector.STACK_SIZE] = 8
+        for s, path in [(f, "a/a/aa.c"), (g, "a/a/aa.c"), (v, "a/a/aa.c"), (h, "b/b.c")]:
+            s[collector.PATH] = path
+        c.derive_folders()
+        c.enhance_file_elements()
+        c.enhance_size_totals()
+
+        aa_c = c.file_elements["a/a/aa.c"]
+        self.assertEqual((12, 16, 24), (aa_c[collector.TOTAL_CODE_SIZE], aa_c[collector.TOTAL_VAR_SIZE],
+                                        aa_c[collector.TOTAL_STACK_SIZE]))
+        a = c.file_elements["a"]
+        self.assertEqual((12, 16, 24), (a[collector.TOTAL_CODE_SIZE], a[collector.TOTAL_VAR_SIZE],
+                                        a[collector.TOTAL_STACK_SIZE]))
+        b = c.file_elements["b"]
+        self.assertEqual((2, 0, 8), (b[collector.TOTAL_CODE_SIZE], b[collector.TOTAL_VAR_SIZE],
+                                     b[collector.TOTAL_STACK_SIZE]))
+
+        # the filters read the totals instead of walking the tree
+        a[collector.SUB_FOLDERS] = None
+        self.assertEqual(12, renderers.symbol_code_size_filter(None, a))
+        self.assertEqual(14, renderers.symbol_code_size_filter(None, [a, b]))
+        self.assertEqual(16, renderers.symbol_var_size_filter(None, a))
+        self.assertEqual(32, renderers.symbol_stack_size_filter(None, [a, b]))
+
+    def test_parses_assembly_lines_from_generator(self):
+        c = Collector(None)
+        c.symbol_create("main", "a0003df8", collector.TYPE_FUNCTION, 8, 4, "GLOBAL")
+        c.symbol_create("memset", "a0003e80", collector.TYPE_FUNCTION, 4, 4, "GLOBAL")
+
+        def lines():
+            yield "\n"
+            yield "a0003df8 <main>:\n"
+            yield "main():\n"
+            yield "a0003df8:\t7179                \taddi\tsp,sp,-48\n"
+            yield "\n"
+            self.assertNotIn(collector.ASM, c.symbols[0xa0003df8])
+            yield "a0003e80 <memset>:\n"
+            # the first function is complete as soon as the next one starts
+            self.assertIn(collector.ASM, c.symbols[0xa0003df8])
+            yield "a0003e80:\t0ff5f593          \tandi\ta1,a1,255\n"
+
+        self.assertEqual(2, c.parse_assembly_lines(lines()))
+        self.assertEqual(["main():", "a0003df8:\t7179                \taddi\tsp,sp,-48"], c.symbols[0xa0003df8][collector.ASM])
+        self.assertEqual(["a0003e80:\t0ff5f593          \tandi\ta1,a1,255"], c.symbols[0xa0003e80][collector.ASM])
+
+    def test_stack_usage_by_path_and_line(self):
+        c = Collector(None)
+        c.symbol_create("a", "00000010", collector.TYPE_FUNCTION, 8, 4, "GLOBAL")
+        c.symbol_create("b", "00000018", collector.TYPE_FUNCTION, 8, 4, "GLOBAL")
+        c.symbol_create("b.constprop.0", "00000020", collector.TYPE_FUNCTION, 8, 4, "GLOBAL")
+        c.symbol_add_file_line(0x10, "a", "/src/x.c", 3)
+        c.symbol_add_file_line(0x18, "b", "/src/x.c", 9)
+        c.symbols[0x18][collector.DISPLAY_NAME] = "b"
+        c.symbols[0x20][collector.DISPLAY_NAME] = "b.constprop.0"
+
+        self.assertTrue(c.symbol_add_stack_usage("/src/x.c", 3, "a", 16, "static"))
+        self.assertEqual(16, c.symbols[0x10][collector.STACK_SIZE])
+        # line differs, found by name among the symbols of the same file
+        self.assertTrue(c.symbol_add_stack_usage("/src/x.c", 10, "b", 24, "static"))
+        self.assertEqual(24, c.symbols[0x18][collector.STACK_SIZE])
+        self.assertFalse(c.symbol_add_stack_usage("/src/y.c", 3, "a", 8, "static"))
+
+        # symbols getting their path after the index was built are found as well
+        c.symbol_add_file_line(0x20, "b.constprop.0", "/src/x.c", 9)
+        self.assertTrue(c.symbol_add_stack_usage("/src/x.c", 9, "b.constprop.0", 32, "static"))
+        self.assertEqual(32, c.symbols[0x20][collector.STACK_SIZE])
+        self.assertEqual(24, c.symbols[0x18][collector.STACK_SIZE])
+
+    def test_map_cross_references(self):
+        c = Collector(None)
+        references = c.map_cross_references("""
+.text          0x00000000a0000000     0x1234
+ memcpy        0x00000000a0000010
+Cross Reference Table
+
+Symbol                                            File
+memcpy                                            /opt/riscv/lib/libc.a(lib_a-memcpy.o)
+                                                  build/main.o
+memcpy_helper                                     build/main.o
+                                                  /opt/riscv/lib/libc.a(lib_a-other.o)
+a_very_long_symbol_name_that_does_not_fit_the_column.constprop.0 /opt/lib/libstdc++.a(x.o)
+wrapped_symbol
+                                                  /opt/riscv/lib/libm.a(s_sin.o)
+""".split("\n"))
+        self.assertEqual({
+            "memcpy": ("/opt/riscv/lib/libc.a", "lib_a-memcpy.o"),
+            "a_very_long_symbol_name_that_does_not_fit_the_column.constprop.0": ("/opt/lib/libstdc++.a", "x.o"),
+            "wrapped_symbol": ("/opt/riscv/lib/libm.a", "s_sin.o"),
+        }, references)
+
+        c.symbol_create("memcpy", "a0000010", collector.TYPE_FUNCTION, 8, 4, "GLOBAL")
+        c.symbol_create("memcpy_helper", "a0000018", collector.TYPE_FUNCTION, 8, 4, "LOCAL")
+        c.parse_map_cross_reference_table(references)
+        self.assertEqual("$without_debuginfo//opt/riscv/lib/libc.a/lib_a-memcpy.o", c.symbols[0xa0000010][collector.PATH])
+        self.assertEqual("$unknown_generated/LOCAL", c.symbols[0xa0000018][collector.PATH])
+
+    def test_sorted_symbol_views_are_cached(self):
+        c = Collector(None)
+        c.symbol_create("small", "00000010", collector.TYPE_FUNCTION, 4, 4, "GLOBAL")
+        c.symbol_create("var", "00000100", collector.TYPE_VARIABLE, 8, 5, "GLOBAL")
+
+        functions = c.all_functions()
+        self.assertIs(functions, c.all_functions())
+        self.assertEqual(["var", "small"], [s[collector.NAME] for s in c.all_symbols()])
+
+        c.symbol_create("big", "00000020", collector.TYPE_FUNCTION, 16, 4, "GLOBAL")
+        self.assertEqual(["big", "small"], [s[collector.NAME] for s in c.all_functions()])
+        self.assertEqual(["var"], [s[collector.NAME] for s in c.all_variables()])
+
+        c.symbols[0x10][collector.ASM] = ["10:\t0001 0001 \tnop", "14:\t0001 0001 \tnop", "18:\t0001 0001 \tnop",
+                                          "1c:\t0001 0001 \tnop", "20:\t0001 0001 \tnop"]
+        c.enhance_function_size_from_assembly()
+        self.assertEqual(["small", "big"], [s[collector.NAME] for s in c.all_functions()])
+
+        c.reset()
+        self.assertEqual([], c.all_symbols())
+
+    def test_sorted_symbol_views_follow_reused_sizes(self):
+        c = Collector(None)
+        c.symbol_create("a", "00000010", collector.TYPE_FUNCTION, 4, 4, "GLOBAL")
+        c.symbol_create("b", "00000020", collector.TYPE_FUNCTION, 8, 4, "GLOBAL")
+        c.function_code_ranges = {0x10: (0, 4), 0x20: (4, 12)}
+        elf = Mock()
+        elf.data = b"\x13" * 12
+        c.reuse_unchanged_functions(elf)
+        self.assertEqual(["b", "a"], [s[collector.NAME] for s in c.all_functions()])
+
+        # the previous generation knew a larger size of a
+        previous = dict(c.symbols[0x10], size=100)
+        c.previous = ({0x10: (previous, None, [])}, {})
+        c.reuse_unchanged_functions(elf)
+        self.assertEqual(["a", "b"], [s[collector.NAME] for s in c.all_functions()])
+
 if __name__ == '__main__':
     test = TestCollector()
     test.test_parses_function_line()
@@ -0,0 +1,120 @@
+import os
+import shutil
+import struct
+import tempfile
+import unittest
+
+from mock import MagicMock
+
+from puncover_riscv import collector
+from puncover_riscv.collector import Collector
+from puncover_riscv.dwarf import DwarfInfo, LineRows, Reader
+from puncover_riscv.elf import ElfFile
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures")
+
+
+class TestReader(unittest.TestCase):
+
+    def test_leb128(self):
+        r = Reader(b"\xe5\x8e\x26\x7f\x80\x7f", "<")
+        self.assertEqual(624485, r.uleb())
+        self.assertEqual(-1, r.sleb())
+        self.assertEqual(-128, r.sleb())
+        self.assertEqual(6, r.offset)
+
+
+class TestDwarfInfo(unittest.TestCase):
+
+    def parse(self, name):
+        elf = ElfFile(os.path.join(FIXTURES, name))
+        self.addCleanup(elf.close)
+        return DwarfInfo(elf).parse()
+
+    def assertLocation(self, expected_file, expected_line, location):
+        self.assertIsNotNone(location)
+        self.assertTrue(location[0].endswith(expected_file), location[0])
+        self.assertEqual(expected_line, location[1])
+
+    def test_dwarf4_declarations(self):
+        dwarf = self.parse("riscv32.elf")
+        self.assertLocation("src/b.c", 12, dwarf.location(0x1133a))
+        self.assertLocation("src/a.c", 7, dwarf.location(0x1129c))
+        # variables are located through their DW_OP_addr location
+        self.assertLocation("src/a.c", 3, dwarf.location(0x123ec))
+
+    def test_dwarf5_declarations(self):
+        dwarf = self.parse("riscv64.elf")
+        self.assertLocation("src/b.c", 12, dwarf.location(0x10013e6))
+        self.assertLocation("src/a.c", 3, dwarf.location(0x1002498))
+
+    def test_line_table(self):
+        for name, main in [("riscv32.elf", 0x1133a), ("riscv64.elf", 0x10013e6)]:
+            dwarf = self.parse(name)
+            self.assertLocation("src/b.c", 13, dwarf.line_for_address(main + 8))
+            self.assertIsNone(dwarf.line_for_address(0x10))
+            self.assertIsNone(dwarf.location(0x10))
+
+    def test_dwarf5_relative_directories(self):
+        # a line program without rows, directory entries hold a path string and file
+        # entries a path string and a directory index
+        entries = b"\x01\x01\x08" + b"\x02/work\0include\0" + \
+            b"\x02\x01\x08\x02\x0f" + b"\x02a.c\0\x00a.h\0\x01"
+        header = struct.pack("<BBBbBB", 1, 1, 1, -5, 14, 13) + bytes([0, 1, 1, 1, 1, 0, 0, 0, 1, 0, 0, 1]) + entries
+        unit = struct.pack("<HBBI", 5, 4, 0, len(header)) + header
+        data = struct.pack("<I", len(unit)) + unit
+
+        elf = MagicMock(data=data, endian="<", address_size=4)
+        section = MagicMock(offset=0, size=len(data))
+        section.name = ".debug_line"
+        elf.sections.return_value = [section]
+        _, files = DwarfInfo(elf).line_table(0, "/ignored", LineRows())
+        self.assertEqual(["/work/a.c", "/work/include/a.h"], files)
+
+    def test_reuses_unchanged_units(self):
+        first = self.parse("riscv32.elf")
+        elf = ElfFile(os.path.join(FIXTURES, "riscv32.elf"))
+        self.addCleanup(elf.close)
+        again = DwarfInfo(elf).parse(first.units)
+        self.assertEqual(2, again.units_reused)
+        self.assertEqual(first.declarations, again.declarations)
+        self.assertLocation("src/b.c", 13, again.line_for_address(0x1133a + 8))
+
+        # only the unit whose line program names b.c has to be decoded again
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, "riscv32.elf")
+        shutil.copy(os.path.join(FIXTURES, "riscv32.elf"), path)
+        with ElfFile(path) as elf:
+            section = elf.section(".debug_line")
+            offset = section.offset + elf.section_data(section).index(b"b.c\0")
+        with open(path, "r+b") as f:
+            f.seek(offset)
+            f.write(b"x")
+
+        elf = ElfFile(path)
+        self.addCleanup(elf.close)
+        changed = DwarfInfo(elf).parse(first.units)
+        self.assertEqual(1, changed.units_reused)
+        self.assertLocation("src/x.c", 12, changed.location(0x1133a))
+        self.assertLocation("src/a.c", 7, changed.location(0x1129c))
+
+
+class TestCollectorDwarf(unittest.TestCase):
+
+    def test_adds_file_lines_to_symbols(self):
+        c = Collector(MagicMock())
+        elf = c.open_elf(os.path.join(FIXTURES, "riscv32.elf"))
+        self.addCleanup(c.close_elf)
+        c.read_elf_symbols(elf)
+        c.symbols_add_dwarf_file_lines(c.parse_dwarf(elf))
+
+        rec = c.symbol("rec", qualified=False)
+        self.assertTrue(rec[collector.PATH].endswith("src/a.c"))
+        self.assertEqual("a.c", rec[collector.BASE_FILE])
+        self.assertEqual(18, rec[collector.LINE])
+        self.assertEqual(5, c.symbol("scale", qualified=False)[collector.LINE])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,141 @@
+import os
+import struct
+import tempfile
+import unittest
+
+from puncover_riscv import collector
+from puncover_riscv.collector import Collector
+from puncover_riscv.elf import ElfFile, section_flag_letters
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures")
+
+
+class TestElfFile(unittest.TestCase):
+
+    def test_reads_elf32_sections(self):
+        with ElfFile(os.path.join(FIXTURES, "riscv32.elf")) as elf:
+            self.assertEqual(4, elf.address_size)
+            text = elf.section(".text")
+            self.assertEqual(4, text.index)
+            self.assertEqual(0x1129c, text.address)
+            self.assertEqual(0x29c, text.offset)
+            self.assertEqual(0x10a, text.size)
+            self.assertEqual("AX", section_flag_letters(text.flags))
+            self.assertEqual(0x10a, len(elf.section_data(text)))
+            self.assertEqual(b"", elf.section_data(elf.section(".bss")))
+
+    def test_reads_elf32_symbols(self):
+        with ElfFile(os.path.join(FIXTURES, "riscv32.elf")) as elf:
+            symbols = {s.name: s for s in elf.symbols()}
+            main = symbols["main"]
+            self.assertEqual((0x1133a, 90, "FUNC", "GLOBAL", "DEFAULT", 4),
+                             (main.value, main.size, main.type, main.bind, main.visibility, main.shndx))
+            counter = symbols["counter"]
+            self.assertEqual((0x123ec, 4, "OBJECT", "LOCAL", 6),
+                             (counter.value, counter.size, counter.type, counter.bind, counter.shndx))
+
+    def test_reads_elf64_symbols(self):
+        with ElfFile(os.path.join(FIXTURES, "riscv64.elf")) as elf:
+            self.assertEqual(16, elf.address_digits)
+            symbols = {s.name: s for s in elf.symbols()}
+            self.assertEqual(0x10013e6, symbols["main"].value)
+            self.assertEqual(92, symbols["main"].size)
+            self.assertEqual(3, symbols["main"].shndx)
+
+    def test_build_id(self):
+        with ElfFile(os.path.join(FIXTURES, "riscv32.elf")) as elf:
+            self.assertIsNone(elf.build_id())
+
+        # 32-bit header and one section holding a GNU build-id note
+        note = struct.pack("<III", 4, 4, 3) + b"GNU\0" + b"\x12\x34\xab\xcd"
+        names = b"\0.note.gnu.build-id\0"
+        shoff = 52 + len(note) + len(names)
+        header = b"\x7fELF\x01\x01\x01" + b"\0" * 9 + struct.pack(
+            "<HHIIIIIHHHHHH", 2, 243, 1, 0, 0, shoff, 0, 52, 0, 0, 40, 3, 2)
+        sections = b"\0" * 40
+        sections += struct.pack("<IIIIIIIIII", 1, 7, 2, 0, 52, len(note), 0, 0, 4, 0)
+        sections += struct.pack("<IIIIIIIIII", 0, 3, 0, 0, 52 + len(note), len(names), 0, 0, 1, 0)
+        with tempfile.NamedTemporaryFile(delete=False) as f:
+            f.write(header + note + names + sections)
+        try:
+            with ElfFile(f.name) as elf:
+                self.assertEqual("1234abcd", elf.build_id())
+        finally:
+            os.unlink(f.name)
+
+    def test_resolves_extended_section_indexes(self):
+        # 32-bit header, a symbol table whose symbol has its section in .symtab_shndx
+        strings = b"\0big\0abs\0"
+        symbols = b"\0" * 16 + struct.pack("<IIIBBH", 1, 0x100, 8, 0x12, 0, 0xffff) + \
+            struct.pack("<IIIBBH", 5, 0x200, 4, 0x11, 0, 0xfff1)
+        extended = struct.pack("<III", 0, 0x12345, 0)
+        names = b"\0.symtab\0.strtab\0.symtab_shndx\0.shstrtab\0"
+        data = strings + symbols + extended + names
+        offsets = [52 + len(strings), 52, 52 + len(strings) + len(symbols), 52 + len(data) - len(names)]
+        header = b"\x7fELF\x01\x01\x01" + b"\0" * 9 + struct.pack(
+            "<HHIIIIIHHHHHH", 2, 243, 1, 0, 0, 52 + len(data), 0, 52, 0, 0, 40, 5, 4)
+        sections = b"\0" * 40
+        sections += struct.pack("<IIIIIIIIII", 1, 2, 0, 0, offsets[0], len(symbols), 2, 1, 4, 16)
+        sections += struct.pack("<IIIIIIIIII", 9, 3, 0, 0, offsets[1], len(strings), 0, 0, 1, 0)
+        sections += struct.pack("<IIIIIIIIII", 17, 18, 0, 0, offsets[2], len(extended), 1, 0, 4, 4)
+        sections += struct.pack("<IIIIIIIIII", 31, 3, 0, 0, offsets[3], len(names), 0, 0, 1, 0)
+        with tempfile.NamedTemporaryFile(delete=False) as f:
+            f.write(header + data + sections)
+        try:
+            with ElfFile(f.name) as elf:
+                symbols = {s.name: s for s in elf.symbols()}
+                self.assertEqual((0xffff, 0x12345), (symbols["big"].shndx, symbols["big"].section))
+                self.assertEqual((0xfff1, None), (symbols["abs"].shndx, symbols["abs"].section))
+        finally:
+            os.unlink(f.name)
+
+    def test_rejects_non_elf_files(self):
+        with tempfile.NamedTemporaryFile(delete=False) as f:
+            f.write(b"not an elf file")
+        try:
+            with self.assertRaises(Exception):
+                ElfFile(f.name)
+        finally:
+            os.unlink(f.name)
+
+
+class TestCollectorElf(unittest.TestCase):
+
+    def test_read_elf_sections_and_symbols(self):
+        c = Collector(None)
+        elf = c.open_elf(os.path.join(FIXTURES, "riscv32.elf"))
+        c.read_elf_sections(elf)
+        c.read_elf_symbols(elf)
+
+        self.assertEqual({
+            collector.NAME: ".text",
+            collector.TYPE: "PROGBITS",
+            collector.ADDRESS: 0x1129c,
+            collector.SIZE: 0x10a,
+            collector.FLAG: "AX",
+            collector.ALIGN: 2,
+        }, c.section[4])
+        # sections without an address are not part of the image
+        self.assertNotIn(0, c.section)
+
+        self.assertEqual(["_start", "counter", "dd", "fhelper", "helper", "main", "rec", "rec2", "scale", "table"],
+                         sorted(s[collector.NAME] for s in c.symbols.values()))
+        self.assertEqual({
+            collector.NAME: "counter",
+            collector.ADDRESS: "000123ec",
+            collector.SIZE: 4,
+            collector.TYPE: collector.TYPE_VARIABLE,
+            collector.SECTION: 6,
+            collector.BIND: "LOCAL",
+            "local": True,
+        }, c.symbol_by_addr("000123ec"))
+        c.reset()
+        self.assertIsNone(c.elf)
+
+    def test_read_elf64_symbols_keeps_full_addresses(self):
+        c = Collector(None)
+        c.read_elf_symbols(c.open_elf(os.path.join(FIXTURES, "riscv64.elf")))
+        main = c.symbols[0x10013e6]
+        self.assertEqual("00000000010013e6", main[collector.ADDRESS])
+        self.assertEqual(collector.TYPE_FUNCTION, main[collector.TYPE])
+        c.close_elf()
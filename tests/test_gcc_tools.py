@@ -1,6 +1,6 @@
 import unittest
 
-from mock import patch
+from mock import MagicMock, patch
 
 from puncover_riscv.gcc_tools import GCCTools
 
@@ -13,3 +13,29 @@ class TestGCCTools(unittest.TestCase):
             f.side_effect = lambda cmd, symbols: [' -%s- ' % s for s in symbols]
             actual = t.get_unmangled_names(['a', 'b', 'c', 'd', 'e'], 2)
             self.assertEqual({'a': ' -a-', 'b': ' -b-', 'c': ' -c-', 'd': ' -d-', 'e': ' -e-'}, actual)
+
+    def test_gcc_tool_line_iter_streams_and_waits(self):
+        t = GCCTools('somePath')
+        with patch.object(t, 'gcc_tool_path', return_value='tool'), \
+                patch('puncover_riscv.gcc_tools.subprocess.Popen') as popen:
+            proc = popen.return_value
+            proc.stdout = MagicMock()
+            proc.stdout.__iter__.return_value = iter([b'a\n', b'b\n'])
+
+            lines = t.gcc_tool_line_iter('objdump', ['-d'])
+            self.assertFalse(popen.called)
+            self.assertEqual('a\n', next(lines))
+            self.assertFalse(proc.wait.called)
+            self.assertEqual(['b\n'], list(lines))
+            proc.stdout.close.assert_called_once_with()
+            proc.wait.assert_called_once_with()
+
+    def test_assembly_lines_of_address_ranges(self):
+        t = GCCTools('somePath')
+        with patch.object(t, 'gcc_tool_line_iter') as f:
+            f.side_effect = lambda name, args, cwd: iter([args[1]])
+            lines = t.get_assembly_lines('/build/app.elf', [(0x98, 0xa0), (0x100, 0x120)])
+            self.assertFalse(f.called)
+            self.assertEqual(['--start-address=0x98', '--start-address=0x100'], list(lines))
+            f.assert_called_with('objdump', ['-dSw', '--start-address=0x100', '--stop-address=0x120', 'app.elf'],
+                                 '/build')
@@ -0,0 +1,82 @@
+import unittest
+
+from flask import Flask, abort
+from mock import Mock
+
+from puncover_riscv.page_cache import PageCache, cached_view
+
+
+class TestPageCache(unittest.TestCase):
+
+    def test_evicts_least_recently_used_pages(self):
+        cache = PageCache(max_pages=2)
+        cache.put(1, "/a", b"a")
+        cache.put(1, "/b", b"b")
+        self.assertEqual(b"a", cache.get(1, "/a")[0])
+        cache.put(1, "/c", b"c")
+        self.assertIsNone(cache.get(1, "/b"))
+        self.assertEqual(b"a", cache.get(1, "/a")[0])
+
+        cache = PageCache(max_bytes=4)
+        cache.put(1, "/a", b"aa")
+        cache.put(1, "/b", b"bbb")
+        self.assertIsNone(cache.get(1, "/a"))
+        self.assertEqual(3, cache.size)
+
+    def test_drops_pages_of_earlier_builds(self):
+        cache = PageCache()
+        cache.put(1, "/a", b"a")
+        cache.put(2, "/b", b"b")
+        self.assertIsNone(cache.get(1, "/a"))
+        # a request that still renders the previous build is not kept
+        cache.put(1, "/a", b"a")
+        self.assertIsNone(cache.get(1, "/a"))
+        self.assertEqual(b"b", cache.get(2, "/b")[0])
+
+
+class TestCachedView(unittest.TestCase):
+
+    def setUp(self):
+        self.collector = Mock(generation=1, build_time=1000000000)
+        self.renders = []
+        self.cache = PageCache()
+
+        def page(path):
+            if path == "missing":
+                abort(404)
+            self.renders.append(path)
+            return "<p>%s %d</p>" % (path, self.collector.generation)
+
+        app = Flask(__name__)
+        app.add_url_rule("/path/<path:path>/", view_func=cached_view(page, self.cache, self.collector))
+        self.client = app.test_client()
+
+    def test_answers_from_cache(self):
+        first = self.client.get("/path/a/?sort=code_desc")
+        self.assertEqual(200, first.status_code)
+        self.assertEqual("<p>a 1</p>", first.get_data(as_text=True))
+        self.assertEqual("Sun, 09 Sep 2001 01:46:40 GMT", first.headers["Last-Modified"])
+        self.assertIn("no-cache", first.headers["Cache-Control"])
+
+        self.assertEqual(first.get_data(), self.client.get("/path/a/?sort=code_desc").get_data())
+        self.client.get("/path/a/?sort=name_asc")
+        self.assertEqual(["a", "a"], self.renders)
+
+        etag = first.headers["ETag"]
+        self.assertEqual(304, self.client.get("/path/a/?sort=code_desc", headers={"If-None-Match": etag}).status_code)
+        self.assertEqual(["a", "a"], self.renders)
+
+        # a new build renders again
+        self.collector.generation = 2
+        second = self.client.get("/path/a/?sort=code_desc", headers={"If-None-Match": etag})
+        self.assertEqual(200, second.status_code)
+        self.assertEqual("<p>a 2</p>", second.get_data(as_text=True))
+        self.assertEqual(["a", "a", "a"], self.renders)
+
+    def test_does_not_keep_errors(self):
+        self.assertEqual(404, self.client.get("/path/missing/").status_code)
+        self.assertEqual(0, len(self.cache.entries))
+
+
+if __name__ == '__main__':
+    unittest.main()
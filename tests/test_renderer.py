@@ -1,8 +1,12 @@
+import io
 import unittest
+from contextlib import redirect_stdout
 
 from mock.mock import Mock, patch
-from flask import globals
-from puncover_riscv import renderers
+from flask import Flask, globals
+from puncover_riscv import collector, renderers
+from puncover_riscv.collector import Collector
+from puncover_riscv.page_cache import GenerationCache
 
 
 class TestRenderer(unittest.TestCase):
@@ -10,7 +14,8 @@ class TestRenderer(unittest.TestCase):
     def setUp(self):
         self.request = Mock(name='request')
         self.request.args = {}
-        self.request.base_url = 'http://puncover_riscv.com'
+        self.request.script_root = ''
+        self.request.path = '/all/'
         self.request.blueprint = None
 
         def url_adapter_func(url, *args, **kwargs):
@@ -131,7 +136,7 @@ class TestRenderer(unittest.TestCase):
         ctx.parent = {}
         self.request.args = {'foo': 'bar'}
 
-        expected = '<a href="http://puncover_riscv.com?foo=bar&sort=name_asc" class="sortable">Name</a>'
+        expected = '<a href="/all/?foo=bar&sort=name_asc" class="sortable">Name</a>'
         actual = renderers.col_sortable_filter(ctx, 'Name', True)
         self.assertEqual(expected, actual)
 
@@ -139,7 +144,7 @@ class TestRenderer(unittest.TestCase):
         # mark as sorted ascending and populate link for descending
         ctx.parent = {'sort': 'name_asc'}
         self.request.args = {'sort': 'foo'}
-        expected = '<a href="http://puncover_riscv.com?sort=name_desc" class="sortable sort_asc_alpha">Name</a>'
+        expected = '<a href="/all/?sort=name_desc" class="sortable sort_asc_alpha">Name</a>'
         actual = renderers.col_sortable_filter(ctx, 'Name', True)
         self.assertEqual(expected, actual)
 
@@ -148,7 +153,7 @@ class TestRenderer(unittest.TestCase):
         ctx.parent = {}
         self.request.args = {'foo': 'bar'}
 
-        expected = '<a href="http://puncover_riscv.com?foo=bar&sort=stack_asc" class="sortable">Stack</a>'
+        expected = '<a href="/all/?foo=bar&sort=stack_asc" class="sortable">Stack</a>'
         actual = renderers.col_sortable_filter(ctx, 'Stack', True)
         self.assertEqual(expected, actual)
 
@@ -156,7 +161,7 @@ class TestRenderer(unittest.TestCase):
         # mark as sorted ascending and populate link for descending
         ctx.parent = {'sort': 'stack_asc'}
         self.request.args = {'sort': 'foo'}
-        expected = '<a href="http://puncover_riscv.com?sort=stack_desc" class="sortable sort_asc_alpha">Stack</a>'
+        expected = '<a href="/all/?sort=stack_desc" class="sortable sort_asc_alpha">Stack</a>'
         actual = renderers.col_sortable_filter(ctx, 'Stack', True)
         self.assertEqual(expected, actual)
 
@@ -175,3 +180,103 @@ class TestRenderer(unittest.TestCase):
         self.request.args = {'foo': 'bar'}
         actual = c.url_for('/')
         self.assertEqual('/?foo=bar', actual)
+
+    def test_render_template_variables_per_request(self):
+        c = Mock()
+        c.root_folders = Mock(return_value=[])
+        r = renderers.HTMLRenderer(c)
+
+        with patch.object(renderers, "render_template") as render_template, \
+                patch.object(renderers, "BacktraceHelper"):
+            r.render_template("symbol.html.jinja", "symbol", symbol="main")
+            r.render_template("rack.html.jinja", "rack")
+
+        first, second = [kwargs for _, kwargs in render_template.call_args_list]
+        self.assertEqual("main", first["symbol"])
+        self.assertEqual("symbol", first[renderers.KEY_OUTPUT_FILE_NAME])
+        self.assertNotIn("symbol", second)
+        self.assertNotIn("symbol", r.template_vars)
+        self.assertNotIn("request", r.template_vars)
+
+    def test_assembly_listing(self):
+        c = Collector(None)
+        main = c.symbol_create("main", "00000098", collector.TYPE_FUNCTION, 4, 1, "GLOBAL")
+        c.symbol_create("_Z3logv", "0000009c", collector.TYPE_FUNCTION, 4, 1, "GLOBAL")["display_name"] = "log()"
+        main[collector.ASM] = ["_Z3logv():", "98:\tjal\tra,9c <_Z3logv>", "9c:\tj\ta0 <extern>"]
+        self.request.query_string = b""
+        r = renderers.HTMLRenderer(c, GenerationCache(max_entries=2, max_bytes=1 << 20))
+
+        with patch.object(r, "url_for_symbol_name", side_effect=lambda name, context: "/path/" + name) as url:
+            listing = r.assembly_listing(main)
+            self.assertEqual(listing, r.assembly_listing(main))
+        self.assertEqual('log():\n'
+                         '98:\tjal\tra,9c &lt;<a href="/path/_Z3logv">log()</a>&gt;\n'
+                         '9c:\tj\ta0 &lt;<a href="/path/extern">extern</a>&gt;\n', listing)
+        # names are linked once, the listing once per build
+        self.assertEqual(2, url.call_count)
+        self.assertEqual(1, r.listing_cache.hits)
+
+        ctx = Mock()
+        ctx.parent = {"renderer": r}
+        with patch.object(r, "url_for_symbol_name", return_value=None):
+            self.assertEqual("b &lt;_Z3logv&gt;", renderers.assembly_filter(ctx, "b &lt;_Z3logv&gt;"))
+
+
+class TestPages(unittest.TestCase):
+
+    def setUp(self):
+        c = Collector(None)
+        for i, name in enumerate(["d", "a", "c"]):
+            c.symbol_create(name, "%08x" % (0x100 + 4 * i), collector.TYPE_FUNCTION, 4 * (i + 1), 1, "GLOBAL")
+            c.symbol_add_file_line(0x100 + 4 * i, name, "/src/app/x.c", i + 1)
+        c.symbol_create("b", "00000200", collector.TYPE_VARIABLE, 16, 2, "GLOBAL")
+        c.symbol_add_file_line(0x200, "b", "/src/app/x.c", 9)
+        for s in c.symbols.values():
+            s[collector.DISPLAY_NAME] = s[collector.NAME]
+        with redirect_stdout(io.StringIO()):
+            c.enhance("/src")
+        c.prepare()
+
+        app = Flask("puncover_riscv.renderers")
+        renderers.register_jinja_filters(app.jinja_env)
+        renderers.register_urls(app, c)
+        self.client = app.test_client()
+
+    def names(self, url):
+        response = self.client.get(url)
+        self.assertEqual(200, response.status_code)
+        body = response.get_data(as_text=True)
+        # in the order they are listed
+        names = [n for n in ["a", "b", "c", "d"] if ">%s</" % n in body]
+        return sorted(names, key=lambda n: body.index(">%s</" % n)), body
+
+    def test_pages(self):
+        with patch.object(renderers, "ALL_SYMBOLS_PAGE_SIZE", 2), redirect_stdout(io.StringIO()):
+            self.assertEqual(["a", "c"], self.names("/all/")[0])
+            names, body = self.names("/all/?page=2")
+            # functions before variables, the totals are the ones of all symbols
+            self.assertEqual(["d", "b"], names)
+            self.assertIn("3 functions", body)
+            self.assertIn("Symbols 3 to 4 of 4", body)
+            self.assertIn('href="/path/app/x.c/d/"', body)
+            self.assertEqual(["c", "a"], self.names("/all/?sort=code_desc")[0])
+            self.assertEqual(404, self.client.get("/all/?page=3").status_code)
+            self.assertEqual(404, self.client.get("/all/?sort=colour_asc").status_code)
+
+    def test_links_do_not_depend_on_host(self):
+        with patch.object(renderers, "ALL_SYMBOLS_PAGE_SIZE", 2), redirect_stdout(io.StringIO()):
+            first = self.client.get("/all/", base_url="http://localhost:5000").get_data(as_text=True)
+            # answered from the cache
+            second = self.client.get("/all/", base_url="http://192.168.1.2:5000").get_data(as_text=True)
+        self.assertEqual(first, second)
+        self.assertNotIn("localhost", second)
+        self.assertIn('href="/all/?sort=name_desc"', second)
+        self.assertIn('href="/all/?page=2"', second)
+
+    def test_search(self):
+        with redirect_stdout(io.StringIO()):
+            names, body = self.names("/search/?q=C")
+            self.assertEqual(["c"], names)
+            self.assertIn('href="/path/app/x.c/c/"', body)
+            self.assertIn('value="C"', body)
+            self.assertIn("No symbols match", self.names("/search/?q=e")[1])
@@ -0,0 +1,108 @@
+import os
+import struct
+import unittest
+
+from mock import MagicMock
+
+from puncover_riscv import collector
+from puncover_riscv.collector import Collector
+from puncover_riscv.riscv import Decoder, instruction_length
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures")
+
+
+def code(*words):
+    # words as printed by objdump, e.g. 0xbf55 or 0xc54080e7
+    return b"".join(struct.pack("<H" if w <= 0xffff else "<I", w) for w in words)
+
+
+class TestDecoder(unittest.TestCase):
+
+    def decode(self, word, address, xlen=32):
+        length, target, call, fpu, _ = Decoder(xlen).decode(code(word), 0, address)
+        return length, target, call, fpu
+
+    def test_instruction_length(self):
+        self.assertEqual(2, instruction_length(0x8682))
+        self.assertEqual(4, instruction_length(0x0067))
+        self.assertEqual(6, instruction_length(0x001f))
+        self.assertEqual(8, instruction_length(0x003f))
+
+    def test_jumps_and_branches(self):
+        self.assertEqual((4, 0xa0005f00, False, False), self.decode(0xd85ff06f, 0xa000617c))  # j
+        self.assertEqual((4, 0xa0005e30, True, False), self.decode(0xb07ff0ef, 0xa000632a))  # jal ra
+        self.assertEqual((4, 0xa000627c, False, False), self.decode(0xfed71ae3, 0xa0006288))  # bne
+        self.assertEqual((4, 0xa000307e, False, False), self.decode(0x00091363, 0xa0003078))  # bnez
+
+    def test_compressed_jumps_and_branches(self):
+        self.assertEqual((2, 0xa0003e30, False, False), self.decode(0xbf55, 0xa0003e7c))  # c.j
+        self.assertEqual((2, 0xa0005c6a, True, False), self.decode(0x3d19, 0xa0005e54))  # c.jal
+        self.assertEqual((2, 0xa0002ee4, False, False), self.decode(0xcb25, 0xa0002e74))  # c.beqz
+        self.assertEqual((2, 0xa000307e, False, False), self.decode(0xf5ed, 0xa0003094))  # c.bnez
+        self.assertEqual((2, None, False, False), self.decode(0x8682, 0xa0002c3e))  # c.jr a3
+
+    def test_rv64_has_no_compressed_jal(self):
+        # 0x3d19 is c.addiw on RV64
+        self.assertEqual((2, None, False, False), self.decode(0x3d19, 0x10000, xlen=64))
+
+    def test_auipc_pairs(self):
+        decoder = Decoder()
+        call = list(decoder.instructions(code(0xc2fbb097, 0xc54080e7), 0, 8, 0xa00058fe))
+        self.assertEqual((0x62fc0552, True), (call[1].target, call[1].call))
+        tail = list(decoder.instructions(code(0xc2fba317, 0xa3e30067), 0, 8, 0xa00066a2))
+        self.assertEqual((0x62fc00e0, False), (tail[1].target, tail[1].call))
+        # the pair only counts when the jalr directly follows
+        apart = list(decoder.instructions(code(0xc2fbb097, 0x0001, 0xc54080e7), 0, 10, 0xa00058fe))
+        self.assertEqual([None, None, None], [i.target for i in apart])
+
+    def test_fpu(self):
+        self.assertTrue(self.decode(0x00b57553, 0)[3])  # fadd.s
+        self.assertTrue(self.decode(0x00052507, 0)[3])  # flw
+        self.assertTrue(self.decode(0x2108, 0)[3])  # c.fld
+        self.assertTrue(self.decode(0x00302573, 0)[3])  # frcsr
+        self.assertFalse(self.decode(0x30002573, 0)[3])  # csrr mstatus
+        self.assertFalse(self.decode(0x02056007, 0)[3])  # vle32.v
+
+    def test_scan(self):
+        # jal ra, jal ra, j, a loop back to the j, ret
+        data = b"\0" * 4 + code(0xb07ff0ef, 0xb07ff0ef, 0xd85ff06f, 0xffdff06f, 0x8082) + b"\0"
+        summary = Decoder().scan(data, 4, len(data), 0xa000632a)
+        # trailing odd byte is part of the size but not decoded
+        self.assertEqual(19, summary.size)
+        self.assertEqual([0xa0005e30, 0xa0005e34], summary.calls)
+        self.assertEqual([0xa00060b6, 0xa0006332], summary.jumps)
+        self.assertFalse(summary.fpu)
+
+
+class TestCollectorMachineCode(unittest.TestCase):
+
+    def collect(self, name):
+        c = Collector(MagicMock())
+        elf = c.open_elf(os.path.join(FIXTURES, name))
+        self.addCleanup(c.close_elf)
+        c.read_elf_symbols(elf)
+        c.decode_machine_code(elf)
+        c.enhance_function_size()
+        c.enhance_call_tree()
+        return c
+
+    def callees(self, c, name):
+        return sorted(f[collector.NAME] for f in c.symbol(name, qualified=False)[collector.CALLEES])
+
+    def test_call_tree_from_machine_code(self):
+        for name in ["riscv32.elf", "riscv64.elf"]:
+            c = self.collect(name)
+            self.assertEqual(["dd", "fhelper", "helper", "rec"], self.callees(c, "main"))
+            self.assertEqual(["rec2"], self.callees(c, "rec"))
+            self.assertEqual(["main"], self.callees(c, "_start"))
+            self.assertTrue(c.symbol("fhelper", qualified=False).get("call_hard_float"))
+            self.assertFalse(c.symbol("helper", qualified=False).get("call_hard_float", False))
+
+    def test_sizes_from_machine_code(self):
+        c = self.collect("riscv32.elf")
+        self.assertEqual(90, c.symbol("main", qualified=False)[collector.SIZE])
+        self.assertEqual(64, c.symbol("table", qualified=False)[collector.SIZE])
+
+
+if __name__ == '__main__':
+    unittest.main()
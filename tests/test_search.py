@@ -0,0 +1,62 @@
+import unittest
+
+from mock import patch
+
+from puncover_riscv import collector, search
+from puncover_riscv.collector import Collector
+from puncover_riscv.search import NameIndex
+
+
+def index(items):
+    # items are (name, display name), ranked in the given order
+    return NameIndex(items, lambda i: list(i), lambda i: i[1] or i[0])
+
+
+class TestNameIndex(unittest.TestCase):
+
+    def test_exact_then_prefix_then_substring(self):
+        items = [
+            ("_ZN6Stream4readEv", "Stream::read()"),
+            ("read_all", None),
+            ("thread", None),
+            ("read", None),
+            ("READY", None),
+        ]
+        i = index(items)
+        self.assertEqual([items[3], items[1], items[4], items[0], items[2]], i.search("read"))
+        self.assertEqual([items[0]], i.search("_zn6stream"))
+        self.assertEqual([items[0]], i.search("::READ"))
+        self.assertEqual([items[3], items[1]], i.search("read", limit=2))
+        self.assertEqual([], i.search("  "))
+        self.assertEqual([], i.search("write"))
+
+    def test_lists_each_item_once(self):
+        items = [("abc", "abc"), ("x_abc", "x_abc abc")]
+        self.assertEqual(items, index(items).search("abc"))
+
+    def test_prefix_over_blocks(self):
+        items = [("n%d" % i, None) for i in range(100)]
+        with patch.object(search, "BLOCK_SIZE", 4):
+            i = index(items)
+        # ranked by position, not by name
+        self.assertEqual(items[:5], i.search("n", limit=5))
+        self.assertEqual(["n3", "n30", "n31"], [n for n, _ in i.search("n3", limit=3)])
+
+
+class TestSymbolSearch(unittest.TestCase):
+
+    def test_finds_fragments_of_both_names(self):
+        c = Collector(None)
+        c.symbol_create("_ZN6Stream4readEv", "00000100", collector.TYPE_FUNCTION, 8, 1, "GLOBAL")
+        c.symbol_create("app_log", "00000108", collector.TYPE_FUNCTION, 4, 1, "GLOBAL")
+        c.symbols[0x100][collector.DISPLAY_NAME] = "Stream::read()"
+        names = lambda q: [s[collector.NAME] for s in c.search_symbols(q)]
+        self.assertEqual(["_ZN6Stream4readEv"], names("6stream4read"))
+        self.assertEqual(["_ZN6Stream4readEv"], names("::read("))
+        self.assertEqual(["app_log"], names("p_lo"))
+        # the names are not joined into one text
+        self.assertEqual([], names(") _zn"))
+
+
+if __name__ == '__main__':
+    unittest.main()
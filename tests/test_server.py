@@ -0,0 +1,54 @@
+import gc
+import unittest
+import weakref
+
+from mock import MagicMock, patch
+
+from puncover_riscv import collector
+from puncover_riscv.collector import Collector
+from puncover_riscv.server import PreforkServer
+
+
+class Marker:
+    pass
+
+
+def create_collector():
+    c = Collector(None)
+    c.symbol_create("app_log", "0000009c", collector.TYPE_FUNCTION, 8, 1, "GLOBAL")
+    c.symbol_add_file_line(0x9c, "app_log", "/src/app/log.c", 7)
+    c.enhance("/src")
+    c.prepare()
+    return c
+
+
+class TestPreforkServer(unittest.TestCase):
+
+    def setUp(self):
+        builder = MagicMock(warm_call_trees=False, build_thread=None)
+        self.server = PreforkServer(MagicMock(), builder, "127.0.0.1", 0, 2)
+        self.addCleanup(self.server.server.server_close)
+
+    @patch("puncover_riscv.server.os.kill")
+    @patch("puncover_riscv.server.os.fork")
+    def test_frees_replaced_collector(self, fork, kill):
+        fork.side_effect = [101, 102, 103, 104]
+        c = create_collector()
+        # symbols and files refer to each other, only the cyclic collector frees them
+        self.assertIs(c.symbols[0x9c], c.symbols[0x9c][collector.FILE][collector.FUNCTIONS][0])
+        marker = Marker()
+        c.symbols[0x9c]["marker"] = marker
+        replaced = weakref.ref(marker)
+
+        self.server.restart(c)
+        self.server.restart(create_collector())
+        del c, marker
+        gc.collect()
+
+        self.assertIsNone(replaced())
+        self.assertEqual([103, 104], self.server.pids)
+        self.assertEqual([101, 102], [args[0][0] for args in kill.call_args_list])
+
+
+if __name__ == '__main__':
+    unittest.main()
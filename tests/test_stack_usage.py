@@ -0,0 +1,48 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from puncover_riscv.stack_usage import StackUsageFiles
+
+
+class TestStackUsageFiles(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir)
+        self.write("a.su", "a.c:3:5:a\t16\tstatic\n")
+        self.write("sub/b.su", "b.c:4:6:b\t8\tstatic\nb.c:9:6:c\t0\tstatic\n")
+        self.write("sub/b.o", "not a stack usage file")
+
+    def write(self, name, content, mtime=1000000000):
+        path = os.path.join(self.dir, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as f:
+            f.write(content)
+        os.utime(path, (mtime, mtime))
+
+    def test_reads_all_su_files(self):
+        files = StackUsageFiles(max_workers=2)
+        self.assertEqual(["a.c:3:5:a\t16\tstatic\n", "b.c:4:6:b\t8\tstatic\n", "b.c:9:6:c\t0\tstatic\n"],
+                         files.lines(self.dir))
+        self.assertEqual(2, files.files_read)
+
+    def test_only_reads_changed_files_again(self):
+        files = StackUsageFiles()
+        files.lines(self.dir)
+
+        self.assertEqual(3, len(files.lines(self.dir)))
+        self.assertEqual(0, files.files_read)
+
+        self.write("sub/b.su", "b.c:4:6:b\t24\tstatic\n", mtime=1000000001)
+        self.assertEqual(["a.c:3:5:a\t16\tstatic\n", "b.c:4:6:b\t24\tstatic\n"], files.lines(self.dir))
+        self.assertEqual(1, files.files_read)
+
+        os.remove(os.path.join(self.dir, "a.su"))
+        self.assertEqual(["b.c:4:6:b\t24\tstatic\n"], files.lines(self.dir))
+        self.assertEqual([os.path.join(self.dir, "sub", "b.su")], list(files.cache))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,52 @@
+import threading
+import unittest
+
+from puncover_riscv.stages import StageGraph
+
+
+class TestStageGraph(unittest.TestCase):
+
+    def test_passes_inputs_and_returns_results(self):
+        g = StageGraph()
+        g.add("a", lambda: 1)
+        g.add("b", lambda: 2)
+        g.add("sum", lambda a, b: a + b, inputs=["a", "b"])
+        self.assertEqual({"a": 1, "b": 2, "sum": 3}, g.run())
+
+    def test_orders_by_after(self):
+        order = []
+        g = StageGraph()
+        g.add("second", lambda: order.append("second"), after=["first"])
+        g.add("first", lambda: order.append("first"))
+        g.run()
+        self.assertEqual(["first", "second"], order)
+
+    def test_runs_independent_stages_concurrently(self):
+        # both stages only finish if they run at the same time
+        barrier = threading.Barrier(2, timeout=5)
+        g = StageGraph()
+        g.add("a", barrier.wait)
+        g.add("b", barrier.wait)
+        g.run()
+
+    def test_raises_stage_exception(self):
+        def fail():
+            raise ValueError("boom")
+
+        g = StageGraph()
+        g.add("fail", fail)
+        g.add("never", lambda: None, after=["fail"])
+        with self.assertRaises(ValueError):
+            g.run()
+
+    def test_rejects_unknown_and_circular_dependencies(self):
+        g = StageGraph()
+        g.add("a", lambda: None, after=["missing"])
+        with self.assertRaises(Exception):
+            g.run()
+
+        g = StageGraph()
+        g.add("a", lambda: None, after=["b"])
+        g.add("b", lambda: None, after=["a"])
+        with self.assertRaises(Exception):
+            g.run()
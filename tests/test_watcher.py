@@ -0,0 +1,92 @@
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+from mock import patch
+
+from puncover_riscv.watcher import FileWatcher, Inotify, Polling
+
+
+class TestFileWatcher(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir)
+        self.elf_file = self.path("app.elf")
+        self.su_dir = self.path("build")
+        self.write(self.elf_file)
+        os.makedirs(self.su_dir)
+        self.changes = []
+        self.changed = threading.Event()
+
+    def path(self, name):
+        return os.path.join(self.dir, name)
+
+    def write(self, path, content="x"):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as f:
+            f.write(content)
+
+    def on_change(self):
+        self.changes.append(1)
+        self.changed.set()
+
+    def watch(self, backend):
+        watcher = FileWatcher([self.elf_file, None], self.su_dir, self.on_change, debounce=0.1, poll_interval=0.05)
+        watcher.start()
+        self.addCleanup(watcher.stop)
+        self.assertIsInstance(watcher.backend, backend)
+        return watcher
+
+    def assertChanges(self, count):
+        self.assertTrue(self.changed.wait(5))
+        self.changed.clear()
+        self.assertEqual(count, len(self.changes))
+
+    def check_changes(self, backend):
+        self.watch(backend)
+        for i in range(3):
+            self.write(self.elf_file, "x" * (i + 2))
+        self.assertChanges(1)
+
+        self.write(os.path.join(self.su_dir, "sub", "a.su"))
+        self.assertChanges(2)
+
+        # neither other files below the directory nor other files next to the ELF
+        self.write(os.path.join(self.su_dir, "sub", "a.o"))
+        self.write(self.path("app.bin"))
+        self.assertFalse(self.changed.wait(0.5))
+
+        os.remove(os.path.join(self.su_dir, "sub", "a.su"))
+        self.assertChanges(3)
+
+    def test_inotify(self):
+        try:
+            Inotify([self.elf_file]).close()
+        except (OSError, AttributeError):
+            self.skipTest("inotify is not available")
+        self.check_changes(Inotify)
+
+    def test_inotify_ignores_sibling_directories(self):
+        try:
+            Inotify([self.elf_file]).close()
+        except (OSError, AttributeError):
+            self.skipTest("inotify is not available")
+        # the ELF file is watched through its folder, which starts like the directory
+        self.elf_file = self.path("build-out/app.elf")
+        self.write(self.elf_file)
+        self.watch(Inotify)
+
+        self.write(self.path("build-out/b.su"))
+        self.assertFalse(self.changed.wait(0.5))
+        self.write(os.path.join(self.su_dir, "c.su"))
+        self.assertChanges(1)
+
+    def test_polling(self):
+        with patch("puncover_riscv.watcher.Inotify", side_effect=OSError("no inotify")):
+            self.check_changes(Polling)
+
+if __name__ == '__main__':
+    unittest.main()